@@ -0,0 +1,66 @@
+import array
+import math
+import threading
+
+
+class AdvertisementHistory:
+    # latest advertisements of a device in fixed size arrays, statistics over
+    # the window are updated incrementally on every advertisement
+    def __init__(self, size=64):
+        self.size = size
+        self.timestamps = array.array("d", [0.0]) * size
+        self.rssis = array.array("b", [0]) * size
+        self.count = 0  # number of advertisements since the first one
+        # rssi values are integers, so the sums are exact
+        self.rssi_sum = 0
+        self.rssi_sq_sum = 0
+        self.lock = threading.Lock()
+
+    def add(self, timestamp, rssi):
+        with self.lock:
+            i = self.count % self.size
+            if self.count >= self.size:
+                old_rssi = self.rssis[i]
+                self.rssi_sum -= old_rssi
+                self.rssi_sq_sum -= old_rssi * old_rssi
+            self.timestamps[i] = timestamp
+            self.rssis[i] = rssi
+            self.rssi_sum += rssi
+            self.rssi_sq_sum += rssi * rssi
+            self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def get_stats(self):
+        with self.lock:
+            n = min(self.count, self.size)
+            if n == 0:
+                return None
+            rssi_mean = self.rssi_sum / n
+            rssi_var = max(self.rssi_sq_sum / n - rssi_mean * rssi_mean, 0)
+            last = self.timestamps[(self.count - 1) % self.size]
+            first = self.timestamps[(self.count - n) % self.size]
+            count = self.count
+        # mean interval between the advertisements in the window
+        interval = (last - first) / (n - 1) if n > 1 else None
+        return {
+            "count": count,
+            "window": n,
+            "rssi_mean": rssi_mean,
+            "rssi_std": math.sqrt(rssi_var),
+            "interval": interval,
+            "rate": 1 / interval if interval else None,
+            "last_seen": last,
+        }
+
+    def get_series(self):
+        # (timestamps, rssis) of the window, oldest first
+        with self.lock:
+            n = min(self.count, self.size)
+            start = (self.count - n) % self.size
+            indexes = [(start + i) % self.size for i in range(n)]
+            return (
+                [self.timestamps[i] for i in indexes],
+                [self.rssis[i] for i in indexes],
+            )
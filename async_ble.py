@@ -0,0 +1,1030 @@
+import asyncio
+import threading
+import time
+
+from adv_history import AdvertisementHistory
+from backends import BleakBackend
+from ble_status import BleStatus, DataGap
+from capture import CaptureWriter
+from gatt import CharProperty, GattModel
+from gatt_cache import DATABASE_HASH_UUID, GattCache
+from indication_stats import IndicationStats
+from replay import CaptureReplay
+from ring_buffer import NotificationRingBuffer
+from scan_filter import ScanFilter
+from write_stream import WriteStream
+
+
+REPLAY_SUBSCRIBE_TIMEOUT = 1  # maximum time (s) to subscribe replayed devices
+MAX_RECONNECT_DELAY = 30  # maximum time (s) between reconnection attempts
+NOTIFICATIONS_QUEUE_SIZE = 1000  # pending notifications per async iterator
+STATUS_QUEUE_SIZE = 1000  # pending status events per async iterator
+SCAN_QUEUE_SIZE = 1000  # pending advertisements per async iterator
+
+
+class AsyncBle:
+    # BLE operations as coroutines and async iterators, running on the event
+    # loop they are awaited from; getters can be called from other threads
+    def __init__(
+        self,
+        backend=None,
+        found_device_timeout=None,
+        adv_history_size=None,
+        gatt_cache_path=None,
+        max_concurrent_connects=2,
+        connect_retries=2,
+        connect_retry_delay=0.5,
+        connect_timeout=None,
+        status_callback=None,
+        data_callback=None,
+    ):
+        # backend creating scanners and clients, bleak if not specified
+        self.backend = backend if backend is not None else BleakBackend()
+        self.found_devices = {}
+        self.found_device = False
+        # changes of found devices since the last call to get_found_devices_diff
+        self.found_device_timeout = found_device_timeout
+        self.found_devices_seen = {}
+        self.added_devices = {}
+        self.changed_devices = {}
+        self.found_devices_lock = threading.Lock()
+        # stable row ids of found devices, kept for the whole scan
+        self.device_rows = {}
+        self.row_devices = {}
+        # advertisement history of found devices, disabled if size is None
+        self.adv_history_size = adv_history_size
+        self.adv_histories = {}
+        self.scan_filter = ScanFilter()
+        self.scanning = False
+        self.scan_task = None
+        self.connected_devices = {}
+        self.connection_tasks = {}
+        # connection requests wait for a free slot, and are retried with
+        # exponential backoff
+        self.connect_slots = asyncio.Semaphore(max_concurrent_connects)
+        self.connect_retries = connect_retries
+        self.connect_retry_delay = connect_retry_delay
+        self.connect_timeout = connect_timeout
+        self.connect_stats = {}
+        # devices reconnected after a link loss, with their subscriptions
+        self.auto_reconnect_devices = {}
+        self.link_lost_events = {}
+        self.resubscriptions = {}
+        self.last_notification_times = {}
+        self.data_gaps = {}
+        self.reconnect_stats = {}
+        # services of connected devices, built on connection
+        self.gatt_models = {}
+        # services of previously connected devices, saved across sessions
+        self.gatt_cache = (
+            GattCache(gatt_cache_path) if gatt_cache_path is not None else None
+        )
+        self.disconnect_events = {}
+        # subscription flag (Notify or Indicate) by device and characteristic
+        self.notification_devices = {}
+        self.stop_notify_events = {}
+        # timing of indications, kept once they are disabled, by the handle
+        # of the characteristic and by the uuid or handle they were enabled
+        # with
+        self.indication_stats = {}
+        # called with every status event tuple, and with the address,
+        # characteristic handle and data of every data event
+        self.status_callback = status_callback
+        self.data_callback = data_callback
+        # queues of the async iterators
+        self.status_subscribers = []
+        self.notification_subscribers = {}
+        self.scan_subscribers = []
+        self.status_devices = {}
+        self.data_buffers = {}
+        self.recorder = None
+        self.replay = None
+        self.replay_task = None
+
+    async def start_scan(self, scan_filter=None):
+        # clear previously found devices
+        self.found_devices = {}
+        self.found_devices_seen = {}
+        with self.found_devices_lock:
+            self.added_devices = {}
+            self.changed_devices = {}
+        self.device_rows = {}
+        self.row_devices = {}
+        self.adv_histories = {}
+        # by default only devices advertising a name are reported
+        self.scan_filter = (
+            scan_filter if scan_filter is not None else ScanFilter()
+        )
+        self.scan_stop_event = asyncio.Event()
+        self.scan_task = asyncio.ensure_future(
+            self.bluetooth_scan(self.scan_stop_event)
+        )
+        self.scanning = True
+
+    async def stop_scan(self):
+        # returns once the scanner is stopped
+        if self.scanning:
+            self.scan_stop_event.set()
+            self.scanning = False
+            await self.scan_task
+
+    async def scan(self, scan_filter=None):
+        # yields the info of found devices on every advertisement, scanning
+        # until the iterator is closed unless a scan was already started
+        advertisements = asyncio.Queue(SCAN_QUEUE_SIZE)
+        self.scan_subscribers.append(advertisements)
+        started = not self.scanning
+        try:
+            if started:
+                await self.start_scan(scan_filter)
+            while True:
+                yield await advertisements.get()
+        finally:
+            self.scan_subscribers.remove(advertisements)
+            if started:
+                await self.stop_scan()
+
+    def is_scanning(self):
+        return self.scanning
+
+    def has_found_device(self):
+        ret_val = self.found_device
+        self.found_device = False
+        return ret_val
+
+    def get_found_devices(self):
+        devices = []
+        for address, (
+            device,
+            advertisement_data,
+        ) in self.found_devices.items():
+            devices.append(
+                self._create_device_info(address, device, advertisement_data)
+            )
+        return devices
+
+    def get_found_device(self, address):
+        found_device = self.found_devices.get(address)
+        if found_device is None:
+            return None
+        return self._create_device_info(address, *found_device)
+
+    def get_device_row(self, address):
+        return self.device_rows.get(address)
+
+    def get_row_device(self, row):
+        return self.row_devices.get(row)
+
+    def get_advertisement_stats(self, address):
+        adv_history = self.adv_histories.get(address)
+        if adv_history is None:
+            return None
+        return adv_history.get_stats()
+
+    def get_advertisement_history(self, address):
+        return self.adv_histories.get(address)
+
+    def get_found_devices_diff(self):
+        # devices added, devices with changed advertisement data and addresses
+        # of removed devices, since the previous call
+        with self.found_devices_lock:
+            added, self.added_devices = self.added_devices, {}
+            changed, self.changed_devices = self.changed_devices, {}
+        removed = []
+        if self.found_device_timeout is not None:
+            now = time.monotonic()
+            for address, last_seen in list(self.found_devices_seen.items()):
+                if (
+                    now - last_seen > self.found_device_timeout
+                    and address not in self.connected_devices
+                ):
+                    del self.found_devices_seen[address]
+                    self.found_devices.pop(address, None)
+                    self.adv_histories.pop(address, None)
+                    if added.pop(address, None) is None:
+                        removed.append(address)
+                    changed.pop(address, None)
+        return (
+            [
+                self._create_device_info(address, *self.found_devices[address])
+                for address in added
+                if address in self.found_devices
+            ],
+            [
+                self._create_device_info(address, *self.found_devices[address])
+                for address in changed
+                if address in self.found_devices
+            ],
+            removed,
+        )
+
+    def _create_device_info(self, address, device, advertisement_data):
+        return {
+            "name": advertisement_data.local_name,
+            "address": address,
+            "rssi": advertisement_data.rssi,
+            "uuids": advertisement_data.service_uuids,
+            "manufacturer_data": advertisement_data.manufacturer_data,
+            "dev": device,
+            "row": self.device_rows.get(address),
+        }
+
+    async def connect(self, dev, auto_reconnect=False):
+        # returns once connected, raises ConnectionError if all attempts
+        # failed; with auto_reconnect, a device losing its link is
+        # reconnected and its notifications enabled again, until disconnect
+        # is called
+        if auto_reconnect:
+            self.auto_reconnect_devices[dev.address] = True
+        else:
+            self.auto_reconnect_devices.pop(dev.address, None)
+        self.status_devices[dev.address] = BleStatus.Connecting
+        self._put_status(dev.address, BleStatus.Connecting)
+        if self.gatt_cache is not None and dev.address in self.gatt_cache:
+            # cached services can be shown while the device connects
+            self._put_status(dev.address, BleStatus.ServicesCached)
+        self.disconnect_events[dev.address] = asyncio.Event()
+        connected = asyncio.get_running_loop().create_future()
+        task = asyncio.ensure_future(
+            self.bluetooth_connect(
+                dev, self.disconnect_events[dev.address], connected
+            )
+        )
+        self.connection_tasks[dev.address] = task
+        await asyncio.wait(
+            [connected, task], return_when=asyncio.FIRST_COMPLETED
+        )
+        if not connected.done():
+            # errors of the backend are raised here
+            task.result()
+        await connected
+
+    async def disconnect(self, dev_address):
+        # returns once disconnected, at once if the device is neither
+        # connected nor connecting
+        if not self._request_disconnect(dev_address):
+            return
+        task = self.connection_tasks[dev_address]
+        await asyncio.wait([task])
+        if self.connection_tasks.get(dev_address) is task:
+            del self.connection_tasks[dev_address]
+
+    def _request_disconnect(self, dev_address):
+        # False if there is no connection to end
+        task = self.connection_tasks.get(dev_address)
+        if task is None or task.done():
+            return False
+        self.auto_reconnect_devices.pop(dev_address, None)
+        self.status_devices[dev_address] = BleStatus.Disconnecting
+        self._put_status(dev_address, BleStatus.Disconnecting)
+        # stop notifications if any
+        for char_uuid in self.stop_notify_events.get(dev_address, {}).keys():
+            self._stop_notify(dev_address, char_uuid)
+        self.disconnect_events[dev_address].set()
+        return True
+
+    def is_connected(self, dev_address):
+        return dev_address in self.connected_devices
+
+    def get_connected_devices(self):
+        return list(self.connected_devices.keys())
+
+    def get_connect_stats(self, dev_address=None):
+        # per device, time waiting for a connection slot, time to connect,
+        # and attempts of the latest connection
+        if dev_address is not None:
+            return self.connect_stats.get(dev_address)
+        return dict(self.connect_stats)
+
+    def get_reconnect_stats(self, dev_address):
+        # link losses, and times from the latest link loss to reconnection
+        # and to the first notification after it
+        return self.reconnect_stats.get(dev_address)
+
+    def get_status(self, dev_address):
+        if dev_address in self.status_devices:
+            return self.status_devices[dev_address]
+        else:
+            return None
+
+    async def status_events(self):
+        # yields status event tuples, the oldest are dropped when the
+        # consumer falls behind
+        events = asyncio.Queue(STATUS_QUEUE_SIZE)
+        self.status_subscribers.append(events)
+        try:
+            while True:
+                yield await events.get()
+        finally:
+            self.status_subscribers.remove(events)
+
+    def enable_data_buffer(
+        self, dev_addr, char_uuid, arena_size=65536, max_records=4096
+    ):
+        # data of the characteristic is stored in a preallocated ring buffer
+        # instead of being passed to the data callback; by handle when
+        # several characteristics have the same uuid
+        data_buffer = NotificationRingBuffer(arena_size, max_records)
+        self.data_buffers[(dev_addr, char_uuid)] = data_buffer
+        return data_buffer
+
+    def disable_data_buffer(self, dev_addr, char_uuid):
+        self.data_buffers.pop((dev_addr, char_uuid), None)
+
+    def get_data_buffer(self, dev_addr, char_uuid):
+        return self.data_buffers.get((dev_addr, char_uuid))
+
+    def start_recording(self, path):
+        self.stop_recording()
+        self.recorder = CaptureWriter(path)
+
+    def stop_recording(self):
+        recorder = self.recorder
+        if recorder is not None:
+            self.recorder = None
+            recorder.close()
+
+    def is_recording(self):
+        return self.recorder is not None
+
+    def get_recording_stats(self):
+        if self.recorder is None:
+            return None
+        return self.recorder.get_stats()
+
+    async def start_replay(self, path, speed=1.0, subscribe=True):
+        # devices from the capture are presented as connected devices, with
+        # recorded data delivered as notifications
+        self.stop_replay()
+        self.replay = CaptureReplay(path, speed)
+        self.replay_task = asyncio.ensure_future(
+            self.bluetooth_replay(self.replay, subscribe)
+        )
+
+    async def replay_capture(self, path, speed=1.0, subscribe=True):
+        # returns once the capture is replayed, or stop_replay is called
+        await self.start_replay(path, speed, subscribe)
+        await self.replay_task
+
+    def stop_replay(self):
+        if self.replay is not None:
+            self.replay.stop()
+
+    def is_replaying(self):
+        return self.replay is not None and not self.replay.finished
+
+    def get_replay_stats(self):
+        if self.replay is None:
+            return None
+        return self.replay.get_stats()
+
+    def get_gatt_model(self, dev_addr):
+        if not self.is_connected(dev_addr):
+            return None
+        return self.gatt_models.get(dev_addr)
+
+    def get_cached_gatt_model(self, dev_addr):
+        if self.gatt_cache is None:
+            return None
+        return self.gatt_cache.get(dev_addr)
+
+    def refresh_gatt_model(self, dev_addr):
+        # to be called when the services of a connected device changed
+        if self.is_connected(dev_addr):
+            self.gatt_models[dev_addr] = GattModel(
+                self.connected_devices[dev_addr].services
+            )
+        return self.get_gatt_model(dev_addr)
+
+    # characteristics are specified by uuid, or by handle when a device has
+    # several characteristics with the same uuid
+    def get_characteristic(self, dev_addr, char_uuid, required_flags):
+        # None if the device is not connected, or the characteristic is not
+        # found or has none of the required flags
+        gatt_model = self.get_gatt_model(dev_addr)
+        if gatt_model is None:
+            return None
+        char = gatt_model.get_characteristic(char_uuid)
+        if char is None or not char.flags & required_flags:
+            return None
+        return char
+
+    async def read_characteristic(self, dev_addr, char_uuid, timeout=None):
+        # returns the value read, which is also passed to the data callback;
+        # raises TimeoutError after timeout seconds, or ValueError if the
+        # characteristic can't be read
+        char = self.get_characteristic(dev_addr, char_uuid, CharProperty.Read)
+        if char is None:
+            raise ValueError(f"{char_uuid} of {dev_addr} can't be read")
+        return await self.bluetooth_read(
+            self.connected_devices[dev_addr], char.characteristic, timeout
+        )
+
+    async def read_characteristics(self, chars, timeout=None):
+        # reads (dev_addr, char_uuid) pairs concurrently, returns the list of
+        # values, in order; reads that failed have their exception in place
+        # of the value
+        return await asyncio.gather(
+            *[
+                self.read_characteristic(dev_addr, char_uuid, timeout)
+                for dev_addr, char_uuid in chars
+            ],
+            return_exceptions=True,
+        )
+
+    async def write_characteristic(
+        self, dev_addr, char_uuid, data, response=None, timeout=None
+    ):
+        # with response unless the characteristic only supports writes
+        # without response; raises ValueError if the characteristic can't be
+        # written
+        char = self.get_characteristic(
+            dev_addr,
+            char_uuid,
+            CharProperty.Write | CharProperty.WriteWithoutResponse,
+        )
+        if char is None:
+            raise ValueError(f"{char_uuid} of {dev_addr} can't be written")
+        if response is None:
+            response = bool(char.flags & CharProperty.Write)
+        await self.bluetooth_write(
+            self.connected_devices[dev_addr],
+            char.characteristic,
+            data,
+            response,
+            timeout,
+        )
+
+    def create_write_stream(
+        self,
+        dev_addr,
+        char_uuid,
+        data,
+        response=None,
+        chunk_size=None,
+        max_in_flight=4,
+    ):
+        # data is a buffer or an iterator of buffers, written by write_stream
+        # in chunks of the mtu size, without response when the characteristic
+        # supports it; progress is reported with WriteProgress status events
+        char = self.get_characteristic(
+            dev_addr,
+            char_uuid,
+            CharProperty.Write | CharProperty.WriteWithoutResponse,
+        )
+        if char is None:
+            return None
+        if response is None:
+            response = not char.flags & CharProperty.WriteWithoutResponse
+        return WriteStream(
+            data,
+            response,
+            chunk_size,
+            max_in_flight,
+            lambda stream: self._put_status(
+                dev_addr,
+                BleStatus.WriteProgress,
+                char.uuid,
+                stream.bytes_written,
+                stream.total_bytes,
+                stream.get_rate(),
+            ),
+        )
+
+    async def write_stream(self, dev_addr, char_uuid, stream):
+        # returns once the stream is written, failed or is cancelled
+        char = self.get_characteristic(
+            dev_addr,
+            char_uuid,
+            CharProperty.Write | CharProperty.WriteWithoutResponse,
+        )
+        if char is None:
+            raise ValueError(f"{char_uuid} of {dev_addr} can't be written")
+        await self.bluetooth_write_stream(
+            self.connected_devices[dev_addr], char.characteristic, stream
+        )
+
+    async def start_notifications_characteristic(self, dev_addr, char_uuid):
+        # returns once notifications are enabled, False if the characteristic
+        # can't notify
+        return await self._start_notify(
+            dev_addr, char_uuid, CharProperty.Notify
+        )
+
+    async def start_indications_characteristic(self, dev_addr, char_uuid):
+        # same data path as notifications, with the timing of indications in
+        # get_indication_stats; False if the characteristic can't indicate
+        return await self._start_notify(
+            dev_addr, char_uuid, CharProperty.Indicate
+        )
+
+    async def _start_notify(self, dev_addr, char_uuid, flag):
+        char = self.get_characteristic(dev_addr, char_uuid, flag)
+        if char is None:
+            return False
+        if dev_addr not in self.stop_notify_events:
+            self.stop_notify_events[dev_addr] = {}
+        stop_event = asyncio.Event()
+        self.stop_notify_events[dev_addr][char_uuid] = stop_event
+        if dev_addr not in self.notification_devices:
+            self.notification_devices[dev_addr] = {}
+        client = self.connected_devices[dev_addr]
+        await self.bluetooth_start_notify(
+            client, char.characteristic, char_uuid, flag
+        )
+        asyncio.ensure_future(
+            self.bluetooth_stop_notify(
+                client, char.characteristic, char_uuid, stop_event
+            )
+        )
+        return True
+
+    async def stop_notifications_characteristic(self, dev_addr, char_uuid):
+        self._stop_notify(dev_addr, char_uuid)
+
+    async def stop_indications_characteristic(self, dev_addr, char_uuid):
+        self._stop_notify(dev_addr, char_uuid)
+
+    def _stop_notify(self, dev_addr, char_uuid):
+        if (
+            dev_addr in self.stop_notify_events.keys()
+            and char_uuid in self.stop_notify_events[dev_addr].keys()
+        ):
+            self.stop_notify_events[dev_addr][char_uuid].set()
+
+    def are_notifications_enabled(self, dev_addr, char_uuid):
+        return (
+            self._get_subscription(dev_addr, char_uuid) == CharProperty.Notify
+        )
+
+    def are_indications_enabled(self, dev_addr, char_uuid):
+        return (
+            self._get_subscription(dev_addr, char_uuid) == CharProperty.Indicate
+        )
+
+    def _get_subscription(self, dev_addr, char_uuid):
+        return self.notification_devices.get(dev_addr, {}).get(char_uuid)
+
+    def get_indication_stats(self, dev_addr, char_uuid):
+        # count and rate of indications, and intervals between them, None if
+        # indications of the characteristic were never enabled
+        indication_stats = self.indication_stats.get((dev_addr, char_uuid))
+        if indication_stats is None:
+            return None
+        return indication_stats.get_stats()
+
+    async def notifications(
+        self, dev_addr, char_uuid, queue_size=NOTIFICATIONS_QUEUE_SIZE
+    ):
+        # yields the data of notifications of the characteristic, enabled if
+        # needed (indications if it can't notify) and then disabled when the
+        # iterator is closed; ends when notifications are disabled or the
+        # device disconnects, the oldest data is dropped when the consumer
+        # falls behind
+        char = self.get_characteristic(
+            dev_addr, char_uuid, CharProperty.Notify | CharProperty.Indicate
+        )
+        if char is None:
+            raise ValueError(f"{char_uuid} of {dev_addr} can't notify")
+        key = (dev_addr, char.handle)
+        notifications = asyncio.Queue(queue_size)
+        self.notification_subscribers.setdefault(key, []).append(notifications)
+        started = self._get_subscription(dev_addr, char_uuid) is None
+        try:
+            if started:
+                await self._start_notify(
+                    dev_addr,
+                    char_uuid,
+                    CharProperty.Notify
+                    if char.flags & CharProperty.Notify
+                    else CharProperty.Indicate,
+                )
+            while True:
+                data = await notifications.get()
+                if data is None:
+                    return
+                yield data
+        finally:
+            subscribers = self.notification_subscribers[key]
+            subscribers.remove(notifications)
+            if len(subscribers) == 0:
+                del self.notification_subscribers[key]
+            if started:
+                self._stop_notify(dev_addr, char_uuid)
+
+    async def bluetooth_scan(self, stop_event):
+        async with self.backend.create_scanner(
+            self._detection_callback, **self.scan_filter.get_scanner_kwargs()
+        ):
+            await stop_event.wait()
+
+    def _detection_callback(self, device, advertisement_data):
+        if self.scan_filter.matches(device, advertisement_data):
+            address = device.address
+            previous = self.found_devices.get(address)
+            self.found_devices[address] = (
+                device,
+                advertisement_data,
+            )
+            now = time.monotonic()
+            self.found_devices_seen[address] = now
+            if (
+                self.adv_history_size is not None
+                and advertisement_data.rssi is not None
+            ):
+                adv_history = self.adv_histories.get(address)
+                if adv_history is None:
+                    adv_history = AdvertisementHistory(self.adv_history_size)
+                    self.adv_histories[address] = adv_history
+                adv_history.add(now, advertisement_data.rssi)
+            if address not in self.device_rows:
+                row = len(self.device_rows) + 1
+                self.device_rows[address] = row
+                self.row_devices[row] = address
+            with self.found_devices_lock:
+                if previous is None:
+                    self.added_devices[address] = True
+                elif (
+                    previous[1].rssi != advertisement_data.rssi
+                    or previous[1].local_name != advertisement_data.local_name
+                ) and address not in self.added_devices:
+                    self.changed_devices[address] = True
+            self.found_device = True
+            if self.scan_subscribers:
+                device_info = self._create_device_info(
+                    address, device, advertisement_data
+                )
+                for advertisements in self.scan_subscribers:
+                    self._put_bounded(advertisements, device_info)
+
+    async def bluetooth_connect(self, device, disconnect_event, connected):
+        # connected is completed on the first connection, or with a
+        # ConnectionError if it failed
+        address = device.address
+        retries = self.connect_retries
+        while True:
+            client = await self.bluetooth_connect_client(
+                device, disconnect_event, retries
+            )
+            if client is None:
+                self.status_devices.pop(address, None)
+                self.resubscriptions.pop(address, None)
+                self._put_status(address, BleStatus.Disconnected)
+                if not connected.done():
+                    connected.set_exception(
+                        ConnectionError(self.connect_stats[address]["error"])
+                    )
+                return
+            link_lost = await self.bluetooth_run_client(
+                client, disconnect_event, self.gatt_cache is not None, connected
+            )
+            if not link_lost or address not in self.auto_reconnect_devices:
+                return
+            # reconnections are attempted until disconnect is called
+            retries = None
+
+    async def bluetooth_connect_client(self, device, disconnect_event, retries):
+        address = device.address
+        request_time = time.monotonic()
+        client = None
+        error = None
+        attempts = 0
+        while client is None and (retries is None or attempts <= retries):
+            if attempts > 0:
+                # disconnect may be requested during the backoff
+                try:
+                    await asyncio.wait_for(
+                        disconnect_event.wait(),
+                        min(
+                            self.connect_retry_delay * 2 ** (attempts - 1),
+                            MAX_RECONNECT_DELAY,
+                        ),
+                    )
+                    break
+                except asyncio.TimeoutError:
+                    pass
+            async with self.connect_slots:
+                # disconnect may be requested while waiting
+                if disconnect_event.is_set():
+                    break
+                attempts += 1
+                connect_start = time.monotonic()
+                client = self.backend.create_client(
+                    device, self._disconnect_callback
+                )
+                try:
+                    await asyncio.wait_for(
+                        client.connect(), self.connect_timeout
+                    )
+                except Exception as e:
+                    client = None
+                    error = e
+        if client is not None and disconnect_event.is_set():
+            # disconnect was requested while connecting, the device is not
+            # reported as connected
+            await client.disconnect()
+            client = None
+        now = time.monotonic()
+        self.connect_stats[address] = {
+            "attempts": attempts,
+            "wait_time": connect_start - request_time if attempts else None,
+            "connect_time": now - connect_start if client else None,
+            "total_time": now - request_time,
+            "error": (
+                None
+                if client is not None
+                else repr(error)
+                if error is not None
+                else "cancelled"
+            ),
+        }
+        return client
+
+    async def bluetooth_run_client(
+        self, client, disconnect_event, cache_services=False, connected=None
+    ):
+        # client is connected, and disconnected once disconnect_event is set;
+        # returns True if the link was lost before
+        address = client.address
+        link_lost_event = asyncio.Event()
+        self.link_lost_events[address] = link_lost_event
+        try:
+            gatt_model = GattModel(client.services)
+            self.gatt_models[address] = gatt_model
+            self.connected_devices[address] = client
+            self.status_devices[address] = BleStatus.Connected
+            self._put_status(address, BleStatus.Connected)
+            if connected is not None and not connected.done():
+                connected.set_result(None)
+            if cache_services:
+                asyncio.ensure_future(
+                    self.bluetooth_update_gatt_cache(client, gatt_model)
+                )
+            if address in self.resubscriptions:
+                self.reconnect_stats[address]["reconnect_time"] = (
+                    time.monotonic() - self.reconnect_stats[address]["lost_at"]
+                )
+                for char_uuid, flag in self.resubscriptions.pop(address):
+                    asyncio.ensure_future(
+                        self._start_notify(address, char_uuid, flag)
+                    )
+            waits = [
+                asyncio.ensure_future(disconnect_event.wait()),
+                asyncio.ensure_future(link_lost_event.wait()),
+            ]
+            await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+            for wait in waits:
+                wait.cancel()
+            return not disconnect_event.is_set()
+        finally:
+            if self.link_lost_events.get(address) is link_lost_event:
+                del self.link_lost_events[address]
+            await client.disconnect()
+
+    async def bluetooth_update_gatt_cache(self, client, gatt_model):
+        was_cached = client.address in self.gatt_cache
+        db_hash = None
+        hash_char = gatt_model.get_characteristic(DATABASE_HASH_UUID)
+        if hash_char is not None and hash_char.flags & CharProperty.Read:
+            try:
+                db_hash = bytes(
+                    await client.read_gatt_char(hash_char.characteristic)
+                )
+            except Exception:
+                # the hash is optional, services are compared anyway
+                pass
+        if (
+            db_hash is not None
+            and self.gatt_cache.get_database_hash(client.address)
+            == db_hash.hex()
+        ):
+            # same database, the services are not compared
+            return
+        if self.gatt_cache.put(client.address, gatt_model, db_hash):
+            if was_cached:
+                self._put_status(client.address, BleStatus.ServicesChanged)
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.gatt_cache.save
+                )
+            except OSError as e:
+                # e.g. read-only home or full disk, the entry is kept in memory
+                self._put_status(
+                    client.address, BleStatus.ServicesCacheFailed, repr(e)
+                )
+
+    async def bluetooth_replay(self, replay, subscribe):
+        connections = []
+        for client in replay.create_clients(self._disconnect_callback):
+            self.status_devices[client.address] = BleStatus.Connecting
+            self._put_status(client.address, BleStatus.Connecting)
+            self.disconnect_events[client.address] = asyncio.Event()
+            await client.connect()
+            connection = asyncio.ensure_future(
+                self.bluetooth_run_client(
+                    client, self.disconnect_events[client.address]
+                )
+            )
+            self.connection_tasks[client.address] = connection
+            connections.append(connection)
+        await asyncio.sleep(0)
+        if subscribe:
+            subscriptions = [
+                (
+                    client.address,
+                    char.uuid,
+                    CharProperty.Notify
+                    if "notify" in char.properties
+                    else CharProperty.Indicate,
+                )
+                for client in replay.clients.values()
+                for char in client.services.characteristics.values()
+                if "notify" in char.properties or "indicate" in char.properties
+            ]
+            for dev_addr, char_uuid, flag in subscriptions:
+                asyncio.ensure_future(
+                    self._start_notify(dev_addr, char_uuid, flag)
+                )
+            # wait for subscriptions, so the start of the capture is not lost
+            deadline = time.monotonic() + REPLAY_SUBSCRIBE_TIMEOUT
+            while time.monotonic() < deadline and not all(
+                self._get_subscription(dev_addr, char_uuid) is not None
+                for dev_addr, char_uuid, _ in subscriptions
+            ):
+                await asyncio.sleep(0)
+        await replay.run()
+        for client in replay.clients.values():
+            if client.is_connected:
+                self._request_disconnect(client.address)
+        await asyncio.gather(*connections)
+
+    def _disconnect_callback(self, client):
+        if self.connected_devices.get(client.address) is not client:
+            # failed connection attempt, handled in bluetooth_connect
+            return
+        address = client.address
+        del self.connected_devices[address]
+        del self.status_devices[address]
+        gatt_model = self.gatt_models.pop(address, None)
+        subscriptions = self.notification_devices.pop(address, {})
+        # pending notification tasks end without stopping notifications
+        for stop_event in self.stop_notify_events.pop(address, {}).values():
+            stop_event.set()
+        link_lost = not self.disconnect_events[address].is_set()
+        if link_lost and address in self.auto_reconnect_devices:
+            now = time.monotonic()
+            stats = self.reconnect_stats.setdefault(address, {"link_losses": 0})
+            stats["link_losses"] += 1
+            stats["lost_at"] = now
+            stats["reconnect_time"] = None
+            stats["first_notification_time"] = None
+            self.resubscriptions[address] = list(subscriptions.items())
+            for char_uuid in subscriptions:
+                char = gatt_model.get_characteristic(char_uuid)
+                self.data_gaps[
+                    (address, char.handle)
+                ] = self.last_notification_times.get(
+                    (address, char.handle), now
+                )
+            self.status_devices[address] = BleStatus.Reconnecting
+            self._put_status(address, BleStatus.Reconnecting)
+        else:
+            self._put_status(address, BleStatus.Disconnected)
+        link_lost_event = self.link_lost_events.get(address)
+        if link_lost_event is not None:
+            link_lost_event.set()
+
+    async def bluetooth_read(self, client, char, timeout=None):
+        data = await asyncio.wait_for(client.read_gatt_char(char), timeout)
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.record(client.address, char, data)
+        self._put_data(client.address, char.handle, data)
+        return data
+
+    async def bluetooth_write(self, client, char, data, response, timeout=None):
+        try:
+            await asyncio.wait_for(
+                client.write_gatt_char(char, data, response), timeout
+            )
+        except Exception:
+            self._put_status(client.address, BleStatus.WriteFailed, char.uuid)
+            raise
+        self._put_status(client.address, BleStatus.WriteSuccessful, char.uuid)
+
+    async def bluetooth_write_stream(self, client, char, stream):
+        await stream.run(client, char)
+        if stream.error is not None or stream.cancelled:
+            self._put_status(client.address, BleStatus.WriteFailed, char.uuid)
+        else:
+            self._put_status(
+                client.address, BleStatus.WriteSuccessful, char.uuid
+            )
+
+    async def bluetooth_start_notify(self, client, char, key, flag):
+        # key is the uuid or handle notifications were started with
+        kwargs = {}
+        if flag == CharProperty.Indicate:
+            # only needed on windows, other stacks enable indications of
+            # characteristics that can't notify, and notifications otherwise
+            kwargs["force_indicate"] = True
+            indication_stats = IndicationStats()
+            self.indication_stats[
+                (client.address, char.handle)
+            ] = indication_stats
+            self.indication_stats[(client.address, key)] = indication_stats
+        else:
+            # notifications of the characteristic are not counted
+            self.indication_stats.pop((client.address, char.handle), None)
+            self.indication_stats.pop((client.address, key), None)
+        await client.start_notify(
+            char,
+            lambda char, data: self.bluetooth_notify_callback(
+                client, char, data
+            ),
+            **kwargs,
+        )
+        self.notification_devices[client.address][key] = flag
+        self._put_status(
+            client.address, BleStatus.NotificationsEnabled, char.uuid
+        )
+
+    async def bluetooth_stop_notify(self, client, char, key, stop_event):
+        await stop_event.wait()
+        if client.is_connected:
+            await client.stop_notify(char)
+            self.notification_devices.get(client.address, {}).pop(key, None)
+        self._put_status(
+            client.address, BleStatus.NotificationsDisabled, char.uuid
+        )
+        # async iterators end, unless the device is being reconnected
+        subscribers = self.notification_subscribers.get(
+            (client.address, char.handle)
+        )
+        if subscribers and client.address not in self.resubscriptions:
+            for notifications in subscribers:
+                self._put_bounded(notifications, None)
+
+    def bluetooth_notify_callback(self, client, char, data):
+        if (
+            self.auto_reconnect_devices
+            and client.address in self.auto_reconnect_devices
+        ):
+            self._track_data_gap(client.address, char)
+        if self.indication_stats:
+            indication_stats = self.indication_stats.get(
+                (client.address, char.handle)
+            )
+            if indication_stats is not None:
+                indication_stats.add(time.monotonic())
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.record(client.address, char, data)
+        if self.notification_subscribers:
+            subscribers = self.notification_subscribers.get(
+                (client.address, char.handle)
+            )
+            if subscribers is not None:
+                for notifications in subscribers:
+                    self._put_bounded(notifications, data)
+        if self.data_buffers:
+            data_buffer = self.data_buffers.get((client.address, char.handle))
+            if data_buffer is None:
+                data_buffer = self.data_buffers.get((client.address, char.uuid))
+            if data_buffer is not None:
+                data_buffer.write(data, time.monotonic())
+                return
+        self._put_data(client.address, char.handle, data)
+
+    def _track_data_gap(self, address, char):
+        now = time.monotonic()
+        if self.data_gaps:
+            gap_start = self.data_gaps.pop((address, char.handle), None)
+            if gap_start is not None:
+                # first notification after a reconnection
+                data_gap = DataGap(gap_start, now)
+                for notifications in self.notification_subscribers.get(
+                    (address, char.handle), []
+                ):
+                    self._put_bounded(notifications, data_gap)
+                self._put_data(address, char.handle, data_gap)
+                stats = self.reconnect_stats[address]
+                if stats["first_notification_time"] is None:
+                    stats["first_notification_time"] = now - stats["lost_at"]
+        self.last_notification_times[(address, char.handle)] = now
+
+    def _put_status(self, *status):
+        for events in self.status_subscribers:
+            self._put_bounded(events, status)
+        if self.status_callback is not None:
+            self.status_callback(status)
+
+    def _put_data(self, address, handle, data):
+        if self.data_callback is not None:
+            self.data_callback(address, handle, data)
+
+    def _put_bounded(self, items_queue, item):
+        # the oldest item is dropped when the queue is full
+        if items_queue.full():
+            items_queue.get_nowait()
+        items_queue.put_nowait(item)
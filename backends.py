@@ -0,0 +1,11 @@
+class BleakBackend:
+    # bleak is imported on first use, it pulls in the platform BLE stack
+    def create_scanner(self, detection_callback, **kwargs):
+        from bleak import BleakScanner
+
+        return BleakScanner(detection_callback=detection_callback, **kwargs)
+
+    def create_client(self, device, disconnected_callback, **kwargs):
+        from bleak import BleakClient
+
+        return BleakClient(device, disconnected_callback, **kwargs)
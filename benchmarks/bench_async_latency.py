@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import statistics
+import struct
+import threading
+import time
+
+import fakes  # noqa: F401
+
+from async_ble import AsyncBle
+from ble import Ble
+from gatt import CharProperty
+from simulated import SimulatedBackend, SimulatedPeripheral
+
+
+def create_peripheral(args):
+    return SimulatedPeripheral(
+        "5E:00:00:00:00:01",
+        connection_latency=0,
+        notification_rate=args.rate,
+        timestamp_payloads=True,
+    )
+
+
+def find_chars(gatt_model):
+    chars = gatt_model.chars_by_handle.values()
+    notify_char = next(c for c in chars if c.flags & CharProperty.Notify)
+    read_char = next(c for c in chars if c.flags & CharProperty.Read)
+    return notify_char.uuid, read_char.uuid
+
+
+def get_latency(data):
+    return time.perf_counter() - struct.unpack_from("<d", data, 4)[0]
+
+
+def run_threaded(args):
+    # events are taken by a consumer thread woken up by Ble, as the GUI does
+    peripheral = create_peripheral(args)
+    ble = Ble(backend=SimulatedBackend([peripheral]))
+    ble.connect(peripheral.device).result()
+    gatt_model = ble.get_gatt_model(peripheral.address)
+    notify_uuid, read_uuid = find_chars(gatt_model)
+    # data events are keyed by characteristic handle
+    notify_handle = gatt_model.get_characteristic(notify_uuid).handle
+    wakeup = threading.Event()
+    ble.set_wakeup_callback(wakeup.set)
+    latencies = []
+    ble.start_notifications_characteristic(
+        peripheral.address, notify_uuid
+    ).result()
+    deadline = time.monotonic() + args.duration
+    while time.monotonic() < deadline:
+        wakeup.wait(0.1)
+        wakeup.clear()
+        ble.clear_wakeup()
+        for _, handle, data in ble.get_data_events():
+            if handle == notify_handle:
+                latencies.append(get_latency(data))
+    ble.stop_notifications_characteristic(
+        peripheral.address, notify_uuid
+    ).result()
+    ble.set_wakeup_callback(None)
+    read_times = []
+    for _ in range(args.reads):
+        start = time.perf_counter()
+        ble.read_characteristic(peripheral.address, read_uuid).result()
+        read_times.append(time.perf_counter() - start)
+    ble.disconnect(peripheral.address).result()
+    return latencies, read_times
+
+
+async def run_async(args):
+    # notifications are consumed with an async iterator on the same loop
+    peripheral = create_peripheral(args)
+    ble = AsyncBle(backend=SimulatedBackend([peripheral]))
+    await ble.connect(peripheral.device)
+    notify_uuid, read_uuid = find_chars(ble.get_gatt_model(peripheral.address))
+    latencies = []
+    deadline = time.monotonic() + args.duration
+    notifications = ble.notifications(peripheral.address, notify_uuid)
+    async for data in notifications:
+        latencies.append(get_latency(data))
+        if time.monotonic() >= deadline:
+            break
+    await notifications.aclose()
+    read_times = []
+    for _ in range(args.reads):
+        start = time.perf_counter()
+        await ble.read_characteristic(peripheral.address, read_uuid)
+        read_times.append(time.perf_counter() - start)
+    await ble.disconnect(peripheral.address)
+    return latencies, read_times
+
+
+def print_stats(name, latencies, read_times):
+    latencies.sort()
+    print(
+        f"  {name:<20} notification latency median "
+        f"{statistics.median(latencies) * 1e6:6.0f} us, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:6.0f} us, "
+        f"max {latencies[-1] * 1e6:6.0f} us, "
+        f"read round trip median {statistics.median(read_times) * 1e6:5.0f} us"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Notification and read latency, through the Ble event "
+        "loop thread or with AsyncBle on the caller's loop"
+    )
+    parser.add_argument("--rate", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--reads", type=int, default=1000)
+    args = parser.parse_args()
+    print(f"{args.rate} notifications/s for {args.duration} s")
+    print_stats("Ble, woken up", *run_threaded(args))
+    print_stats("AsyncBle, async for", *asyncio.run(run_async(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from fakes import FakeNotifyingClient, measure_loop_lag
+
+from ble import Ble
+from capture import CaptureReader
+
+
+async def notify_all(ble, clients, rate, duration):
+    results = await asyncio.gather(
+        measure_loop_lag(0.005, duration),
+        *[client.notify(ble.async_ble, rate, duration) for client in clients],
+    )
+    return results[0], sum(results[1:])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recording of notifications to a capture file"
+    )
+    parser.add_argument("--devices", type=int, default=4)
+    parser.add_argument("--rate", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--payload", type=int, default=20)
+    parser.add_argument("--record", action=argparse.BooleanOptionalAction)
+    args = parser.parse_args()
+    clients = [
+        FakeNotifyingClient(f"00:11:22:33:44:{i:02X}", 2, args.payload)
+        for i in range(args.devices)
+    ]
+    capture_path = os.path.join(tempfile.mkdtemp(), "bench.blxcap")
+    ble = Ble(data_queue_size=1000)
+    if args.record is not False:
+        ble.start_recording(capture_path)
+    start = time.monotonic()
+    lags, sent = asyncio.run_coroutine_threadsafe(
+        notify_all(ble, clients, args.rate, args.duration), ble.event_loop
+    ).result()
+    elapsed = time.monotonic() - start
+    recording_stats = ble.get_recording_stats()
+    ble.stop_recording()
+    print(f"devices={args.devices} rate={args.rate} Hz per device")
+    print(f"  notifications: {sent} ({sent / elapsed:.0f}/s)")
+    print(
+        f"  loop lag: mean {statistics.mean(lags) * 1e3:.2f} ms, "
+        f"max {max(lags) * 1e3:.2f} ms"
+    )
+    if recording_stats is None:
+        return
+    print(
+        f"  writer: {recording_stats['batches']} write calls, "
+        f"max pending records {recording_stats['max_pending']}"
+    )
+    print(f"  file size: {os.path.getsize(capture_path)} B")
+    open_start = time.perf_counter()
+    with CaptureReader(capture_path) as reader:
+        open_time = time.perf_counter() - open_start
+        print(f"  reader: {reader.num_records} records, opened in ", end="")
+        print(f"{open_time * 1e3:.2f} ms")
+        middle = (reader.start_time_ns + reader.end_time_ns) // 2
+        seek_start = time.perf_counter()
+        reader.seek(middle)
+        seek_time = time.perf_counter() - seek_start
+        print(f"  seek to middle: {seek_time * 1e6:.0f} us")
+        read_start = time.perf_counter()
+        num_records = sum(1 for _ in reader.records())
+        read_time = time.perf_counter() - read_start
+        print(f"  full read: {num_records / read_time:.0f} records/s")
+    os.remove(capture_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import argparse
+import time
+
+import fakes  # noqa: F401
+
+from ble import Ble
+from gatt import CharProperty, GattModel
+from simulated import SimulatedBackend, SimulatedPeripheral
+
+
+def list_lookup(services, char_uuid):
+    # previous behaviour, lists rebuilt on every operation
+    chars = list(services.characteristics.values())
+    chars_uuids = [char.uuid for char in chars]
+    chars_properties = [char.properties for char in chars]
+    if char_uuid in chars_uuids:
+        i_char = chars_uuids.index(char_uuid)
+        if "write" in chars_properties[i_char]:
+            return chars[i_char]
+    return None
+
+
+def index_lookup(gatt_model, char_uuid):
+    char = gatt_model.get_characteristic(char_uuid)
+    if char is not None and char.flags & CharProperty.Write:
+        return char.characteristic
+    return None
+
+
+def time_lookups(lookup, container, uuids, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for uuid in uuids:
+            lookup(container, uuid)
+    return (time.perf_counter() - start) / (iterations * len(uuids))
+
+
+def time_writes(num_services, num_chars, num_writes):
+    peripheral = SimulatedPeripheral(
+        "5E:00:00:00:00:01",
+        num_services=num_services,
+        num_characteristics=num_chars,
+        notification_rate=0,
+    )
+    backend = SimulatedBackend([peripheral])
+    ble = Ble(backend=backend)
+    ble.connect(peripheral.device)
+    while not ble.is_connected(peripheral.address):
+        time.sleep(0.01)
+    gatt_model = ble.get_gatt_model(peripheral.address)
+    uuid = next(
+        char.uuid
+        for char in gatt_model.chars_by_handle.values()
+        if char.flags & CharProperty.Write
+    )
+    data = bytes(20)
+    client = backend.clients[peripheral.address]
+    start = time.perf_counter()
+    for _ in range(num_writes):
+        ble.write_characteristic(peripheral.address, uuid, data)
+    call_time = (time.perf_counter() - start) / num_writes
+    while client.writes < num_writes:
+        time.sleep(0.01)
+    total_time = time.perf_counter() - start
+    ble.disconnect(peripheral.address)
+    return call_time, num_writes / total_time
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Characteristic lookup for read/write/notify dispatch"
+    )
+    parser.add_argument("--services", type=int, default=30)
+    parser.add_argument("--chars", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--writes", type=int, default=20000)
+    args = parser.parse_args()
+    peripheral = SimulatedPeripheral(
+        "5E:00:00:00:00:00",
+        num_services=args.services,
+        num_characteristics=args.chars,
+    )
+    services = peripheral.create_services()
+    gatt_model = GattModel(services)
+    uuids = [char.uuid for char in services.characteristics.values()]
+    print(f"characteristics: {len(uuids)}")
+    list_time = time_lookups(list_lookup, services, uuids, args.iterations)
+    index_time = time_lookups(index_lookup, gatt_model, uuids, args.iterations)
+    print(f"  list lookup:  {list_time * 1e6:8.2f} us")
+    print(f"  index lookup: {index_time * 1e6:8.2f} us")
+    call_time, write_rate = time_writes(args.services, args.chars, args.writes)
+    print(
+        f"  write_characteristic: {call_time * 1e6:.1f} us per call, "
+        f"{write_rate:.0f} writes/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
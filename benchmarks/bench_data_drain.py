@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import time
+
+from fakes import FakeNotifyingClient
+
+from ble import Ble
+from event_queue import OverflowPolicy
+
+
+GUI_TICK = 0.05  # period of the GUI loop, matches window.read(timeout=50)
+
+
+def consume_single(ble):
+    data = ble.get_data_event()
+    return 0 if data is None else 1
+
+
+def consume_batch(ble):
+    latest_data = {}
+    events = ble.get_data_events(5000, 0.02)
+    for dev_addr, char_handle, data in events:
+        latest_data[(dev_addr, char_handle)] = data
+    for data in latest_data.values():
+        data.hex()
+    return len(events)
+
+
+def run(mode, rate, duration, num_chars, payload_size, queue_size, policy):
+    ble = Ble(data_queue_size=queue_size, data_queue_policy=policy)
+    client = FakeNotifyingClient("00:11:22:33:44:55", num_chars, payload_size)
+    consume = consume_single if mode == "single" else consume_batch
+    producer = asyncio.run_coroutine_threadsafe(
+        client.notify(ble.async_ble, rate, duration), ble.event_loop
+    )
+    consumed = 0
+    depths = []
+    start = time.monotonic()
+    next_sample = start + 1
+    while not producer.done():
+        consumed += consume(ble)
+        now = time.monotonic()
+        if now >= next_sample:
+            depths.append(ble.data_queue.qsize())
+            next_sample += 1
+        time.sleep(GUI_TICK)
+    elapsed = time.monotonic() - start
+    produced = producer.result()
+    print(f"mode={mode} rate={rate} Hz duration={duration} s")
+    print(f"  produced: {produced} ({produced / elapsed:.1f} events/s)")
+    print(f"  consumed: {consumed} ({consumed / elapsed:.1f} events/s)")
+    print(f"  queue depth per second: {depths}")
+    print(f"  final queue depth: {ble.data_queue.qsize()}")
+    stats = ble.get_queue_stats()["data"]
+    print(f"  dropped: {stats['dropped']} coalesced: {stats['coalesced']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Throughput of GUI-style consumption of BLE data events"
+    )
+    parser.add_argument("--rate", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--chars", type=int, default=4)
+    parser.add_argument("--payload", type=int, default=20)
+    parser.add_argument(
+        "--mode", choices=["single", "batch", "both"], default="both"
+    )
+    parser.add_argument("--queue-size", type=int, default=10000)
+    parser.add_argument(
+        "--policy",
+        choices=[policy.name for policy in OverflowPolicy],
+        default=OverflowPolicy.DropOldest.name,
+    )
+    args = parser.parse_args()
+    modes = ["single", "batch"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        run(
+            mode,
+            args.rate,
+            args.duration,
+            args.chars,
+            args.payload,
+            args.queue_size,
+            OverflowPolicy[args.policy],
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import statistics
+import time
+import tkinter
+from tkinter import ttk
+
+import fakes  # noqa: F401
+
+from ble import Ble
+from simulated import SimulatedBackend
+
+
+GUI_TICK = 0.05  # period of the GUI loop, matches window.read(timeout=50)
+TABLE_REFRESH_PERIOD = 0.25  # same as in blexplorer.py
+
+
+def create_table():
+    # the Treeview operations are only measured when a display is available
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError:
+        return None, None
+    table = ttk.Treeview(root, columns=("name", "address", "rssi"))
+    table.pack()
+    return root, table
+
+
+class FullRebuild:
+    # previous behaviour, the whole table is sent on every found device
+    def __init__(self, ble, table):
+        self.ble = ble
+        self.table = table
+
+    def tick(self):
+        if self.ble.has_found_device():
+            devices = self.ble.get_found_devices()
+            rows = [
+                [dev["name"], dev["address"], dev["rssi"]] for dev in devices
+            ]
+            if self.table is not None:
+                self.table.delete(*self.table.get_children())
+                for i, row in enumerate(rows):
+                    self.table.insert("", "end", iid=str(i + 1), values=row)
+                self.table.update()
+
+
+class Incremental:
+    def __init__(self, ble, table):
+        self.ble = ble
+        self.table = table
+        self.last_update = 0
+
+    def tick(self):
+        now = time.monotonic()
+        if now - self.last_update < TABLE_REFRESH_PERIOD:
+            return
+        self.last_update = now
+        added, changed, removed = self.ble.get_found_devices_diff()
+        for dev in added:
+            if self.table is not None:
+                self.table.insert(
+                    "",
+                    "end",
+                    iid=str(dev["row"]),
+                    values=[dev["name"], dev["address"], dev["rssi"]],
+                )
+        for dev in changed:
+            if self.table is not None:
+                self.table.item(
+                    str(dev["row"]),
+                    values=[dev["name"], dev["address"], dev["rssi"]],
+                )
+        for address in removed:
+            if self.table is not None:
+                self.table.delete(str(self.ble.get_device_row(address)))
+
+
+def run(mode, num_advertisers, interval, duration, root, table):
+    backend = SimulatedBackend.with_advertisers(
+        num_advertisers, advertisement_interval=interval
+    )
+    ble = Ble(backend=backend)
+    if table is not None:
+        table.delete(*table.get_children())
+    updater = (
+        FullRebuild(ble, table) if mode == "full" else Incremental(ble, table)
+    )
+    ble.start_scan()
+    tick_times = []
+    start = time.monotonic()
+    while time.monotonic() - start < duration:
+        tick_start = time.perf_counter()
+        updater.tick()
+        if root is not None:
+            root.update()
+        tick_times.append(time.perf_counter() - tick_start)
+        time.sleep(GUI_TICK)
+    ble.stop_scan()
+    print(
+        f"  {mode:<11} mean {statistics.mean(tick_times) * 1e3:7.3f} ms, "
+        f"max {max(tick_times) * 1e3:7.3f} ms per tick"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Per-tick GUI time of the devices table"
+    )
+    parser.add_argument(
+        "--advertisers", type=int, nargs="+", default=[50, 500, 2000]
+    )
+    parser.add_argument("--interval", type=float, default=0.1)
+    parser.add_argument("--duration", type=float, default=5)
+    args = parser.parse_args()
+    root, table = create_table()
+    if table is None:
+        print("no display, measuring without Treeview operations")
+    for num_advertisers in args.advertisers:
+        print(f"advertisers={num_advertisers}")
+        for mode in ["full", "incremental"]:
+            run(
+                mode, num_advertisers, args.interval, args.duration, root, table
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from fakes import measure_loop_lag
+
+from ble import Ble
+from fanout import FanoutServer, get_topic, subscribe
+from headless import find_characteristics
+from simulated import SimulatedBackend
+
+
+async def fast_subscriber(path, topics, duration, latencies):
+    # latency from publication to reception, wall clock times
+    received = 0
+    deadline = time.monotonic() + duration
+    async for message in subscribe(topics, path=path):
+        latencies.append(time.time() - message["time"])
+        received += 1
+        if time.monotonic() >= deadline:
+            break
+    return received
+
+
+async def slow_subscriber(path, topics, duration, read_period):
+    # reads a few kB now and then, its socket buffers fill up
+    reader, writer = await asyncio.open_unix_connection(path)
+    writer.write((json.dumps({"subscribe": topics}) + "\n").encode())
+    await writer.drain()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        await reader.read(4096)
+        await asyncio.sleep(read_period)
+    writer.close()
+
+
+async def get_stats(server, delay):
+    await asyncio.sleep(delay)
+    return server.get_stats()
+
+
+async def run_subscribers(server, path, topics, args, with_slow):
+    latencies = []
+    subscribers = [
+        fast_subscriber(path, topics, args.duration, latencies)
+        for _ in range(args.subscribers)
+    ]
+    if with_slow:
+        subscribers.append(
+            slow_subscriber(path, topics, args.duration, args.slow_period)
+        )
+    # subscribers are removed from the stats once disconnected
+    stats, *received = await asyncio.gather(
+        get_stats(server, args.duration - 0.1), *subscribers
+    )
+    return received[: args.subscribers], latencies, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Notifications published to local subscribers, with and "
+        "without a slow subscriber"
+    )
+    parser.add_argument("--devices", type=int, default=2)
+    parser.add_argument(
+        "--rate", type=int, default=500, help="per characteristic"
+    )
+    parser.add_argument("--subscribers", type=int, default=3)
+    parser.add_argument(
+        "--slow-period",
+        type=float,
+        default=0.5,
+        help="time (s) between reads of the slow subscriber",
+    )
+    parser.add_argument("--duration", type=float, default=5)
+    args = parser.parse_args()
+    backend = SimulatedBackend.with_advertisers(
+        args.devices, connection_latency=0, notification_rate=args.rate
+    )
+    ble = Ble(backend=backend)
+    for peripheral in backend.peripherals:
+        ble.connect(peripheral.device).result()
+    topics = [
+        get_topic(address, char.uuid)
+        for address in ble.get_connected_devices()
+        for char in find_characteristics(ble.get_gatt_model(address), None)
+    ]
+    path = os.path.join(tempfile.mkdtemp(), "fanout.sock")
+    server = FanoutServer(ble.async_ble)
+    asyncio.run_coroutine_threadsafe(
+        server.start_unix(path), ble.event_loop
+    ).result()
+    print(
+        f"{len(topics)} topics at {args.rate} notifications/s, "
+        f"{args.subscribers} subscribers"
+    )
+    for with_slow in [False, True]:
+        # the radio side runs on the Ble event loop, with the server
+        loop_lag = asyncio.run_coroutine_threadsafe(
+            measure_loop_lag(0.005, args.duration), ble.event_loop
+        )
+        received, latencies, stats = asyncio.run(
+            run_subscribers(server, path, topics, args, with_slow)
+        )
+        lags = loop_lag.result()
+        latencies.sort()
+        print(
+            f"  {'with' if with_slow else 'without'} slow subscriber: "
+            f"{statistics.mean(received) / args.duration:6.0f}/s per "
+            f"subscriber, latency median "
+            f"{statistics.median(latencies) * 1e3:5.2f} ms, p99 "
+            f"{latencies[int(len(latencies) * 0.99)] * 1e3:5.2f} ms, "
+            f"loop lag max {max(lags) * 1e3:5.2f} ms"
+        )
+        for name, subscriber_stats in stats.items():
+            print(
+                f"    {name:<18} sent {subscriber_stats['sent']:6d}, dropped "
+                f"{subscriber_stats['dropped']:6d}, pending "
+                f"{subscriber_stats['pending']:4d}, lag "
+                f"{subscriber_stats['lag'] * 1e3:7.1f} ms, max "
+                f"{subscriber_stats['lag_max'] * 1e3:7.1f} ms"
+            )
+    asyncio.run_coroutine_threadsafe(server.stop(), ble.event_loop).result()
+    for address in ble.get_connected_devices():
+        ble.disconnect(address).result()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import os
+import tempfile
+import time
+
+import fakes  # noqa: F401
+
+from ble import Ble, BleStatus
+from simulated import SimulatedBackend, SimulatedPeripheral
+
+
+def connect(cache_path, peripheral):
+    # time until services can be shown, and until the device is connected
+    ble = Ble(
+        backend=SimulatedBackend([peripheral]), gatt_cache_path=cache_path
+    )
+    start = time.perf_counter()
+    ble.connect(peripheral.device)
+    services_time = None
+    connected_time = None
+    changed = False
+    # cache validation completes shortly after the connection
+    while (
+        connected_time is None
+        or time.perf_counter() - start < connected_time + 0.2
+    ):
+        for status in ble.get_status_events():
+            if status[1] == BleStatus.ServicesChanged:
+                changed = True
+            if services_time is None and status[1] in [
+                BleStatus.ServicesCached,
+                BleStatus.Connected,
+            ]:
+                gatt_model = ble.get_gatt_model(peripheral.address)
+                if gatt_model is None:
+                    gatt_model = ble.get_cached_gatt_model(peripheral.address)
+                len(gatt_model.services)
+                services_time = time.perf_counter() - start
+            if status[1] == BleStatus.Connected:
+                connected_time = time.perf_counter() - start
+        time.sleep(0.001)
+    ble.disconnect(peripheral.address)
+    time.sleep(0.05)
+    return services_time, connected_time, changed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time until services of a known device can be shown"
+    )
+    parser.add_argument("--services", type=int, default=30)
+    parser.add_argument("--chars", type=int, default=20)
+    parser.add_argument(
+        "--discovery", type=float, default=2, help="connection time (s)"
+    )
+    args = parser.parse_args()
+    cache_path = os.path.join(tempfile.mkdtemp(), "gatt_cache.json")
+    runs = [
+        ("first connection", args.services, b"\x01" * 16),
+        ("known device", args.services, b"\x01" * 16),
+        ("services changed", args.services + 1, b"\x02" * 16),
+    ]
+    for name, num_services, database_hash in runs:
+        peripheral = SimulatedPeripheral(
+            "5E:00:00:00:00:01",
+            num_services=num_services,
+            num_characteristics=args.chars,
+            connection_latency=args.discovery,
+            notification_rate=0,
+            database_hash=database_hash,
+        )
+        services_time, connected_time, changed = connect(cache_path, peripheral)
+        print(
+            f"  {name:<17} services shown after {services_time * 1e3:7.1f} ms, "
+            f"connected after {connected_time * 1e3:7.1f} ms"
+            + (", services changed" if changed else "")
+        )
+    print(f"  cache size: {os.path.getsize(cache_path)} bytes")
+    os.remove(cache_path)
+
+
+if __name__ == "__main__":
+    main()
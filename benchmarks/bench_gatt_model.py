@@ -0,0 +1,104 @@
+import argparse
+import time
+
+import fakes  # noqa: F401
+
+from gatt import GattModel
+from simulated import SimulatedPeripheral
+
+
+def build_dicts(services):
+    # previous get_services_and_characteristics, rebuilt on every call
+    services_collection = {}
+    for _, service in services.services.items():
+        services_collection[service.uuid] = {
+            "name": service.description,
+            "service": service,
+        }
+        service_characteristics = {}
+        for characteristic in service.characteristics:
+            service_characteristics[characteristic.uuid] = {
+                "name": characteristic.description,
+                "properties": characteristic.properties,
+                "characteristic": characteristic,
+            }
+            characteristic_descriptors = {}
+            for descriptor in characteristic.descriptors:
+                characteristic_descriptors[descriptor.uuid] = {
+                    "name": descriptor.description,
+                    "descriptor": descriptor,
+                }
+            service_characteristics[characteristic.uuid][
+                "descriptors"
+            ] = characteristic_descriptors
+        services_collection[service.uuid][
+            "characteristics"
+        ] = service_characteristics
+    return services_collection
+
+
+def dicts_descriptor_event(services, char_uuid):
+    # previous handling of a descriptor combo event
+    services_collection = build_dicts(services)
+    service = [
+        serv
+        for _, serv in services_collection.items()
+        if char_uuid in serv["characteristics"].keys()
+    ][0]
+    char = service["characteristics"][char_uuid]
+    return [desc["name"] for _, desc in char["descriptors"].items()]
+
+
+def model_descriptor_event(gatt_model, char_uuid):
+    char = gatt_model.get_characteristic(char_uuid)
+    return [desc.name for desc in char.descriptors]
+
+
+def time_calls(func, arg, uuids, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for uuid in uuids:
+            func(arg, uuid)
+    return (time.perf_counter() - start) / (iterations * len(uuids))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Cached GATT model against rebuilt nested dicts"
+    )
+    parser.add_argument("--services", type=int, default=30)
+    parser.add_argument("--chars", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+    peripheral = SimulatedPeripheral(
+        "5E:00:00:00:00:00",
+        num_services=args.services,
+        num_characteristics=args.chars,
+    )
+    services = peripheral.create_services()
+    uuids = [char.uuid for char in services.characteristics.values()]
+    print(f"{args.services} services x {args.chars} characteristics")
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        build_dicts(services)
+    dicts_time = (time.perf_counter() - start) / args.iterations
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        gatt_model = GattModel(services)
+    model_time = (time.perf_counter() - start) / args.iterations
+    print(f"  build nested dicts: {dicts_time * 1e3:.3f} ms")
+    print(
+        f"  build gatt model:   {model_time * 1e3:.3f} ms (once per connection)"
+    )
+    dicts_event = time_calls(
+        dicts_descriptor_event, services, uuids, args.iterations
+    )
+    model_event = time_calls(
+        model_descriptor_event, gatt_model, uuids, args.iterations
+    )
+    print(f"  descriptor event, dicts: {dicts_event * 1e6:9.2f} us")
+    print(f"  descriptor event, model: {model_event * 1e6:9.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import time
+import tkinter
+
+import fakes  # noqa: F401
+
+import PySimpleGUI as sg
+
+from blexplorer import BLExplorerGUI
+
+
+def count_elements(rows):
+    num_elements = 0
+    for row in rows:
+        for element in row:
+            num_elements += 1
+            num_elements += count_elements(getattr(element, "Rows", []))
+    return num_elements
+
+
+def has_display():
+    try:
+        tkinter.Tk().destroy()
+    except tkinter.TclError:
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time to create the main window layout"
+    )
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+    # the layout does not need the BLE thread
+    gui = BLExplorerGUI.__new__(BLExplorerGUI)
+    layout_times = []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        layout = gui._create_layout()
+        layout_times.append(time.perf_counter() - start)
+    print(
+        f"  layout: {min(layout_times) * 1e3:6.1f} ms, "
+        f"{count_elements(layout)} elements"
+    )
+    if not has_display():
+        print("  no display, window creation not measured")
+        return
+    window_times = []
+    for _ in range(args.repeats):
+        layout = gui._create_layout()
+        start = time.perf_counter()
+        window = sg.Window("BLExplorer", layout, finalize=True)
+        window_times.append(time.perf_counter() - start)
+        window.close()
+    print(f"  window: {min(window_times) * 1e3:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import argparse
+import asyncio
+import math
+import queue
+import statistics
+import struct
+import threading
+import time
+
+from fakes import FakeCharacteristic
+
+from ble import Ble
+
+
+POLL_TIMEOUT = 50  # previous window.read timeout (ms)
+MIN_UPDATE_PERIOD = 0.02  # same as in blexplorer.py
+
+
+class QueueWindow:
+    # stands in for the window, read blocks on the events written by other
+    # threads like the tkinter event loop does
+    def __init__(self):
+        self.events = queue.Queue()
+
+    def read(self, timeout=None):
+        try:
+            return self.events.get(
+                timeout=timeout / 1000 if timeout is not None else None
+            )
+        except queue.Empty:
+            return "__TIMEOUT__"
+
+    def write_event_value(self, key, value):
+        self.events.put(key)
+
+
+class FakeClient:
+    def __init__(self, address):
+        self.address = address
+
+
+async def notify(ble, rate, duration):
+    # payloads carry the time they were sent
+    client = FakeClient("00:11:22:33:44:55")
+    char = FakeCharacteristic("0000fff1-0000-1000-8000-00805f9b34fb")
+    start = time.monotonic()
+    while time.monotonic() - start < duration:
+        payload = bytearray(struct.pack("<d", time.perf_counter()))
+        ble.async_ble.bluetooth_notify_callback(client, char, payload)
+        await asyncio.sleep(1 / rate)
+
+
+def run(mode, args):
+    ble = Ble()
+    window = QueueWindow()
+    latencies = []
+    if mode == "wakeup":
+        ble.set_wakeup_callback(
+            lambda: window.write_event_value("-BLE_WAKEUP-", None)
+        )
+
+    def loop():
+        # runs until the end of the phase is written to the window
+        woken = False
+        last_update = 0
+        while True:
+            if mode == "poll":
+                event = window.read(POLL_TIMEOUT)
+            else:
+                timeout = None
+                if woken:
+                    timeout = max(
+                        0,
+                        math.ceil(
+                            (last_update + MIN_UPDATE_PERIOD - time.monotonic())
+                            * 1000
+                        ),
+                    )
+                event = window.read(timeout)
+                woken |= event == "-BLE_WAKEUP-"
+            if event == "-DONE-":
+                return
+            if mode == "wakeup":
+                now = time.monotonic()
+                if not woken or now - last_update < MIN_UPDATE_PERIOD:
+                    continue
+                last_update = now
+                ble.clear_wakeup()
+            for _, _, data in ble.get_data_events(5000, 0.02):
+                sent = struct.unpack("<d", data)[0]
+                latencies.append(time.perf_counter() - sent)
+            if mode == "wakeup":
+                woken = ble.has_events()
+
+    # idle, nothing connected
+    threading.Timer(
+        args.idle, lambda: window.write_event_value("-DONE-", None)
+    ).start()
+    cpu_start = time.process_time()
+    loop()
+    idle_cpu = (time.process_time() - cpu_start) / args.idle
+    # notifications
+    producer = asyncio.run_coroutine_threadsafe(
+        notify(ble, args.rate, args.duration), ble.event_loop
+    )
+    producer.add_done_callback(
+        lambda _: window.write_event_value("-DONE-", None)
+    )
+    cpu_start = time.process_time()
+    loop()
+    busy_cpu = (time.process_time() - cpu_start) / args.duration
+    latencies.sort()
+    print(
+        f"  {mode:<7} idle cpu {idle_cpu * 100:5.2f} %, "
+        f"cpu at {args.rate} Hz {busy_cpu * 100:5.2f} %, "
+        f"latency median {statistics.median(latencies) * 1e3:5.1f} ms, "
+        f"p95 {latencies[int(len(latencies) * 0.95)] * 1e3:5.1f} ms, "
+        f"max {latencies[-1] * 1e3:5.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Idle cpu and notification to display latency of the "
+        "GUI loop"
+    )
+    parser.add_argument("--idle", type=float, default=5)
+    parser.add_argument("--rate", type=int, default=17)
+    parser.add_argument("--duration", type=float, default=5)
+    args = parser.parse_args()
+    for mode in ["poll", "wakeup"]:
+        run(mode, args)
+
+
+if __name__ == "__main__":
+    main()
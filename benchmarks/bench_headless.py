@@ -0,0 +1,131 @@
+import argparse
+import os
+import threading
+import time
+
+import fakes  # noqa: F401
+
+from blexplorer import (
+    DATA_QUEUE_SIZE,
+    MAX_EVENTS_DRAIN_TIME,
+    MAX_EVENTS_PER_UPDATE,
+    MIN_UPDATE_PERIOD,
+)
+from ble import Ble, OverflowPolicy
+from headless import CaptureSink, HeadlessStreamer, NdjsonSink
+from headless import find_characteristics
+from simulated import SimulatedBackend
+
+
+CHARS_PER_DEVICE = 3  # notifying characteristics of simulated devices
+
+
+def connect(ble, backend):
+    for peripheral in backend.peripherals:
+        ble.connect(peripheral.device).result()
+    return [
+        (address, char)
+        for address in ble.get_connected_devices()
+        for char in find_characteristics(ble.get_gatt_model(address), None)
+    ]
+
+
+def run_gui(backend, duration):
+    # data path of the GUI: queued events drained on wakeup, at most every
+    # MIN_UPDATE_PERIOD, keeping the latest value per characteristic
+    ble = Ble(
+        backend=backend,
+        data_queue_size=DATA_QUEUE_SIZE,
+        data_queue_policy=OverflowPolicy.CoalesceLatest,
+    )
+    wakeup = threading.Event()
+    ble.set_wakeup_callback(wakeup.set)
+    for address, char in connect(ble, backend):
+        ble.start_notifications_characteristic(address, char.uuid).result()
+    received = 0
+    shown = 0
+    cpu_start = time.process_time()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        wakeup.wait(0.1)
+        time.sleep(MIN_UPDATE_PERIOD)
+        wakeup.clear()
+        ble.clear_wakeup()
+        latest_data = {}
+        for dev_addr, char_handle, data in ble.get_data_events(
+            MAX_EVENTS_PER_UPDATE, MAX_EVENTS_DRAIN_TIME
+        ):
+            latest_data[(dev_addr, char_handle)] = data
+            received += 1
+        for data in latest_data.values():
+            data.hex()
+            shown += 1
+    cpu = time.process_time() - cpu_start
+    coalesced = ble.get_queue_stats()["data"]["coalesced"]
+    for address in ble.get_connected_devices():
+        ble.disconnect(address).result()
+    return received, coalesced, shown, cpu
+
+
+def run_headless(backend, duration, sink):
+    ble = Ble(backend=backend)
+    streamer = HeadlessStreamer(ble, sink)
+    for address, char in connect(ble, backend):
+        streamer.subscribe(address, char)
+    cpu_start = time.process_time()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        streamer.drain()
+    cpu = time.process_time() - cpu_start
+    dropped = sum(stats["dropped"] for stats in streamer.get_stats().values())
+    streamer.unsubscribe_all()
+    for address in ble.get_connected_devices():
+        ble.disconnect(address).result()
+    sink.close()
+    return streamer.records_written, dropped, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sustained notification rates of the GUI data path and of "
+        "headless streaming"
+    )
+    parser.add_argument("--devices", type=int, default=4)
+    parser.add_argument(
+        "--rate",
+        type=int,
+        nargs="+",
+        default=[1000, 10000, 40000],
+        help="total notifications/s",
+    )
+    parser.add_argument("--duration", type=float, default=5)
+    args = parser.parse_args()
+    for rate in args.rate:
+        char_rate = rate / (args.devices * CHARS_PER_DEVICE)
+        print(f"{rate} notifications/s on {args.devices} devices")
+
+        def backend():
+            return SimulatedBackend.with_advertisers(
+                args.devices, connection_latency=0, notification_rate=char_rate
+            )
+
+        received, coalesced, shown, cpu = run_gui(backend(), args.duration)
+        print(
+            f"  gui path        {received / args.duration:8.0f}/s received, "
+            f"{coalesced} coalesced, {shown / args.duration:6.0f}/s shown, "
+            f"cpu {cpu / args.duration * 100:5.1f} %"
+        )
+        for name, sink in [
+            ("headless ndjson", NdjsonSink(open(os.devnull, "wb"))),
+            ("headless binary", CaptureSink(open(os.devnull, "wb"))),
+        ]:
+            written, dropped, cpu = run_headless(backend(), args.duration, sink)
+            print(
+                f"  {name} {written / args.duration:8.0f}/s written, "
+                f"{dropped} dropped, cpu {cpu / args.duration * 100:5.1f} %"
+            )
+
+
+if __name__ == "__main__":
+    main()
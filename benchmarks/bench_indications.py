@@ -0,0 +1,84 @@
+import argparse
+import time
+
+import fakes  # noqa: F401
+
+from ble import Ble
+from gatt import CharProperty
+from simulated import SimulatedBackend, SimulatedPeripheral
+
+
+def find_chars(gatt_model):
+    chars = gatt_model.chars_by_handle.values()
+    notify_char = next(c for c in chars if c.flags & CharProperty.Notify)
+    indicate_char = next(c for c in chars if c.flags & CharProperty.Indicate)
+    return notify_char.handle, indicate_char.handle
+
+
+def run(rate, ack_latency, duration):
+    # a notifying and an indicating characteristic of the same device, at the
+    # same requested rate
+    peripheral = SimulatedPeripheral(
+        "5E:00:00:00:00:01",
+        connection_latency=0,
+        notification_rate=rate,
+        indication_ack_latency=ack_latency,
+    )
+    ble = Ble(backend=SimulatedBackend([peripheral]))
+    ble.connect(peripheral.device).result()
+    address = peripheral.address
+    notify_handle, indicate_handle = find_chars(ble.get_gatt_model(address))
+    ble.start_notifications_characteristic(address, notify_handle).result()
+    ble.start_indications_characteristic(address, indicate_handle).result()
+    received = {notify_handle: 0, indicate_handle: 0}
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        for _, char_handle, _ in ble.get_data_events():
+            received[char_handle] += 1
+    stats = ble.get_indication_stats(address, indicate_handle)
+    ble.disconnect(address).result()
+    return (
+        received[notify_handle] / duration,
+        received[indicate_handle] / duration,
+        stats,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Achieved rates of notifications and indications, and "
+        "interval between indications, for a range of confirmation latencies"
+    )
+    parser.add_argument(
+        "--rate",
+        type=int,
+        default=200,
+        help="requested rate per characteristic",
+    )
+    parser.add_argument(
+        "--ack-latency",
+        type=float,
+        nargs="+",
+        default=[0.0075, 0.015, 0.03, 0.06],
+        help="round trip (s) of an indication and its confirmation",
+    )
+    parser.add_argument("--duration", type=float, default=3)
+    args = parser.parse_args()
+    print(f"{args.rate}/s requested")
+    for ack_latency in args.ack_latency:
+        notify_rate, indicate_rate, stats = run(
+            args.rate, ack_latency, args.duration
+        )
+        print(
+            f"  ack latency {ack_latency * 1e3:5.1f} ms: notify "
+            f"{notify_rate:6.1f}/s, indicate {indicate_rate:6.1f}/s "
+            f"(max {min(args.rate, 1 / ack_latency):6.1f}), interval median "
+            f"{stats['interval_median'] * 1e3:5.1f} ms, p95 "
+            f"{stats['interval_p95'] * 1e3:5.1f} ms, max "
+            f"{stats['interval_max'] * 1e3:5.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import statistics
+import time
+
+import fakes  # noqa: F401
+
+from ble import Ble
+from simulated import SimulatedBackend
+
+
+def run(args, max_concurrent_connects):
+    backend = SimulatedBackend.with_advertisers(
+        args.devices,
+        max_pending_connects=args.adapter_limit,
+        connection_latency=args.latency,
+        notification_rate=0,
+        num_services=1,
+    )
+    ble = Ble(
+        backend=backend,
+        max_concurrent_connects=max_concurrent_connects,
+        connect_retries=args.retries,
+        connect_retry_delay=args.retry_delay,
+    )
+    start = time.perf_counter()
+    for peripheral in backend.peripherals:
+        ble.connect(peripheral.device)
+    # wait until every request succeeded or gave up
+    while len(ble.get_connect_stats()) < args.devices:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    connect_stats = ble.get_connect_stats().values()
+    connected = [stats for stats in connect_stats if stats["error"] is None]
+    total_times = sorted(stats["total_time"] for stats in connected)
+    attempts = sum(stats["attempts"] for stats in connect_stats)
+    label = (
+        f"{max_concurrent_connects} slots"
+        if max_concurrent_connects < args.devices
+        else "unbounded"
+    )
+    print(
+        f"  {label:<10} connected {len(connected)}/{args.devices} "
+        f"in {elapsed:5.2f} s, {attempts} attempts, "
+        f"{backend.failed_connects} failed"
+    )
+    if len(total_times) > 0:
+        print(
+            "             request to connected: "
+            f"median {statistics.median(total_times):5.2f} s, "
+            f"max {total_times[-1]:5.2f} s, connect "
+            f"{statistics.mean(s['connect_time'] for s in connected):5.2f} s"
+        )
+    for address in ble.get_connected_devices():
+        ble.disconnect(address)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Connecting to many simulated devices"
+    )
+    parser.add_argument("--devices", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument(
+        "--adapter-limit",
+        type=int,
+        default=4,
+        help="pending connections above which the adapter fails them",
+    )
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--retry-delay", type=float, default=0.2)
+    parser.add_argument("--slots", type=int, nargs="+", default=[0, 2, 4])
+    args = parser.parse_args()
+    print(
+        f"devices={args.devices} connect latency={args.latency} s "
+        f"adapter limit={args.adapter_limit}"
+    )
+    for slots in args.slots:
+        run(args, slots if slots > 0 else args.devices)
+
+
+if __name__ == "__main__":
+    main()
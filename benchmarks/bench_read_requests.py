@@ -0,0 +1,105 @@
+import argparse
+import time
+
+import fakes  # noqa: F401
+
+from ble import Ble
+from gatt import CharProperty
+from simulated import SimulatedBackend, SimulatedPeripheral
+
+
+POLL_PERIOD = 0.05  # sleep between get_data_event polls
+
+
+def connect(args):
+    peripherals = [
+        SimulatedPeripheral(
+            f"5E:00:00:00:00:{i + 1:02X}",
+            connection_latency=0,
+            notification_rate=0,
+            read_latency=args.latency,
+            num_services=1,
+            num_characteristics=args.chars * 2,
+        )
+        for i in range(args.devices)
+    ]
+    ble = Ble(backend=SimulatedBackend(peripherals))
+    for peripheral in peripherals:
+        ble.connect(peripheral.device)
+    while len(ble.get_connected_devices()) < args.devices:
+        time.sleep(0.01)
+    reads = []
+    for peripheral in peripherals:
+        gatt_model = ble.get_gatt_model(peripheral.address)
+        readable = [
+            (peripheral.address, char.uuid)
+            for char in gatt_model.chars_by_handle.values()
+            if char.flags & CharProperty.Read
+        ]
+        reads.extend(readable[: args.chars])
+    return ble, reads
+
+
+def run_polling(ble, reads):
+    # previous usage, each read is followed by polling for its data event
+    for dev_addr, char_uuid in reads:
+        ble.read_characteristic(dev_addr, char_uuid)
+        while True:
+            data_event = ble.get_data_event()
+            if data_event is not None and data_event[:2] == (
+                dev_addr,
+                char_uuid,
+            ):
+                break
+            time.sleep(POLL_PERIOD)
+
+
+def run_sequential(ble, reads):
+    for dev_addr, char_uuid in reads:
+        ble.read_characteristic(dev_addr, char_uuid, timeout=1).result()
+
+
+def run_gathered(ble, reads):
+    values = ble.read_characteristics(reads, timeout=1).result()
+    assert not any(isinstance(value, Exception) for value in values)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Reading many characteristics, polled or with futures"
+    )
+    parser.add_argument("--devices", type=int, default=2)
+    parser.add_argument("--chars", type=int, default=10)
+    parser.add_argument(
+        "--latency", type=float, default=0.0075, help="per read latency (s)"
+    )
+    args = parser.parse_args()
+    ble, reads = connect(args)
+    print(
+        f"{len(reads)} reads on {args.devices} devices, "
+        f"{args.latency * 1e3:.1f} ms per read"
+    )
+    for name, run in [
+        ("poll get_data_event", run_polling),
+        ("futures, sequential", run_sequential),
+        ("read_characteristics", run_gathered),
+    ]:
+        ble.get_data_events()
+        start = time.perf_counter()
+        run(ble, reads)
+        elapsed = time.perf_counter() - start
+        print(f"  {name:<21} {elapsed * 1e3:8.1f} ms")
+    # a read slower than its timeout raises
+    dev_addr, char_uuid = reads[0]
+    try:
+        ble.read_characteristic(
+            dev_addr, char_uuid, timeout=args.latency / 2
+        ).result()
+    except TimeoutError:
+        print("  read with a timeout shorter than the latency: TimeoutError")
+    for dev_addr in ble.get_connected_devices():
+        ble.disconnect(dev_addr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import statistics
+import time
+
+import fakes  # noqa: F401
+
+from ble import Ble, BleStatus, DataGap
+from simulated import SimulatedBackend, SimulatedPeripheral
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError
+        time.sleep(0.001)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Reconnection after link loss, with notifications"
+    )
+    parser.add_argument("--outage", type=float, nargs="+", default=[0, 1, 3])
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--rate", type=int, default=100)
+    parser.add_argument("--retry-delay", type=float, default=0.2)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    peripheral = SimulatedPeripheral(
+        "5E:00:00:00:00:01",
+        connection_latency=args.latency,
+        notification_rate=args.rate,
+    )
+    backend = SimulatedBackend([peripheral])
+    ble = Ble(backend=backend, connect_retry_delay=args.retry_delay)
+    ble.connect(peripheral.device, auto_reconnect=True)
+    wait_for(lambda: ble.is_connected(peripheral.address))
+    gatt_model = ble.get_gatt_model(peripheral.address)
+    uuid = gatt_model.services[0].characteristics[0].uuid
+    ble.start_notifications_characteristic(peripheral.address, uuid)
+    wait_for(lambda: ble.are_notifications_enabled(peripheral.address, uuid))
+    print(
+        f"connect latency {args.latency * 1e3:.0f} ms, "
+        f"{args.rate} notifications/s, retry delay {args.retry_delay} s"
+    )
+    for outage in args.outage:
+        reconnect_times = []
+        first_data_times = []
+        gaps = []
+        for _ in range(args.repeats):
+            time.sleep(0.2)
+            ble.get_data_events()
+            ble.get_status_events()
+            peripheral.in_range = False
+            client = backend.clients[peripheral.address]
+            ble.event_loop.call_soon_threadsafe(client.simulate_link_loss)
+            time.sleep(outage)
+            peripheral.in_range = True
+            gap = None
+            while gap is None:
+                for _, _, data in ble.get_data_events():
+                    if isinstance(data, DataGap):
+                        gap = data
+                time.sleep(0.001)
+            stats = ble.get_reconnect_stats(peripheral.address)
+            reconnect_times.append(stats["reconnect_time"])
+            first_data_times.append(stats["first_notification_time"])
+            gaps.append(gap.end_time - gap.start_time)
+            statuses = [status[1] for status in ble.get_status_events()]
+            assert BleStatus.Disconnected not in statuses
+        print(
+            f"  outage {outage:3.1f} s: reconnected after "
+            f"{statistics.mean(reconnect_times) * 1e3:6.0f} ms, "
+            f"first notification after "
+            f"{statistics.mean(first_data_times) * 1e3:6.0f} ms, "
+            f"data gap {statistics.mean(gaps) * 1e3:6.0f} ms"
+        )
+    ble.disconnect(peripheral.address)
+
+
+if __name__ == "__main__":
+    main()
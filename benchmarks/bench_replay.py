@@ -0,0 +1,129 @@
+import argparse
+import os
+import statistics
+import struct
+import tempfile
+import time
+
+from fakes import FakeCharacteristic
+
+from ble import Ble
+from capture import CaptureWriter
+
+
+GUI_TICK = 0.05  # period of the GUI loop, matches window.read(timeout=50)
+TIMESTAMP = struct.Struct("<Q")
+
+
+def create_capture(path, num_devices, num_chars, rate, duration, payload_size):
+    writer = CaptureWriter(path)
+    chars = [
+        FakeCharacteristic(
+            f"0000{i + 0xFFF1:04x}-0000-1000-8000-00805f9b34fb",
+            "0000fff0-0000-1000-8000-00805f9b34fb",
+            handle=i * 2 + 2,
+        )
+        for i in range(num_chars)
+    ]
+    addresses = [f"00:11:22:33:44:{i:02X}" for i in range(num_devices)]
+    num_records = int(rate * duration)
+    start = time.monotonic_ns()
+    for i in range(num_records):
+        # payload starts with the record timestamp, to measure latency
+        timestamp_ns = start + i * 1_000_000_000 // rate
+        writer.record(
+            addresses[i % num_devices],
+            chars[(i // num_devices) % num_chars],
+            TIMESTAMP.pack(timestamp_ns) + bytes(payload_size),
+            timestamp_ns,
+        )
+    writer.close()
+    return num_records
+
+
+def replay(path, speed):
+    ble = Ble(data_queue_size=0)
+    start = time.monotonic()
+    ble.start_replay(path, speed)
+    consumed = 0
+    latencies = []
+    ages = []
+    while ble.is_replaying() or len(ble.get_connected_devices()) > 0:
+        # GUI style consumption, latest value per characteristic
+        latest_data = {}
+        events = ble.get_data_events()
+        for dev_addr, char_handle, data in events:
+            latest_data[(dev_addr, char_handle)] = data
+        consumed += len(events)
+        for data in latest_data.values():
+            data.hex()
+        now = time.monotonic_ns()
+        if speed is not None and len(events) > 0:
+            # latest displayed value, and oldest event consumed in this tick
+            for data in latest_data.values():
+                (timestamp_ns,) = TIMESTAMP.unpack_from(data)
+                latencies.append(
+                    (now - ble.async_ble.replay.get_due_time(timestamp_ns))
+                    / 1e6
+                )
+            (timestamp_ns,) = TIMESTAMP.unpack_from(events[0][2])
+            ages.append(
+                (now - ble.async_ble.replay.get_due_time(timestamp_ns)) / 1e6
+            )
+        ble.get_status_events()
+        time.sleep(GUI_TICK)
+    consumed += len(ble.get_data_events())
+    elapsed = time.monotonic() - start
+    stats = ble.get_replay_stats()
+    print(f"speed={speed if speed is not None else 'max'}")
+    print(
+        f"  replayed: {stats['records']} ({stats['records'] / elapsed:.0f}/s)"
+    )
+    print(f"  consumed: {consumed}")
+    print(
+        f"  replay lag: mean {stats['mean_lag'] * 1e3:.2f} ms, "
+        f"max {stats['max_lag'] * 1e3:.2f} ms"
+    )
+    if len(latencies) > 0:
+        print(
+            "  record to display latency: "
+            f"median {statistics.median(latencies):.1f} ms, "
+            f"max {max(latencies):.1f} ms"
+        )
+        print(
+            "  oldest event age per tick: "
+            f"median {statistics.median(ages):.1f} ms, "
+            f"max {max(ages):.1f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay of a capture file through the Ble API"
+    )
+    parser.add_argument("--devices", type=int, default=2)
+    parser.add_argument("--chars", type=int, default=2)
+    parser.add_argument("--rate", type=int, default=2000)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--payload", type=int, default=20)
+    parser.add_argument(
+        "--speeds", type=float, nargs="+", default=[1, 10, 0], help="0 is max"
+    )
+    args = parser.parse_args()
+    capture_path = os.path.join(tempfile.mkdtemp(), "bench.blxcap")
+    num_records = create_capture(
+        capture_path,
+        args.devices,
+        args.chars,
+        args.rate,
+        args.duration,
+        args.payload,
+    )
+    print(f"capture: {num_records} records, {args.rate} records/s")
+    for speed in args.speeds:
+        replay(capture_path, speed if speed > 0 else None)
+    os.remove(capture_path)
+
+
+if __name__ == "__main__":
+    main()
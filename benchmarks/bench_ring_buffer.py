@@ -0,0 +1,135 @@
+import argparse
+import sys
+import time
+import tracemalloc
+
+from fakes import FakeCharacteristic, FakeNotifyingClient
+
+from ble import Ble
+
+
+ALLOCATION_BATCHES = 20  # batches measured for the allocation rates
+
+
+def produce(ble, client, char, payloads, num_packets):
+    for i in range(num_packets):
+        ble.async_ble.bluetooth_notify_callback(
+            client, char, payloads[i % len(payloads)]
+        )
+
+
+def consume_queue(ble):
+    total = 0
+    for _, _, data in ble.get_data_events():
+        total += data[0]
+    return total
+
+
+def consume(ble, data_buffer):
+    if data_buffer is not None:
+        consume_buffer(data_buffer)
+    else:
+        consume_queue(ble)
+
+
+def measure_allocations(ble, client, char, payloads, data_buffer, traced):
+    # heap blocks, or bytes seen by tracemalloc, allocated by each batch and
+    # still alive when it is consumed, in the steady state
+    if traced:
+        tracemalloc.start()
+    allocated = 0
+    for _ in range(ALLOCATION_BATCHES):
+        if traced:
+            before = tracemalloc.get_traced_memory()[0]
+        else:
+            before = sys.getallocatedblocks()
+        produce(ble, client, char, payloads, len(payloads))
+        if traced:
+            allocated += tracemalloc.get_traced_memory()[0] - before
+        else:
+            allocated += sys.getallocatedblocks() - before
+        consume(ble, data_buffer)
+    if traced:
+        tracemalloc.stop()
+    return allocated / (ALLOCATION_BATCHES * len(payloads))
+
+
+def consume_buffer(data_buffer):
+    total = 0
+    records = data_buffer.read()
+    for _, data in records:
+        total += data[0]
+    data_buffer.release(len(records))
+    return total
+
+
+def run(path, num_packets, batch, payload_size):
+    ble = Ble(data_queue_size=0)
+    client = FakeNotifyingClient("00:11:22:33:44:55")
+    char = FakeCharacteristic("0000fff1-0000-1000-8000-00805f9b34fb")
+    # payloads as delivered by bleak, a fresh bytearray per notification
+    payloads = [bytearray([i % 256]) * payload_size for i in range(batch)]
+    data_buffer = None
+    if path == "ring":
+        data_buffer = ble.enable_data_buffer(
+            client.address,
+            char.uuid,
+            arena_size=batch * payload_size * 2,
+            max_records=batch * 2,
+        )
+    # live heap blocks retained per pending packet
+    blocks_before = sys.getallocatedblocks()
+    produce(ble, client, char, payloads, batch)
+    blocks_per_packet = (sys.getallocatedblocks() - blocks_before) / batch
+    consume(ble, data_buffer)
+    # CPU time per packet, producing and consuming in batches
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(num_packets // batch):
+        produce(ble, client, char, payloads, batch)
+        consume(ble, data_buffer)
+    cpu_time = time.process_time() - cpu_start
+    wall_time = time.perf_counter() - wall_start
+    # allocated memory churn, as seen by tracemalloc
+    tracemalloc.start()
+    produce(ble, client, char, payloads, batch)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    consume(ble, data_buffer)
+    # measured apart from the timing, tracemalloc slows down allocations
+    allocations = measure_allocations(
+        ble, client, char, payloads, data_buffer, False
+    )
+    allocated_bytes = measure_allocations(
+        ble, client, char, payloads, data_buffer, True
+    )
+    packets_per_s = num_packets / wall_time
+    print(f"path={path}")
+    print(f"  CPU per packet: {cpu_time / num_packets * 1e6:.2f} us")
+    print(f"  packets/s: {packets_per_s:.0f}")
+    print(f"  heap blocks retained per pending packet: {blocks_per_packet:.2f}")
+    print(f"  peak traced memory for {batch} pending packets: {peak} B")
+    print(
+        f"  allocations per packet: {allocations:.2f} blocks, "
+        f"{allocated_bytes:.0f} B"
+    )
+    print(
+        f"  allocation rate: {allocations * packets_per_s:.0f} blocks/s, "
+        f"{allocated_bytes * packets_per_s / 1e6:.1f} MB/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Cost of the tuple queue and ring buffer data paths"
+    )
+    parser.add_argument("--packets", type=int, default=500000)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--payload", type=int, default=20)
+    args = parser.parse_args()
+    for path in ["queue", "ring"]:
+        run(path, args.packets, args.batch, args.payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import time
+
+import fakes  # noqa: F401
+
+from ble import Ble
+from scan_filter import ScanFilter
+from simulated import SimulatedBackend
+
+
+TARGET_SERVICE_UUID = "0000feaa-0000-1000-8000-00805f9b34fb"
+
+
+def create_backend(num_advertisers, num_targets, interval):
+    backend = SimulatedBackend.with_advertisers(
+        num_advertisers, advertisement_interval=interval
+    )
+    # the devices of interest advertise a service uuid
+    for peripheral in backend.peripherals[:num_targets]:
+        peripheral.service_uuids = [TARGET_SERVICE_UUID]
+        peripheral.name = f"Target {peripheral.name}"
+    return backend
+
+
+def run(name, backend, scan_filter, duration):
+    ble = Ble(backend=backend)
+    callback = ble.async_ble._detection_callback
+    calls = 0
+    callback_time = 0
+
+    def timed_callback(device, advertisement_data):
+        nonlocal calls, callback_time
+        start = time.perf_counter()
+        callback(device, advertisement_data)
+        callback_time += time.perf_counter() - start
+        calls += 1
+
+    ble.async_ble._detection_callback = timed_callback
+    cpu_start = time.process_time()
+    ble.start_scan(scan_filter)
+    time.sleep(duration)
+    ble.stop_scan()
+    cpu_time = time.process_time() - cpu_start
+    # cpu includes the simulated scanner, which stands for the os and bleak
+    # work done for every advertisement
+    print(
+        f"  {name:<16} callbacks {calls / duration:6.0f}/s, "
+        f"in callback {callback_time / duration * 100:5.1f} %, "
+        f"found {len(ble.async_ble.found_devices):4d}, "
+        f"cpu {cpu_time / duration * 100:5.1f} %"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Scan load with and without scan filters"
+    )
+    parser.add_argument("--advertisers", type=int, default=1000)
+    parser.add_argument("--targets", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=0.1)
+    parser.add_argument("--duration", type=float, default=3)
+    args = parser.parse_args()
+    print(f"advertisers={args.advertisers} targets={args.targets}")
+    filters = [
+        ("no filter", None),
+        ("name prefix", ScanFilter(name_prefix="Target")),
+        ("name regex", ScanFilter(name_regex=r"^Target")),
+        ("min rssi", ScanFilter(min_rssi=-50)),
+        ("service uuid", ScanFilter(service_uuids=[TARGET_SERVICE_UUID])),
+    ]
+    for name, scan_filter in filters:
+        backend = create_backend(args.advertisers, args.targets, args.interval)
+        run(name, backend, scan_filter, args.duration)
+
+
+if __name__ == "__main__":
+    main()
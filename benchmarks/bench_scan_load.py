@@ -0,0 +1,85 @@
+import argparse
+import time
+
+import fakes  # noqa: F401
+
+from ble import Ble
+from simulated import SimulatedBackend
+
+
+class TimedDetectionCallback:
+    def __init__(self, callback):
+        self.callback = callback
+        self.calls = 0
+        self.time = 0
+
+    def __call__(self, device, advertisement_data):
+        start = time.perf_counter()
+        self.callback(device, advertisement_data)
+        self.time += time.perf_counter() - start
+        self.calls += 1
+
+
+def run(num_advertisers, interval, duration, polls, adv_history_size):
+    backend = SimulatedBackend.with_advertisers(
+        num_advertisers, advertisement_interval=interval
+    )
+    ble = Ble(backend=backend, adv_history_size=adv_history_size)
+    detection_callback = TimedDetectionCallback(
+        ble.async_ble._detection_callback
+    )
+    ble.async_ble._detection_callback = detection_callback
+    ble.start_scan()
+    time.sleep(duration)
+    ble.stop_scan()
+    found_start = time.perf_counter()
+    for _ in range(polls):
+        ble.get_found_devices()
+    found_time = (time.perf_counter() - found_start) / polls
+    print(f"advertisers={num_advertisers} interval={interval * 1e3:.0f} ms")
+    print(f"  advertisements: {detection_callback.calls / duration:.0f}/s")
+    print(
+        "  detection callback: "
+        f"{detection_callback.time / detection_callback.calls * 1e6:.2f} us"
+    )
+    print(f"  found devices: {len(ble.async_ble.found_devices)}")
+    print(f"  get_found_devices: {found_time * 1e6:.0f} us")
+    if adv_history_size is not None:
+        stats_start = time.perf_counter()
+        for address in ble.async_ble.found_devices:
+            ble.get_advertisement_stats(address)
+        stats_time = (time.perf_counter() - stats_start) / len(
+            ble.async_ble.found_devices
+        )
+        print(f"  get_advertisement_stats: {stats_time * 1e6:.2f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Scanning with many simulated advertisers"
+    )
+    parser.add_argument(
+        "--advertisers", type=int, nargs="+", default=[50, 500, 2000]
+    )
+    parser.add_argument("--interval", type=float, default=0.1)
+    parser.add_argument("--duration", type=float, default=3)
+    parser.add_argument("--polls", type=int, default=100)
+    parser.add_argument(
+        "--adv-history",
+        type=int,
+        default=None,
+        help="advertisements kept per device, history disabled if not set",
+    )
+    args = parser.parse_args()
+    for num_advertisers in args.advertisers:
+        run(
+            num_advertisers,
+            args.interval,
+            args.duration,
+            args.polls,
+            args.adv_history,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import argparse
+import time
+
+import fakes  # noqa: F401
+
+from ble import Ble, BleStatus
+from gatt import CharProperty
+from simulated import SimulatedBackend, SimulatedPeripheral
+
+
+def connect(args):
+    peripheral = SimulatedPeripheral(
+        "5E:00:00:00:00:01",
+        connection_latency=0,
+        notification_rate=0,
+        write_latency=args.latency,
+        write_without_response_latency=args.latency,
+        mtu_size=args.mtu,
+    )
+    backend = SimulatedBackend([peripheral])
+    ble = Ble(backend=backend)
+    ble.connect(peripheral.device)
+    while not ble.is_connected(peripheral.address):
+        time.sleep(0.01)
+    # characteristic supporting both kinds of writes
+    uuid = next(
+        char.uuid
+        for char in ble.get_gatt_model(
+            peripheral.address
+        ).chars_by_handle.values()
+        if char.flags & CharProperty.WriteWithoutResponse
+        and char.flags & CharProperty.Write
+    )
+    return ble, backend.clients[peripheral.address], uuid
+
+
+def run_single_writes(args):
+    # previous behaviour, one write_characteristic call per 20 bytes
+    ble, client, uuid = connect(args)
+    data = bytes(args.size)
+    start = time.perf_counter()
+    for i in range(0, args.size, 20):
+        ble.write_characteristic(client.address, uuid, data[i : i + 20], True)
+    while client.bytes_written < args.size:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    ble.disconnect(client.address)
+    return client.bytes_written / elapsed, client.writes
+
+
+def run_stream(args, response, max_in_flight):
+    ble, client, uuid = connect(args)
+    start = time.perf_counter()
+    stream = ble.write_stream(
+        client.address,
+        uuid,
+        bytes(args.size),
+        response=response,
+        max_in_flight=max_in_flight,
+    )
+    progress_events = 0
+    finished = False
+    while not finished:
+        for status in ble.get_status_events():
+            if status[1] == BleStatus.WriteProgress:
+                progress_events += 1
+            elif status[1] in [
+                BleStatus.WriteSuccessful,
+                BleStatus.WriteFailed,
+            ]:
+                finished = True
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    # raises the error of the write, if any
+    stream.future.result()
+    ble.disconnect(client.address)
+    assert stream.bytes_written == client.bytes_written == args.size
+    return stream.bytes_written / elapsed, stream.writes, progress_events
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Bulk writes to a simulated peripheral"
+    )
+    parser.add_argument("--size", type=int, default=16384)
+    parser.add_argument("--mtu", type=int, default=247)
+    parser.add_argument(
+        "--latency", type=float, default=0.0075, help="per write latency (s)"
+    )
+    args = parser.parse_args()
+    print(
+        f"{args.size} bytes, mtu {args.mtu}, "
+        f"{args.latency * 1e3:.1f} ms per write"
+    )
+    rate, writes = run_single_writes(args)
+    print(f"  {'single writes':<28} {rate / 1e3:7.1f} kB/s, {writes} writes")
+    runs = [
+        ("stream, with response", True, 4),
+        ("stream, without response x1", False, 1),
+        ("stream, without response x4", False, 4),
+        ("stream, without response x16", False, 16),
+    ]
+    for name, response, max_in_flight in runs:
+        rate, writes, progress_events = run_stream(
+            args, response, max_in_flight
+        )
+        print(
+            f"  {name:<28} {rate / 1e3:7.1f} kB/s, {writes} writes, "
+            f"{progress_events} progress events"
+        )
+
+
+if __name__ == "__main__":
+    main()
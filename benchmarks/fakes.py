@@ -0,0 +1,60 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeCharacteristic:
+    def __init__(
+        self, uuid, service_uuid="", properties=("notify",), handle=None
+    ):
+        self.uuid = uuid
+        self.handle = handle
+        self.service_uuid = service_uuid
+        self.properties = list(properties)
+
+
+class FakeNotifyingClient:
+    def __init__(self, address, num_chars=1, payload_size=20):
+        self.address = address
+        self.chars = [
+            FakeCharacteristic(
+                f"0000{i + 0xFFF1:04x}-0000-1000-8000-00805f9b34fb",
+                "0000fff0-0000-1000-8000-00805f9b34fb",
+                handle=i * 2 + 2,
+            )
+            for i in range(num_chars)
+        ]
+        self.payload = bytes(payload_size)
+
+    async def notify(self, ble, rate, duration):
+        # emit notifications in bursts, so the achieved rate does not depend
+        # on the resolution of asyncio.sleep
+        start = time.monotonic()
+        sent = 0
+        while True:
+            elapsed = time.monotonic() - start
+            if elapsed >= duration:
+                break
+            due = int(elapsed * rate)
+            while sent < due:
+                char = self.chars[sent % len(self.chars)]
+                ble.bluetooth_notify_callback(
+                    self, char, bytearray(self.payload)
+                )
+                sent += 1
+            await asyncio.sleep(0.001)
+        return sent
+
+
+async def measure_loop_lag(period, duration):
+    # overshoot of asyncio.sleep, shows how much the loop is stalled
+    lags = []
+    start = time.monotonic()
+    while time.monotonic() - start < duration:
+        before = time.monotonic()
+        await asyncio.sleep(period)
+        lags.append(time.monotonic() - before - period)
+    return lags
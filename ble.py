@@ -1,33 +1,58 @@
 import asyncio
-import enum
 import threading
+import time
 import queue
 
-from bleak import BleakScanner, BleakClient
+from async_ble import AsyncBle
+from ble_status import BleStatus, DataGap  # noqa: F401
+from event_queue import EventQueue, OverflowPolicy
+from gatt import CharProperty
 
 
-class BleStatus(enum.Enum):
-    Disconnected = enum.auto()
-    Connecting = enum.auto()
-    Connected = enum.auto()
-    Disconnecting = enum.auto()
-    WriteSuccessful = enum.auto()
-    NotificationsEnabled = enum.auto()
-    NotificationsDisabled = enum.auto()
+EVENTS_DRAIN_CHUNK = 256  # events taken from a queue per lock acquisition
 
 
 class Ble:
-    def __init__(self):
-        self.found_devices = {}
-        self.found_device = False
-        self.scanning = False
-        self.connected_devices = {}
-        self.disconnect_events = {}
-        self.notification_devices = {}
-        self.stop_notify_events = {}
-        self.status_queue = queue.Queue()
-        self.data_queue = queue.Queue()
-        self.status_devices = {}
+    # AsyncBle running on its own event loop thread, with status and data
+    # events queued for a polling consumer such as the GUI
+    def __init__(
+        self,
+        data_queue_size=10000,
+        data_queue_policy=OverflowPolicy.DropOldest,
+        status_queue_size=1000,
+        status_queue_policy=OverflowPolicy.DropOldest,
+        queue_block_timeout=0.1,
+        backend=None,
+        found_device_timeout=None,
+        adv_history_size=None,
+        gatt_cache_path=None,
+        max_concurrent_connects=2,
+        connect_retries=2,
+        connect_retry_delay=0.5,
+        connect_timeout=None,
+    ):
+        self.status_queue = EventQueue(
+            status_queue_size, status_queue_policy, queue_block_timeout
+        )
+        self.data_queue = EventQueue(
+            data_queue_size, data_queue_policy, queue_block_timeout
+        )
+        # called when status or data events are queued, at most once until
+        # the consumer calls clear_wakeup
+        self.wakeup_callback = None
+        self.wakeup_pending = False
+        self.async_ble = AsyncBle(
+            backend=backend,
+            found_device_timeout=found_device_timeout,
+            adv_history_size=adv_history_size,
+            gatt_cache_path=gatt_cache_path,
+            max_concurrent_connects=max_concurrent_connects,
+            connect_retries=connect_retries,
+            connect_retry_delay=connect_retry_delay,
+            connect_timeout=connect_timeout,
+            status_callback=self._put_status,
+            data_callback=self._put_data,
+        )
         self.event_loop = asyncio.new_event_loop()
         self.event_loop_thread = threading.Thread(
             target=self._asyncloop, daemon=True
@@ -35,97 +60,78 @@ class Ble:
         self.event_loop_thread.start()
 
     def __del__(self):
+        # finish recording and replay
+        self.stop_recording()
+        self.stop_replay()
         # stop scanning
-        if self.scanning:
+        if self.is_scanning():
             self.stop_scan()
-        # stop notifications
-        for dev_addr, dev_events in self.stop_notify_events.items():
-            for char_uuid in dev_events.keys():
-                self.stop_notifications_characteristic(dev_addr, char_uuid)
-        # disconnect from connected devices
-        for dev_addr in self.connected_devices.keys():
+        # disconnect from connected devices, stopping their notifications
+        for dev_addr in self.get_connected_devices():
             self.disconnect(dev_addr)
         self.event_loop.call_soon_threadsafe(self.event_loop.stop)
         self.event_loop_thread.join()
 
-    def start_scan(self):
-        # clear previously found devices
-        self.found_devices = {}
-        self.scan_stop_event = asyncio.Event()
-        asyncio.run_coroutine_threadsafe(
-            self.bluetooth_scan(self.scan_stop_event), self.event_loop
-        )
-        self.scanning = True
+    # operations return a concurrent.futures.Future of the AsyncBle coroutine
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.event_loop)
+
+    def start_scan(self, scan_filter=None):
+        # waits for previously found devices to be cleared, so they are not
+        # reported once the scan is started
+        self._run(self.async_ble.start_scan(scan_filter)).result()
 
     def stop_scan(self):
-        if self.scanning:
-            self.event_loop.call_soon_threadsafe(self.scan_stop_event.set)
-            self.scanning = False
+        return self._run(self.async_ble.stop_scan())
 
     def is_scanning(self):
-        return self.scanning
+        return self.async_ble.is_scanning()
 
     def has_found_device(self):
-        ret_val = self.found_device
-        self.found_device = False
-        return ret_val
+        return self.async_ble.has_found_device()
 
     def get_found_devices(self):
-        devices = []
-        for address, (
-            device,
-            advertisement_data,
-        ) in self.found_devices.items():
-            dev = {
-                "name": advertisement_data.local_name,
-                "address": address,
-                "rssi": advertisement_data.rssi,
-                "uuids": advertisement_data.service_uuids,
-                "manufacturer_data": advertisement_data.manufacturer_data,
-                "dev": device,
-            }
-            devices.append(dev)
-        return devices
-
-    def connect(self, dev):
-        self.status_devices[dev.address] = BleStatus.Connecting
-        try:
-            self.status_queue.put_nowait((dev.address, BleStatus.Connecting))
-        except queue.Full:
-            # TODO better handling of this case
-            pass
-        self.disconnect_events[dev.address] = asyncio.Event()
-        asyncio.run_coroutine_threadsafe(
-            self.bluetooth_connect(dev, self.disconnect_events[dev.address]),
-            self.event_loop,
-        )
+        return self.async_ble.get_found_devices()
+
+    def get_found_device(self, address):
+        return self.async_ble.get_found_device(address)
+
+    def get_device_row(self, address):
+        return self.async_ble.get_device_row(address)
+
+    def get_row_device(self, row):
+        return self.async_ble.get_row_device(row)
+
+    def get_advertisement_stats(self, address):
+        return self.async_ble.get_advertisement_stats(address)
+
+    def get_advertisement_history(self, address):
+        return self.async_ble.get_advertisement_history(address)
+
+    def get_found_devices_diff(self):
+        return self.async_ble.get_found_devices_diff()
+
+    def connect(self, dev, auto_reconnect=False):
+        # the future is completed once connected
+        return self._run(self.async_ble.connect(dev, auto_reconnect))
 
     def disconnect(self, dev_address):
-        self.status_devices[dev_address] = BleStatus.Disconnecting
-        try:
-            self.status_queue.put_nowait((dev_address, BleStatus.Disconnecting))
-        except queue.Full:
-            # TODO better handling of this case
-            pass
-        # stop notifications if any
-        for dev_addr, dev_events in self.stop_notify_events.items():
-            for char_uuid in dev_events.keys():
-                self.stop_notifications_characteristic(dev_addr, char_uuid)
-        self.event_loop.call_soon_threadsafe(
-            self.disconnect_events[dev_address].set
-        )
+        return self._run(self.async_ble.disconnect(dev_address))
 
     def is_connected(self, dev_address):
-        return dev_address in self.connected_devices
+        return self.async_ble.is_connected(dev_address)
 
     def get_connected_devices(self):
-        return list(self.connected_devices.keys())
+        return self.async_ble.get_connected_devices()
+
+    def get_connect_stats(self, dev_address=None):
+        return self.async_ble.get_connect_stats(dev_address)
+
+    def get_reconnect_stats(self, dev_address):
+        return self.async_ble.get_reconnect_stats(dev_address)
 
     def get_status(self, dev_address):
-        if dev_address in self.status_devices:
-            return self.status_devices[dev_address]
-        else:
-            return None
+        return self.async_ble.get_status(dev_address)
 
     def get_status_event(self):
         try:
@@ -139,198 +145,223 @@ class Ble:
         except queue.Empty:
             return None
 
+    def get_status_events(self, max_items=None, max_time=None):
+        return self._get_events(self.status_queue, max_items, max_time)
+
+    def get_data_events(self, max_items=None, max_time=None):
+        return self._get_events(self.data_queue, max_items, max_time)
+
+    def set_wakeup_callback(self, callback):
+        # the callback is called from the thread queueing the event
+        self.wakeup_pending = False
+        self.wakeup_callback = callback
+
+    def clear_wakeup(self):
+        # to be called before taking events, so events queued afterwards
+        # trigger a new wakeup
+        self.wakeup_pending = False
+
+    def has_events(self):
+        return not self.status_queue.empty() or not self.data_queue.empty()
+
+    def _wakeup(self):
+        wakeup_callback = self.wakeup_callback
+        if wakeup_callback is not None and not self.wakeup_pending:
+            self.wakeup_pending = True
+            wakeup_callback()
+
+    def _get_events(self, events_queue, max_items, max_time):
+        # drain up to max_items events, spending at most max_time seconds
+        if max_time is None:
+            return events_queue.get_many(max_items)
+        events = []
+        deadline = time.monotonic() + max_time
+        while max_items is None or len(events) < max_items:
+            chunk_size = EVENTS_DRAIN_CHUNK
+            if max_items is not None:
+                chunk_size = min(chunk_size, max_items - len(events))
+            chunk = events_queue.get_many(chunk_size)
+            events.extend(chunk)
+            if len(chunk) < chunk_size or time.monotonic() >= deadline:
+                break
+        return events
+
+    def enable_data_buffer(
+        self, dev_addr, char_uuid, arena_size=65536, max_records=4096
+    ):
+        # data of the characteristic is stored in a preallocated ring buffer
+        # instead of being put in the data queue
+        return self.async_ble.enable_data_buffer(
+            dev_addr, char_uuid, arena_size, max_records
+        )
+
+    def disable_data_buffer(self, dev_addr, char_uuid):
+        self.async_ble.disable_data_buffer(dev_addr, char_uuid)
+
+    def get_data_buffer(self, dev_addr, char_uuid):
+        return self.async_ble.get_data_buffer(dev_addr, char_uuid)
+
+    def start_recording(self, path):
+        self.async_ble.start_recording(path)
+
+    def stop_recording(self):
+        self.async_ble.stop_recording()
+
+    def is_recording(self):
+        return self.async_ble.is_recording()
+
+    def get_recording_stats(self):
+        return self.async_ble.get_recording_stats()
+
+    def start_replay(self, path, speed=1.0, subscribe=True):
+        # waits for the capture to be opened, errors are raised here
+        self._run(self.async_ble.start_replay(path, speed, subscribe)).result()
+
+    def stop_replay(self):
+        self.async_ble.stop_replay()
+
+    def is_replaying(self):
+        return self.async_ble.is_replaying()
+
+    def get_replay_stats(self):
+        return self.async_ble.get_replay_stats()
+
+    def get_queue_stats(self):
+        return {
+            "status": self.status_queue.get_stats(),
+            "data": self.data_queue.get_stats(),
+        }
+
+    def get_gatt_model(self, dev_addr):
+        return self.async_ble.get_gatt_model(dev_addr)
+
     def get_services_and_characteristics(self, dev_address):
-        if not self.is_connected(dev_address):
-            services_collection = None
-        else:
-            services_collection = {}
-            dev = self.connected_devices[dev_address]
-            for _, service in dev.services.services.items():
-                services_collection[service.uuid] = {
-                    "name": service.description,
-                    "service": service,
-                }
-                service_characteristics = {}
-                for characteristic in service.characteristics:
-                    service_characteristics[characteristic.uuid] = {
-                        "name": characteristic.description,
-                        "properties": characteristic.properties,
-                        "characteristic": characteristic,
-                    }
-                    characteristic_descriptors = {}
-                    for descriptor in characteristic.descriptors:
-                        characteristic_descriptors[descriptor.uuid] = {
-                            "name": descriptor.description,
-                            "descriptor": descriptor,
-                        }
-                    service_characteristics[characteristic.uuid][
-                        "descriptors"
-                    ] = characteristic_descriptors
-                services_collection[service.uuid][
-                    "characteristics"
-                ] = service_characteristics
-        return services_collection
-
-    def read_characteristic(self, dev_addr, char_uuid):
-        if self.is_connected(dev_addr):
-            client = self.connected_devices[dev_addr]
-            chars = list(client.services.characteristics.values())
-            chars_uuids = [char.uuid for char in chars]
-            chars_properties = [char.properties for char in chars]
-            if char_uuid in chars_uuids:
-                i_char = chars_uuids.index(char_uuid)
-                if "read" in chars_properties[i_char]:
-                    asyncio.run_coroutine_threadsafe(
-                        self.bluetooth_read(client, char_uuid), self.event_loop
-                    )
-
-    def write_characteristic(self, dev_addr, char_uuid, data):
-        if self.is_connected(dev_addr):
-            client = self.connected_devices[dev_addr]
-            chars = list(client.services.characteristics.values())
-            chars_uuids = [char.uuid for char in chars]
-            chars_properties = [char.properties for char in chars]
-            if char_uuid in chars_uuids:
-                i_char = chars_uuids.index(char_uuid)
-                if "write" in chars_properties[i_char]:
-                    asyncio.run_coroutine_threadsafe(
-                        self.bluetooth_write(client, char_uuid, data),
-                        self.event_loop,
-                    )
+        # kept for existing scripts, get_gatt_model is preferred
+        gatt_model = self.get_gatt_model(dev_address)
+        if gatt_model is None:
+            return None
+        return gatt_model.get_services_dict()
 
-    def start_notifications_characteristic(self, dev_addr, char_uuid):
-        if self.is_connected(dev_addr):
-            client = self.connected_devices[dev_addr]
-            chars = list(client.services.characteristics.values())
-            chars_uuids = [char.uuid for char in chars]
-            chars_properties = [char.properties for char in chars]
-            if char_uuid in chars_uuids:
-                i_char = chars_uuids.index(char_uuid)
-                if "notify" in chars_properties[i_char]:
-                    if dev_addr not in self.stop_notify_events:
-                        self.stop_notify_events[dev_addr] = {}
-                    self.stop_notify_events[dev_addr][
-                        char_uuid
-                    ] = asyncio.Event()
-                    if dev_addr not in self.notification_devices:
-                        self.notification_devices[dev_addr] = {}
-                    asyncio.run_coroutine_threadsafe(
-                        self.bluetooth_notify(
-                            client,
-                            char_uuid,
-                            self.stop_notify_events[dev_addr][char_uuid],
-                        ),
-                        self.event_loop,
-                    )
+    def get_cached_gatt_model(self, dev_addr):
+        return self.async_ble.get_cached_gatt_model(dev_addr)
 
-    def stop_notifications_characteristic(self, dev_addr, char_uuid):
+    def refresh_gatt_model(self, dev_addr):
+        return self.async_ble.refresh_gatt_model(dev_addr)
+
+    def read_characteristic(self, dev_addr, char_uuid, timeout=None):
+        # returns a concurrent.futures.Future with the value read, which is
+        # also queued as a data event; the future raises TimeoutError after
+        # timeout seconds, or the error of the read; None if the
+        # characteristic can't be read
         if (
-            dev_addr in self.stop_notify_events.keys()
-            and char_uuid in self.stop_notify_events[dev_addr].keys()
-        ):
-            self.event_loop.call_soon_threadsafe(
-                self.stop_notify_events[dev_addr][char_uuid].set
+            self.async_ble.get_characteristic(
+                dev_addr, char_uuid, CharProperty.Read
             )
-
-    def are_notifications_enabled(self, dev_addr, char_uuid):
-        return (
-            dev_addr in self.notification_devices.keys()
-            and char_uuid in self.notification_devices[dev_addr].keys()
-        )
-
-    async def bluetooth_scan(self, stop_event):
-        async with BleakScanner(
-            detection_callback=self._detection_callback,
+            is None
         ):
-            await stop_event.wait()
+            return None
+        return self._run(
+            self.async_ble.read_characteristic(dev_addr, char_uuid, timeout)
+        )
 
-    def _detection_callback(self, device, advertisement_data):
-        if advertisement_data.local_name is not None:
-            self.found_devices[device.address] = (
-                device,
-                advertisement_data,
+    def read_characteristics(self, chars, timeout=None):
+        # reads (dev_addr, char_uuid) pairs concurrently, returns a
+        # concurrent.futures.Future with the list of values, in order; reads
+        # that failed have their exception in place of the value
+        return self._run(self.async_ble.read_characteristics(chars, timeout))
+
+    def write_characteristic(
+        self, dev_addr, char_uuid, data, response=None, timeout=None
+    ):
+        # with response unless the characteristic only supports writes
+        # without response; returns a concurrent.futures.Future completed
+        # when the write is done, or None if the characteristic can't be
+        # written
+        if (
+            self.async_ble.get_characteristic(
+                dev_addr,
+                char_uuid,
+                CharProperty.Write | CharProperty.WriteWithoutResponse,
             )
-            self.found_device = True
-
-    async def bluetooth_connect(self, device, disconnect_event):
-        async with BleakClient(
-            device,
-            self._disconnect_callback,
-        ) as client:
-            self.connected_devices[device.address] = client
-            self.status_devices[device.address] = BleStatus.Connected
-            try:
-                self.status_queue.put_nowait(
-                    (device.address, BleStatus.Connected)
-                )
-            except queue.Full:
-                # TODO better handling of this case
-                pass
-            await disconnect_event.wait()
-
-    def _disconnect_callback(self, client):
-        del self.connected_devices[client.address]
-        del self.status_devices[client.address]
-        if client.address in self.notification_devices.keys():
-            del self.notification_devices[client.address]
-        try:
-            self.status_queue.put_nowait(
-                (client.address, BleStatus.Disconnected)
+            is None
+        ):
+            return None
+        return self._run(
+            self.async_ble.write_characteristic(
+                dev_addr, char_uuid, data, response, timeout
             )
-        except queue.Full:
-            # TODO better handling of this case
-            pass
+        )
 
-    async def bluetooth_read(self, client, uuid):
-        data = await client.read_gatt_char(uuid)
-        try:
-            self.data_queue.put_nowait((client.address, uuid, data))
-        except queue.Full:
-            # TODO better handling of this case
-            pass
+    def write_stream(
+        self,
+        dev_addr,
+        char_uuid,
+        data,
+        response=None,
+        chunk_size=None,
+        max_in_flight=4,
+    ):
+        # data is a buffer or an iterator of buffers, written in chunks of the
+        # mtu size, without response when the characteristic supports it;
+        # progress is reported with WriteProgress status events; returns the
+        # stream, with stream.future completed when it is written, failed or
+        # cancelled, or None if the characteristic can't be written
+        stream = self.async_ble.create_write_stream(
+            dev_addr, char_uuid, data, response, chunk_size, max_in_flight
+        )
+        if stream is None:
+            return None
+        stream.future = self._run(
+            self.async_ble.write_stream(dev_addr, char_uuid, stream)
+        )
+        return stream
 
-    async def bluetooth_write(self, client, uuid, data):
-        await client.write_gatt_char(uuid, data)
-        try:
-            self.status_queue.put_nowait(
-                (client.address, BleStatus.WriteSuccessful, uuid)
+    def start_notifications_characteristic(self, dev_addr, char_uuid):
+        return self._run(
+            self.async_ble.start_notifications_characteristic(
+                dev_addr, char_uuid
             )
-        except queue.Full:
-            # TODO better handling of this case
-            pass
-
-    async def bluetooth_notify(self, client, uuid, stop_event):
-        await client.start_notify(
-            uuid,
-            lambda uuid, data: self.bluetooth_notify_callback(
-                client, uuid, data
-            ),
         )
-        self.notification_devices[client.address][uuid] = True
-        try:
-            self.status_queue.put_nowait(
-                (client.address, BleStatus.NotificationsEnabled, uuid)
-            )
-        except queue.Full:
-            # TODO better handling of this case
-            pass
-        await stop_event.wait()
-        await client.stop_notify(uuid)
-        del self.notification_devices[client.address]
-        try:
-            self.status_queue.put_nowait(
-                (client.address, BleStatus.NotificationsDisabled, uuid)
+
+    def stop_notifications_characteristic(self, dev_addr, char_uuid):
+        return self._run(
+            self.async_ble.stop_notifications_characteristic(
+                dev_addr, char_uuid
             )
-        except queue.Full:
-            # TODO better handling of this case
-            pass
+        )
 
-    def bluetooth_notify_callback(self, client, char, data):
-        try:
-            self.data_queue.put_nowait((client.address, char.uuid, data))
-        except queue.Full:
-            # TODO better handling of this case
-            pass
+    def are_notifications_enabled(self, dev_addr, char_uuid):
+        return self.async_ble.are_notifications_enabled(dev_addr, char_uuid)
+
+    def start_indications_characteristic(self, dev_addr, char_uuid):
+        return self._run(
+            self.async_ble.start_indications_characteristic(dev_addr, char_uuid)
+        )
+
+    def stop_indications_characteristic(self, dev_addr, char_uuid):
+        return self._run(
+            self.async_ble.stop_indications_characteristic(dev_addr, char_uuid)
+        )
+
+    def are_indications_enabled(self, dev_addr, char_uuid):
+        return self.async_ble.are_indications_enabled(dev_addr, char_uuid)
+
+    def get_indication_stats(self, dev_addr, char_uuid):
+        return self.async_ble.get_indication_stats(dev_addr, char_uuid)
+
+    def _put_status(self, status):
+        # overflow is handled by the queue policy and counted in its stats
+        self.status_queue.put(status)
+        self._wakeup()
+
+    def _put_data(self, address, handle, data):
+        # by characteristic handle, as characteristics may have the same uuid
+        if isinstance(data, DataGap):
+            # gap markers are never coalesced with data
+            self.data_queue.put((address, handle, data))
+        else:
+            self.data_queue.put((address, handle, data), key=(address, handle))
+        self._wakeup()
 
     def _asyncloop(self):
         asyncio.set_event_loop(self.event_loop)
@@ -0,0 +1,23 @@
+import collections
+import enum
+
+
+# data event marking notifications lost while a device was reconnecting,
+# times are time.monotonic() of the last data before and first data after
+DataGap = collections.namedtuple("DataGap", ["start_time", "end_time"])
+
+
+class BleStatus(enum.Enum):
+    Disconnected = enum.auto()
+    Connecting = enum.auto()
+    Connected = enum.auto()
+    Disconnecting = enum.auto()
+    WriteSuccessful = enum.auto()
+    NotificationsEnabled = enum.auto()
+    NotificationsDisabled = enum.auto()
+    ServicesCached = enum.auto()
+    ServicesChanged = enum.auto()
+    WriteProgress = enum.auto()
+    WriteFailed = enum.auto()
+    Reconnecting = enum.auto()
+    ServicesCacheFailed = enum.auto()
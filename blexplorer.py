@@ -1,14 +1,28 @@
+import argparse
+import math
 import os
 import sys
+import time
 
 import PySimpleGUI as sg
 
-from ble import Ble, BleStatus
+from ble_status import BleStatus, DataGap
+from event_queue import OverflowPolicy
 
 
-MAX_NUM_DEVICES = 3  # maximum number of connected devices
-MAX_NUM_SERVICES = 6  # maximum number of services per device
-MAX_NUM_CHARACTERISTICS = 5  # maximum number of characteristics per service
+INITIAL_NUM_DEVICE_TABS = 3  # tabs created with the window, more are added
+GATT_TREE_ROWS = 12  # visible rows of the services tree
+MAX_EVENTS_PER_UPDATE = 5000  # maximum number of BLE events drained per tick
+MAX_EVENTS_DRAIN_TIME = 0.02  # maximum time (s) spent draining BLE events
+MIN_UPDATE_PERIOD = 0.02  # minimum time (s) between BLE events updates
+DATA_QUEUE_SIZE = 10000  # maximum number of pending data events
+CAPTURE_EXTENSION = ".blxcap"
+TABLE_REFRESH_PERIOD = 0.25  # minimum time (s) between device table updates
+FOUND_DEVICE_TIMEOUT = 60  # time (s) after which unseen devices are removed
+ADV_HISTORY_SIZE = 64  # advertisements kept per device for rssi statistics
+GATT_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".blexplorer", "gatt_cache.json"
+)
 
 
 def resource_path(relative_path):
@@ -17,17 +31,75 @@ def resource_path(relative_path):
     return os.path.join(os.path.abspath("."), relative_path)
 
 
-class BLExplorerGUI:
+class StartupProfile:
+    # prints the time taken by each startup step
     def __init__(self):
-        self.ble = Ble()
+        # cpu time of the interpreter startup and of the module imports
+        print(
+            "startup profile:\n"
+            f"  {'interpreter and imports':<24} "
+            f"{time.process_time() * 1e3:7.1f} ms (cpu)"
+        )
+        self.start()
+
+    def start(self):
+        self.start_time = time.perf_counter()
+
+    def step(self, name):
+        now = time.perf_counter()
+        print(f"  {name:<24} {(now - self.start_time) * 1e3:7.1f} ms")
+        self.start_time = now
+
+
+class BLExplorerGUI:
+    def __init__(self, startup_profile=None):
+        self.startup_profile = startup_profile
+        # created on the first scan, recording or replay
+        self.ble = None
         sg.theme("DarkTeal12")
         self.layout = self._create_layout()
+        self.profile_step("layout")
         self.running = False
-        self.i_selected_dev = None
+        self.replaying = False
+        self.cache_error_shown = False
+        self.selected_dev_addr = None
+        # for updating devices table rows
+        self.table_last_update = 0
+        # BLE events are taken when the BLE thread wakes up the window
+        self.ble_woken = False
+        self.ble_last_update = 0
         # for updating connected devices layout
-        self.dev_tabs_free = {i for i in range(1, MAX_NUM_DEVICES + 1)}
+        self.dev_tabs_free = {i for i in range(1, INITIAL_NUM_DEVICE_TABS + 1)}
+        self.num_dev_tabs = INITIAL_NUM_DEVICE_TABS
         self.dev_tabs = {}
+        # tree items and values by characteristic handle, as characteristics
+        # may have the same uuid; services are only populated when expanded
         self.chars_maps = {}
+        self.gatt_nodes = {}
+        self.char_values = {}
+        self.selected_chars = {}
+        # window events are routed to their handler, events of device tabs
+        # are routed with the tab and its device, registered when the tab is
+        # opened
+        self.event_handlers = {
+            sg.WIN_CLOSED: self.on_window_closed,
+            "-BLE_WAKEUP-": self.on_ble_wakeup,
+            "-BLE_SCAN-": self.on_scan,
+            "-BLE_RECORD-": self.on_record,
+            "-BLE_REPLAY-": self.on_replay,
+            "-BLE_TABLE_DEVICES-": self.on_device_selected,
+            "-BLE_CONNECT-": self.on_connect,
+        }
+        self.tab_event_handlers = {
+            "-GATT_TREE-": self.on_tree_selected,
+            "-CHAR_READ-": self.on_read,
+            "-CHAR_WRITE-": self.on_write,
+            "-CHAR_INDICATE-": self.on_indicate,
+            "-CHAR_NOTIFY-": self.on_notify,
+            "-CHAR_DESCRIPTORS_NAMES-": self.on_descriptor_name_selected,
+            "-CHAR_DESCRIPTORS_UUIDS-": self.on_descriptor_uuid_selected,
+        }
+        self.tab_event_routes = {}
 
     def run(self):
         self.window = sg.Window(
@@ -37,180 +109,323 @@ class BLExplorerGUI:
             size=(1024, 700),
             font=("Helvetica", 12),
             icon=resource_path(os.path.join("resources", "blexplorer.ico")),
+            finalize=True,
         )
+        for tab in range(1, INITIAL_NUM_DEVICE_TABS + 1):
+            self._bind_device_tab(tab)
+        self.profile_step("window")
+        if self.startup_profile is not None:
+            self.window.refresh()
+            self.profile_step("first frame")
+            loaded = [
+                name for name in ["asyncio", "bleak"] if name in sys.modules
+            ]
+            print(f"  loaded before first frame: {loaded}")
         self.running = True
         while self.running:
-            event, values = self.window.read(timeout=50)
+            event, values = self.window.read(timeout=self.get_read_timeout())
             # process event
             self.process_event(event, values)
             if not self.running:
                 break
             # update
             self.update()
+        if self.ble is not None:
+            self.ble.set_wakeup_callback(None)
+            self.ble.stop_recording()
+            self.ble.stop_replay()
         self.window.close()
 
+    def start_ble(self):
+        # the BLE module and its event loop thread are only loaded when
+        # needed, so the window is shown without waiting for them
+        if self.ble is not None:
+            return
+        if self.startup_profile is not None:
+            self.startup_profile.start()
+        from ble import Ble
+
+        self.profile_step("ble import")
+        # only the latest value of a characteristic is shown, so a pending
+        # value is replaced by the next value of the same characteristic
+        self.ble = Ble(
+            data_queue_size=DATA_QUEUE_SIZE,
+            data_queue_policy=OverflowPolicy.CoalesceLatest,
+            found_device_timeout=FOUND_DEVICE_TIMEOUT,
+            adv_history_size=ADV_HISTORY_SIZE,
+            gatt_cache_path=GATT_CACHE_PATH,
+        )
+        self.ble.set_wakeup_callback(
+            lambda: self.window.write_event_value("-BLE_WAKEUP-", None)
+        )
+        self.profile_step("ble construction")
+
+    def profile_step(self, name):
+        if self.startup_profile is not None:
+            self.startup_profile.step(name)
+
+    def get_read_timeout(self):
+        # the window blocks until woken up by the BLE thread, except while
+        # an update is deferred
+        if self.ble is None:
+            return None
+        now = time.monotonic()
+        timeouts = []
+        if self.ble_woken:
+            timeouts.append(self.ble_last_update + MIN_UPDATE_PERIOD - now)
+        if self.ble.is_scanning():
+            # device table updates are rate limited, and unseen devices
+            # expire without any event
+            timeouts.append(self.table_last_update + TABLE_REFRESH_PERIOD - now)
+        if len(timeouts) == 0:
+            return None
+        # rounded up, so the deferred update is due when the read returns
+        return max(0, math.ceil(min(timeouts) * 1000))
+
     def process_event(self, event, values):
-        if event == sg.WIN_CLOSED:
-            self.running = False
-        elif event == "-BLE_SCAN-":
-            if self.ble.is_scanning():
-                self.ble.stop_scan()
-                self.window["-BLE_SCAN-"].update(text="Scan")
-            else:
-                self.clear_scan_data()
-                self.ble.start_scan()
-                self.window["-BLE_SCAN-"].update(text="Stop Scanning")
-        elif event == "-BLE_TABLE_DEVICES-":
-            if len(values[event]) > 0:
-                self.i_selected_dev = values[event][0]
-                self.update_advertisement_info()
-                ble_devices = self.ble.get_found_devices()
-                ble_selected_dev_status = self.ble.get_status(
-                    ble_devices[self.i_selected_dev]["address"]
-                )
-                if ble_selected_dev_status is not None:
-                    if ble_selected_dev_status == BleStatus.Connecting:
-                        self.window["-BLE_CONNECT-"].update(
-                            text="Connect", disabled=True
-                        )
-                    elif ble_selected_dev_status == BleStatus.Disconnecting:
-                        self.window["-BLE_CONNECT-"].update(
-                            text="Disconnect", disabled=True
-                        )
-                    elif ble_selected_dev_status == BleStatus.Connected:
-                        self.window["-BLE_CONNECT-"].update(
-                            text="Disconnect", disabled=False
-                        )
-                else:
-                    self.window["-BLE_CONNECT-"].update(
-                        text="Connect", disabled=False
-                    )
-        elif event == "-BLE_CONNECT-":
-            if self.i_selected_dev is not None:
-                ble_devices = self.ble.get_found_devices()
-                ble_selected_dev = ble_devices[self.i_selected_dev]
-                if self.ble.is_connected(ble_selected_dev["address"]):
-                    self.ble.disconnect(ble_selected_dev["address"])
-                else:
-                    self.ble.connect(ble_selected_dev["dev"])
-                self.window["-BLE_CONNECT-"].update(disabled=True)
-        elif "EXPAND" in event:
-            section_key = event.split("--")[0] + "-"
-            section_expand_key = event.split("--")[0] + "--EXPAND_BUTTON-"
-            self.window[section_key].update(
-                visible=not self.window[section_key].visible
+        handler = self.event_handlers.get(event)
+        if handler is not None:
+            handler(values)
+            return
+        route = self.tab_event_routes.get(event)
+        if route is not None:
+            handler, tab, dev_address = route
+            handler(tab, dev_address, values.get(event))
+
+    def on_window_closed(self, values):
+        self.running = False
+
+    def on_ble_wakeup(self, values):
+        self.ble_woken = True
+
+    def on_scan(self, values):
+        self.start_ble()
+        if self.ble.is_scanning():
+            self.ble.stop_scan()
+            self.window["-BLE_SCAN-"].update(text="Scan")
+        else:
+            self.clear_scan_data()
+            self.ble.start_scan()
+            self.window["-BLE_SCAN-"].update(text="Stop Scanning")
+
+    def on_record(self, values):
+        self.start_ble()
+        if self.ble.is_recording():
+            self.ble.stop_recording()
+            self.window["-BLE_RECORD-"].update(text="Record")
+        else:
+            capture_path = sg.popup_get_file(
+                "Save characteristics data to",
+                title="Record data",
+                save_as=True,
+                default_extension=CAPTURE_EXTENSION,
+                file_types=(("BLExplorer capture", "*" + CAPTURE_EXTENSION),),
             )
-            self.window[section_expand_key].update(
-                self.window[section_key].metadata[0]
-                if self.window[section_key].visible
-                else self.window[section_key].metadata[1]
+            if capture_path:
+                try:
+                    self.ble.start_recording(capture_path)
+                except (OSError, ValueError) as e:
+                    sg.popup_error(
+                        f"Can't record to {capture_path}: {e}",
+                        title="Record data",
+                    )
+                    return
+                self.window["-BLE_RECORD-"].update(text="Stop Recording")
+
+    def on_replay(self, values):
+        self.start_ble()
+        if self.ble.is_replaying():
+            self.ble.stop_replay()
+        else:
+            capture_path = sg.popup_get_file(
+                "Replay characteristics data from",
+                title="Replay data",
+                file_types=(("BLExplorer capture", "*" + CAPTURE_EXTENSION),),
             )
-            # update scrollable section
-            dev_num = section_key.split("$")[1].split(",")[0]
-            dev_tab_section = f"-DEV${dev_num}$_CONTAINER-"
-            self.window.refresh()
-            self.window[dev_tab_section].contents_changed()
-        elif (
-            "READ" in event
-            or "WRITE" in event
-            or "NOTIFY" in event
-            or "INDICATE" in event
+            if capture_path:
+                try:
+                    self.ble.start_replay(capture_path)
+                except (OSError, ValueError) as e:
+                    sg.popup_error(
+                        f"Can't replay {capture_path}: {e}",
+                        title="Replay data",
+                    )
+                    return
+                self.replaying = True
+                self.window["-BLE_REPLAY-"].update(text="Stop Replay")
+
+    def on_device_selected(self, values):
+        selected_rows = values["-BLE_TABLE_DEVICES-"]
+        if len(selected_rows) == 0:
+            return
+        # table rows are numbered from 1, selected rows from 0
+        self.selected_dev_addr = self.ble.get_row_device(selected_rows[0] + 1)
+        self.update_advertisement_info()
+        ble_selected_dev_status = self.ble.get_status(self.selected_dev_addr)
+        if ble_selected_dev_status is not None:
+            if ble_selected_dev_status == BleStatus.Connecting:
+                self.window["-BLE_CONNECT-"].update(
+                    text="Connect", disabled=True
+                )
+            elif ble_selected_dev_status == BleStatus.Disconnecting:
+                self.window["-BLE_CONNECT-"].update(
+                    text="Disconnect", disabled=True
+                )
+            elif ble_selected_dev_status == BleStatus.Connected:
+                self.window["-BLE_CONNECT-"].update(
+                    text="Disconnect", disabled=False
+                )
+        else:
+            self.window["-BLE_CONNECT-"].update(text="Connect", disabled=False)
+
+    def on_connect(self, values):
+        if self.selected_dev_addr is None:
+            return
+        if (
+            self.ble.is_connected(self.selected_dev_addr)
+            or self.ble.get_status(self.selected_dev_addr)
+            == BleStatus.Reconnecting
         ):
-            char_base_key = event.split("--")[0]
-            tab_num = int(event.split("$")[1].split(",")[0])
-            dev_addr = [
-                addr for addr, tab in self.dev_tabs.items() if tab == tab_num
-            ][0]
-            char_uuid = [
-                uuid
-                for uuid, e_key in self.chars_maps[dev_addr].items()
-                if char_base_key in e_key
-            ][0]
-            if "READ" in event:
-                self.ble.read_characteristic(dev_addr, char_uuid)
-            elif "WRITE" in event:
-                data_str = sg.popup_get_text(
-                    "Enter bytes to write, in hex", title="Write characteristic"
+            self.ble.disconnect(self.selected_dev_addr)
+            self.window["-BLE_CONNECT-"].update(disabled=True)
+        else:
+            ble_selected_dev = self.ble.get_found_device(self.selected_dev_addr)
+            if ble_selected_dev is not None:
+                self.ble.connect(
+                    ble_selected_dev["dev"],
+                    auto_reconnect=values["-BLE_AUTO_RECONNECT-"],
                 )
-                if data_str is not None:
-                    data = bytearray.fromhex(data_str)
-                    self.ble.write_characteristic(dev_addr, char_uuid, data)
-            elif "NOTIFY" in event:
-                if self.ble.are_notifications_enabled(dev_addr, char_uuid):
-                    self.ble.stop_notifications_characteristic(
-                        dev_addr, char_uuid
-                    )
-                else:
-                    self.ble.start_notifications_characteristic(
-                        dev_addr, char_uuid
-                    )
-        elif "DESCRIPTOR" in event:
-            char_base_key = event.split("--")[0] + "-"
-            tab_num = int(event.split("$")[1].split(",")[0])
-            dev_addr = [
-                addr for addr, tab in self.dev_tabs.items() if tab == tab_num
-            ][0]
-            char_uuid = [
-                uuid
-                for uuid, e_key in self.chars_maps[dev_addr].items()
-                if char_base_key in e_key
-            ][0]
-            services = self.ble.get_services_and_characteristics(dev_addr)
-            service = [
-                serv
-                for _, serv in services.items()
-                if char_uuid in serv["characteristics"].keys()
-            ][0]
-            char = service["characteristics"][char_uuid]
-            desc_uuids = list(char["descriptors"].keys())
-            desc_names = [
-                desc["name"] for _, desc in char["descriptors"].items()
-            ]
-            descriptor_name_key = char_base_key + "-DESCRIPTORS_NAMES-"
-            descriptor_uuid_key = char_base_key + "-DESCRIPTORS_UUIDS-"
-            if "NAMES" in event:
-                i_desc = desc_names.index(values[event])
-            else:
-                i_desc = desc_uuids.index(values[event])
-            self.window[descriptor_name_key].update(value=desc_names[i_desc])
-            self.window[descriptor_uuid_key].update(value=desc_uuids[i_desc])
+                self.window["-BLE_CONNECT-"].update(disabled=True)
+
+    def on_tree_selected(self, tab, dev_address, selected_iids):
+        if len(selected_iids) > 0:
+            self.select_tree_node(tab, dev_address, selected_iids[0])
+
+    def on_tree_opened(self, tab, dev_address, value):
+        # the item being opened has the focus
+        self.expand_tree_node(
+            tab, dev_address, self.window[("-GATT_TREE-", tab)].Widget.focus()
+        )
+
+    def on_read(self, tab, dev_address, value):
+        char = self.selected_chars.get(dev_address)
+        if char is not None:
+            self.ble.read_characteristic(dev_address, char.handle)
+
+    def on_write(self, tab, dev_address, value):
+        char = self.selected_chars.get(dev_address)
+        if char is None:
+            return
+        data_str = sg.popup_get_text(
+            "Enter bytes to write, in hex", title="Write characteristic"
+        )
+        if data_str is not None:
+            data = bytearray.fromhex(data_str)
+            self.ble.write_characteristic(dev_address, char.handle, data)
+
+    def on_notify(self, tab, dev_address, value):
+        char = self.selected_chars.get(dev_address)
+        if char is None:
+            return
+        if self.ble.are_notifications_enabled(dev_address, char.handle):
+            self.ble.stop_notifications_characteristic(dev_address, char.handle)
+        elif not self.ble.are_indications_enabled(dev_address, char.handle):
+            self.ble.start_notifications_characteristic(
+                dev_address, char.handle
+            )
+
+    def on_indicate(self, tab, dev_address, value):
+        char = self.selected_chars.get(dev_address)
+        if char is None:
+            return
+        if self.ble.are_indications_enabled(dev_address, char.handle):
+            self.ble.stop_indications_characteristic(dev_address, char.handle)
+        elif not self.ble.are_notifications_enabled(dev_address, char.handle):
+            self.ble.start_indications_characteristic(dev_address, char.handle)
+
+    def on_descriptor_name_selected(self, tab, dev_address, desc_name):
+        char = self.selected_chars.get(dev_address)
+        if char is not None:
+            desc_names = [desc.name for desc in char.descriptors]
+            self.select_descriptor(tab, char, desc_names.index(desc_name))
+
+    def on_descriptor_uuid_selected(self, tab, dev_address, desc_uuid):
+        char = self.selected_chars.get(dev_address)
+        if char is not None:
+            desc_uuids = [desc.uuid for desc in char.descriptors]
+            self.select_descriptor(tab, char, desc_uuids.index(desc_uuid))
+
+    def select_descriptor(self, tab, char, i_desc):
+        desc = char.descriptors[i_desc]
+        self.window[("-CHAR_DESCRIPTORS_NAMES-", tab)].update(value=desc.name)
+        self.window[("-CHAR_DESCRIPTORS_UUIDS-", tab)].update(value=desc.uuid)
 
     def update(self):
+        if self.ble is None:
+            return
         # update scan info
         self.update_scan()
-        self.update_ble_status()
-        self.update_data()
+        now = time.monotonic()
+        if self.ble_woken and now - self.ble_last_update >= MIN_UPDATE_PERIOD:
+            self.ble_last_update = now
+            self.ble.clear_wakeup()
+            self.update_ble_status()
+            self.update_data()
+            # events left by the drain limits are taken on the next update
+            self.ble_woken = self.ble.has_events()
+            self.update_replay()
 
     def update_scan(self):
-        if self.ble.has_found_device():
-            ble_devices = self.ble.get_found_devices()
-            ble_dev_data = self.create_ble_table_data(ble_devices)
+        now = time.monotonic()
+        if now - self.table_last_update < TABLE_REFRESH_PERIOD:
+            return
+        self.table_last_update = now
+        added, changed, removed = self.ble.get_found_devices_diff()
+        if len(added) == 0 and len(changed) == 0 and len(removed) == 0:
+            return
+        table_widget = self.window["-BLE_TABLE_DEVICES-"].Widget
+        selected_dev_changed = False
+        for dev in added:
+            table_widget.insert(
+                "",
+                "end",
+                iid=str(dev["row"]),
+                values=self.create_ble_table_row(dev),
+            )
+            selected_dev_changed |= dev["address"] == self.selected_dev_addr
+        for dev in changed:
+            table_widget.item(
+                str(dev["row"]), values=self.create_ble_table_row(dev)
+            )
+            selected_dev_changed |= dev["address"] == self.selected_dev_addr
+        if len(removed) > 0:
             # workaround not to fire event when updating table
             # taken from: https://github.com/PySimpleGUI/PySimpleGUI/issues/5129
             # ############## Workaround ######################
             table = self.window["-BLE_TABLE_DEVICES-"]
-            table_widget = table.Widget
             table_widget.unbind("<<TreeviewSelect>>")
             # ############# End of Workaround ################
-            select_rows = None
-            if self.i_selected_dev is not None:
-                select_rows = [self.i_selected_dev]
-            self.window["-BLE_TABLE_DEVICES-"].update(
-                values=ble_dev_data, select_rows=select_rows
-            )
+            for address in removed:
+                table_widget.delete(str(self.ble.get_device_row(address)))
             # ############## Workaround ######################
             selections = table_widget.selection()
             table.SelectedRows = [int(x) - 1 for x in selections]
             self.window.refresh()
             table_widget.bind("<<TreeviewSelect>>", table._treeview_selected)
             # ############# End of Workaround ################
+        if selected_dev_changed:
             self.update_advertisement_info()
 
     def update_advertisement_info(self):
-        if self.i_selected_dev is not None:
-            dev = self.ble.get_found_devices()[self.i_selected_dev]
+        dev = None
+        if self.selected_dev_addr is not None:
+            dev = self.ble.get_found_device(self.selected_dev_addr)
+        if dev is not None:
             self.window["-ADV_NAME-"].update(value=dev["name"])
             self.window["-ADV_RSSI-"].update(value=f"{dev['rssi']}")
+            self.window["-ADV_RSSI_STATS-"].update(
+                value=self.create_adv_stats_text(dev["address"])
+            )
             if len(dev["manufacturer_data"]) > 0:
                 mfr_id, mfr_data = list(dev["manufacturer_data"].items())[0]
                 self.window["-ADV_MFR_ID-"].update(value=f"{mfr_id:04x}")
@@ -229,201 +444,352 @@ class BLExplorerGUI:
             else:
                 self.window["-ADV_UUIDS-"].update(values=[])
 
+    def create_adv_stats_text(self, dev_address):
+        adv_stats = self.ble.get_advertisement_stats(dev_address)
+        if adv_stats is None:
+            return ""
+        text = f"{adv_stats['rssi_mean']:.1f} ± {adv_stats['rssi_std']:.1f}"
+        if adv_stats["interval"] is not None:
+            text += f", {adv_stats['interval'] * 1e3:.0f} ms"
+        return text
+
+    def create_indication_stats_text(self, dev_address, char_handle):
+        if not self.ble.are_indications_enabled(dev_address, char_handle):
+            return ""
+        indication_stats = self.ble.get_indication_stats(
+            dev_address, char_handle
+        )
+        if indication_stats is None or indication_stats["rate"] is None:
+            return ""
+        return (
+            f" ({indication_stats['rate']:.1f}/s, "
+            f"{indication_stats['interval_median'] * 1e3:.0f} ms)"
+        )
+
     def update_ble_status(self):
-        status = self.ble.get_status_event()
+        for status in self.ble.get_status_events(
+            MAX_EVENTS_PER_UPDATE, MAX_EVENTS_DRAIN_TIME
+        ):
+            self.process_ble_status(status)
+
+    def process_ble_status(self, status):
         if status is not None:
-            if (
-                status[1] in [BleStatus.Disconnected, BleStatus.Connected]
-                and self.i_selected_dev is not None
-            ):
+            if status[1] in [BleStatus.Disconnected, BleStatus.Connected]:
                 status_address, connection_status = status
-                ble_devices = self.ble.get_found_devices()
-                ble_selected_dev = ble_devices[self.i_selected_dev]
-                ble_selected_dev_addr = ble_selected_dev["address"]
-                if status_address == ble_selected_dev_addr:
-                    if connection_status == BleStatus.Connected:
-                        if self.ble.is_connected(ble_selected_dev_addr):
+                ble_selected_dev_addr = self.selected_dev_addr
+                if connection_status == BleStatus.Connected:
+                    if self.ble.is_connected(status_address):
+                        if status_address == ble_selected_dev_addr:
                             self.window["-BLE_CONNECT-"].update(
                                 text="Disconnect", disabled=False
                             )
-                            # find free tab and assign it to the device
-                            tab = min(self.dev_tabs_free)
-                            self.dev_tabs[ble_selected_dev_addr] = tab
-                            self.dev_tabs_free.remove(tab)
-                            tab_key = f"-CONNECTED_DEVICE${tab}$-"
-                            self.window[tab_key].update(
-                                title=ble_selected_dev["name"]
-                                if len(ble_selected_dev["name"]) > 0
-                                else ble_selected_dev_addr,
-                                visible=True,
-                            )
-                            self.set_tab_data(tab, ble_selected_dev_addr)
-                            self.window[tab_key].select()
-                            if len(self.dev_tabs_free) == MAX_NUM_DEVICES - 1:
-                                self.window["-NO_CONN_DEVS_CONTAINER-"].update(
-                                    visible=False
-                                )
-                                self.window["-CONN_DEVS_CONTAINER-"].update(
-                                    visible=True
-                                )
-                    elif connection_status == BleStatus.Disconnected:
+                        # the tab may be open already with cached services,
+                        # or for a reconnected device
+                        if status_address not in self.dev_tabs:
+                            self.open_device_tab(status_address)
+                        else:
+                            self.set_tab_title(status_address)
+                elif connection_status == BleStatus.Disconnected:
+                    if status_address == ble_selected_dev_addr:
                         self.window["-BLE_CONNECT-"].update(
                             text="Connect", disabled=False
                         )
-                        # release the device tab
-                        tab = self.dev_tabs[ble_selected_dev_addr]
-                        self.dev_tabs_free.add(tab)
-                        del self.dev_tabs[ble_selected_dev_addr]
-                        del self.chars_maps[ble_selected_dev_addr]
-                        tab_key = f"-CONNECTED_DEVICE${tab}$-"
-                        self.window[tab_key].update(visible=False)
-                        if len(self.dev_tabs_free) == MAX_NUM_DEVICES:
-                            self.window["-CONN_DEVS_CONTAINER-"].update(
-                                visible=False
-                            )
-                            self.window["-NO_CONN_DEVS_CONTAINER-"].update(
-                                visible=True
-                            )
+                    self.close_device_tab(status_address)
             elif status[1] in [
                 BleStatus.NotificationsDisabled,
                 BleStatus.NotificationsEnabled,
             ]:
-                dev_addr, notification_status, char_uuid = status
-                section = self.chars_maps[dev_addr][char_uuid]
-                self.window[section + "-NOTIFY-"].update(
-                    button_color=("white", "red")
-                    if notification_status == BleStatus.NotificationsEnabled
-                    else sg.theme_button_color()
+                # indications are reported as notifications
+                dev_addr, _, char_uuid = status
+                char = self.selected_chars.get(dev_addr)
+                if char is None or char.uuid != char_uuid:
+                    return
+                self.update_subscription_buttons(
+                    self.dev_tabs[dev_addr], dev_addr, char
                 )
+            elif status[1] == BleStatus.Reconnecting:
+                self.set_tab_title(status[0], " (reconnecting)")
+            elif status[1] == BleStatus.ServicesCached:
+                if status[0] not in self.dev_tabs:
+                    self.open_device_tab(status[0])
+            elif status[1] == BleStatus.ServicesChanged:
+                if status[0] in self.dev_tabs:
+                    self.set_tab_data(self.dev_tabs[status[0]], status[0])
+            elif status[1] == BleStatus.ServicesCacheFailed:
+                # reported once, saving fails the same way for every device
+                if not self.cache_error_shown:
+                    self.cache_error_shown = True
+                    sg.popup_error(
+                        f"Services can't be cached to {GATT_CACHE_PATH}: "
+                        f"{status[2]}",
+                        title="Services cache",
+                        non_blocking=True,
+                    )
             elif status[1] in [BleStatus.WriteSuccessful]:
                 pass
 
     def update_data(self):
-        data = self.ble.get_data_event()
-        if data is not None:
-            dev_addr, char_uuid, read_data = data
-            # find characteristic GUI key
-            char_key = self.chars_maps[dev_addr][char_uuid]
+        # keep only the latest value per characteristic in the batch
+        latest_data = {}
+        for dev_addr, char_handle, read_data in self.ble.get_data_events(
+            MAX_EVENTS_PER_UPDATE, MAX_EVENTS_DRAIN_TIME
+        ):
+            if isinstance(read_data, DataGap):
+                continue
+            latest_data[(dev_addr, char_handle)] = read_data
+        for (dev_addr, char_handle), read_data in latest_data.items():
+            if dev_addr not in self.dev_tabs:
+                continue
             data_hex = read_data.hex()
-            self.window[char_key + "-VALUE-"].update(value=data_hex)
+            # kept for characteristics of services not expanded yet
+            self.char_values[dev_addr][char_handle] = data_hex
+            tab = self.dev_tabs[dev_addr]
+            if char_handle in self.chars_maps[dev_addr]:
+                self.window[("-GATT_TREE-", tab)].Widget.set(
+                    self.chars_maps[dev_addr][char_handle], "Value", data_hex
+                )
+            char = self.selected_chars.get(dev_addr)
+            if char is not None and char.handle == char_handle:
+                self.window[("-CHAR_VALUE-", tab)].update(value=data_hex)
+                self.window[("-CHAR_VALUE_LABEL-", tab)].update(
+                    value="Value"
+                    + self.create_indication_stats_text(dev_addr, char_handle)
+                )
+
+    def open_device_tab(self, dev_address):
+        # find free tab and assign it to the device, tabs of disconnected
+        # devices are reused
+        if len(self.dev_tabs_free) > 0:
+            tab = min(self.dev_tabs_free)
+            self.dev_tabs_free.remove(tab)
+        else:
+            self.num_dev_tabs += 1
+            tab = self.num_dev_tabs
+            self.window["-CONN_DEVS_TABS-"].add_tab(
+                self._create_device_tab(tab)
+            )
+            self._bind_device_tab(tab)
+        self.dev_tabs[dev_address] = tab
+        for name, handler in self.tab_event_handlers.items():
+            self.tab_event_routes[(name, tab)] = (handler, tab, dev_address)
+        self.tab_event_routes[(("-GATT_TREE-", tab), "+OPEN")] = (
+            self.on_tree_opened,
+            tab,
+            dev_address,
+        )
+        tab_key = ("-CONNECTED_DEVICE-", tab)
+        self.window[tab_key].update(
+            title=self.get_device_name(dev_address),
+            visible=True,
+        )
+        self.set_tab_data(tab, dev_address)
+        self.window[tab_key].select()
+        if len(self.dev_tabs) == 1:
+            self.window["-NO_CONN_DEVS_CONTAINER-"].update(visible=False)
+            self.window["-CONN_DEVS_CONTAINER-"].update(visible=True)
+
+    def close_device_tab(self, dev_address):
+        if dev_address not in self.dev_tabs:
+            return
+        # release the device tab
+        tab = self.dev_tabs[dev_address]
+        self.dev_tabs_free.add(tab)
+        del self.dev_tabs[dev_address]
+        self.chars_maps.pop(dev_address, None)
+        self.gatt_nodes.pop(dev_address, None)
+        self.char_values.pop(dev_address, None)
+        self.selected_chars.pop(dev_address, None)
+        for name in self.tab_event_handlers:
+            del self.tab_event_routes[(name, tab)]
+        del self.tab_event_routes[(("-GATT_TREE-", tab), "+OPEN")]
+        self.window[("-CONNECTED_DEVICE-", tab)].update(visible=False)
+        if len(self.dev_tabs) == 0:
+            self.window["-CONN_DEVS_CONTAINER-"].update(visible=False)
+            self.window["-NO_CONN_DEVS_CONTAINER-"].update(visible=True)
+
+    def set_tab_title(self, dev_address, suffix=""):
+        if dev_address in self.dev_tabs:
+            tab_key = ("-CONNECTED_DEVICE-", self.dev_tabs[dev_address])
+            self.window[tab_key].update(
+                title=self.get_device_name(dev_address) + suffix
+            )
+
+    def get_device_name(self, dev_address):
+        # replayed devices are not in the scan results
+        dev = self.ble.get_found_device(dev_address)
+        if dev is not None and len(dev["name"]) > 0:
+            return dev["name"]
+        return dev_address
+
+    def update_replay(self):
+        if self.replaying and not self.ble.is_replaying():
+            self.replaying = False
+            self.window["-BLE_REPLAY-"].update(text="Replay")
 
     def set_tab_data(self, i_tab, dev_address):
-        dev_attr = self.ble.get_services_and_characteristics(dev_address)
-        if dev_attr is not None:
-            self.chars_maps[dev_address] = {}
-            for i_service, (service_uuid, service) in enumerate(
-                dev_attr.items()
-            ):
-                service_key = f"-SERVICE${i_tab},{i_service + 1}$-"
-                self.window[service_key + "-EXPAND_TITLE-"].update(
-                    value=service["name"]
-                )
-                self.window[service_key + "-UUID-"].update(value=service_uuid)
-                self.window[service_key + "-CONTAINER-"].update(visible=True)
-                # by default, section is collapsed
-                self.window[service_key].update(visible=False)
-                self.window[service_key + "-EXPAND_BUTTON-"].update(
-                    self.window[service_key].metadata[0]
-                    if self.window[service_key].visible
-                    else self.window[service_key].metadata[1]
+        gatt_model = self.ble.get_gatt_model(dev_address)
+        if gatt_model is None:
+            # device still connecting
+            gatt_model = self.ble.get_cached_gatt_model(dev_address)
+        tree = self.window[("-GATT_TREE-", i_tab)]
+        tree.Widget.delete(*tree.Widget.get_children())
+        tree.IdToKey = {"": ""}
+        tree.KeyToID = {"": ""}
+        self.chars_maps[dev_address] = {}
+        self.gatt_nodes[dev_address] = {}
+        self.char_values.setdefault(dev_address, {})
+        self.selected_chars.pop(dev_address, None)
+        self.set_char_details(i_tab, dev_address, None)
+        if gatt_model is None:
+            return
+        # only services are inserted, their characteristics are inserted
+        # when expanded
+        for service in gatt_model.services:
+            service_iid = self.insert_tree_node(
+                tree, "", f"S{service.handle}", service.name, [service.uuid, ""]
+            )
+            self.gatt_nodes[dev_address][service_iid] = service
+            if len(service.characteristics) > 0:
+                # placeholder for the expand indicator
+                self.insert_tree_node(tree, service_iid, f"P{service.handle}")
+
+    def insert_tree_node(self, tree, parent, iid, text="", values=()):
+        # items are inserted in the treeview directly, the element is given
+        # the ids it uses to report selected items
+        tree.Widget.insert(parent, "end", iid=iid, text=text, values=values)
+        tree.IdToKey[iid] = iid
+        tree.KeyToID[iid] = iid
+        return iid
+
+    def expand_tree_node(self, i_tab, dev_address, iid):
+        tree = self.window[("-GATT_TREE-", i_tab)]
+        placeholder = f"P{iid[1:]}"
+        if not iid.startswith("S") or not tree.Widget.exists(placeholder):
+            return
+        service = self.gatt_nodes[dev_address][iid]
+        tree.Widget.delete(placeholder)
+        del tree.IdToKey[placeholder]
+        del tree.KeyToID[placeholder]
+        char_values = self.char_values[dev_address]
+        for char in service.characteristics:
+            char_iid = self.insert_tree_node(
+                tree,
+                iid,
+                f"C{char.handle}",
+                char.name,
+                [char.uuid, char_values.get(char.handle, "")],
+            )
+            self.gatt_nodes[dev_address][char_iid] = char
+            self.chars_maps[dev_address][char.handle] = char_iid
+            for desc in char.descriptors:
+                desc_iid = self.insert_tree_node(
+                    tree,
+                    char_iid,
+                    f"D{desc.handle}",
+                    desc.name,
+                    [desc.uuid, ""],
                 )
-                # update characteristics data
-                for i_char, (
-                    char_uuid,
-                    char,
-                ) in enumerate(service["characteristics"].items()):
-                    char_key = service_key + f"CHARACTERISTIC${i_char + 1}$-"
-                    self.chars_maps[dev_address][char_uuid] = char_key
-                    self.window[char_key + "-EXPAND_TITLE-"].update(
-                        value=char["name"]
-                    )
-                    self.window[char_key + "-UUID-"].update(value=char_uuid)
-                    self.window[char_key + "-PROPERTIES-"].update(
-                        value=",".join(char["properties"])
-                    )
-                    desc_uuids = [uuid for uuid in char["descriptors"].keys()]
-                    desc_names = [
-                        desc["name"] for _, desc in char["descriptors"].items()
-                    ]
-                    if len(desc_uuids) > 0:
-                        self.window[char_key + "-DESCRIPTORS_LABEL-"].update(
-                            visible=True
-                        )
-                        self.window[char_key + "-DESCRIPTORS_NAMES-"].update(
-                            value=desc_names[0], values=desc_names, visible=True
-                        )
-                        self.window[char_key + "-DESCRIPTORS_UUIDS-"].update(
-                            value=desc_uuids[0], values=desc_uuids, visible=True
-                        )
-                    else:
-                        self.window[char_key + "-DESCRIPTORS_LABEL-"].update(
-                            visible=False
-                        )
-                        self.window[char_key + "-DESCRIPTORS_NAMES-"].update(
-                            value="", values=[""], visible=False
-                        )
-                        self.window[char_key + "-DESCRIPTORS_UUIDS-"].update(
-                            value="", values=[""], visible=False
-                        )
-                    self.window[char_key + "-READ-"].update(
-                        visible="read" in char["properties"]
-                    )
-                    self.window[char_key + "-WRITE-"].update(
-                        visible="write" in char["properties"]
-                    )
-                    self.window[char_key + "-INDICATE-"].update(
-                        visible="indicate" in char["properties"]
-                    )
-                    self.window[char_key + "-NOTIFY-"].update(
-                        visible="notify" in char["properties"]
-                    )
-                    if (
-                        len(char["properties"]) == 1
-                        and "write" in char["properties"][0]
-                    ):
-                        self.window[char_key + "-VALUE_LABEL-"].update(
-                            visible=False
-                        )
-                        self.window[char_key + "-VALUE-"].update(visible=False)
-                    else:
-                        self.window[char_key + "-VALUE_LABEL-"].update(
-                            visible=True
-                        )
-                        self.window[char_key + "-VALUE-"].update(visible=True)
-                    self.window[char_key + "-CONTAINER-"].update(visible=True)
-                    # by default, section is collapsed
-                    self.window[char_key].update(visible=False)
-                    self.window[char_key + "-EXPAND_BUTTON-"].update(
-                        self.window[char_key].metadata[0]
-                        if self.window[char_key].visible
-                        else self.window[char_key].metadata[1]
-                    )
-                for i_char in range(
-                    len(service["characteristics"]), MAX_NUM_CHARACTERISTICS
-                ):
-                    char_key = service_key + f"CHARACTERISTIC${i_char + 1}$-"
-                    self.window[char_key + "-CONTAINER-"].update(visible=False)
-
-            for i_service in range(len(dev_attr), MAX_NUM_SERVICES):
-                service_key = f"-SERVICE${i_tab},{i_service + 1}$-"
-                self.window[service_key + "-CONTAINER-"].update(visible=False)
-            dev_tab_section = f"-DEV${i_tab}$_CONTAINER-"
-            self.window.refresh()
-            self.window[dev_tab_section].contents_changed()
+                self.gatt_nodes[dev_address][desc_iid] = desc
+
+    def select_tree_node(self, i_tab, dev_address, iid):
+        if iid.startswith("D"):
+            # descriptors show their characteristic
+            iid = self.window[("-GATT_TREE-", i_tab)].Widget.parent(iid)
+        char = None
+        if iid.startswith("C"):
+            char = self.gatt_nodes[dev_address][iid]
+            self.selected_chars[dev_address] = char
+        else:
+            self.selected_chars.pop(dev_address, None)
+        self.set_char_details(i_tab, dev_address, char)
+
+    def set_char_details(self, i_tab, dev_address, char):
+        if char is None:
+            self.window[("-CHAR_CONTAINER-", i_tab)].update(visible=False)
+            return
+        self.window[("-CHAR_NAME-", i_tab)].update(value=char.name)
+        self.window[("-CHAR_UUID-", i_tab)].update(value=char.uuid)
+        self.window[("-CHAR_PROPERTIES-", i_tab)].update(
+            value=",".join(char.properties)
+        )
+        self.window[("-CHAR_VALUE-", i_tab)].update(
+            value=self.char_values[dev_address].get(char.handle, "")
+        )
+        desc_uuids = [desc.uuid for desc in char.descriptors]
+        desc_names = [desc.name for desc in char.descriptors]
+        if len(desc_uuids) > 0:
+            self.window[("-CHAR_DESCRIPTORS_LABEL-", i_tab)].update(
+                visible=True
+            )
+            self.window[("-CHAR_DESCRIPTORS_NAMES-", i_tab)].update(
+                value=desc_names[0], values=desc_names, visible=True
+            )
+            self.window[("-CHAR_DESCRIPTORS_UUIDS-", i_tab)].update(
+                value=desc_uuids[0], values=desc_uuids, visible=True
+            )
+        else:
+            self.window[("-CHAR_DESCRIPTORS_LABEL-", i_tab)].update(
+                visible=False
+            )
+            self.window[("-CHAR_DESCRIPTORS_NAMES-", i_tab)].update(
+                value="", values=[""], visible=False
+            )
+            self.window[("-CHAR_DESCRIPTORS_UUIDS-", i_tab)].update(
+                value="", values=[""], visible=False
+            )
+        self.window[("-CHAR_READ-", i_tab)].update(
+            visible="read" in char.properties
+        )
+        self.window[("-CHAR_WRITE-", i_tab)].update(
+            visible="write" in char.properties
+            or "write-without-response" in char.properties
+        )
+        self.window[("-CHAR_INDICATE-", i_tab)].update(
+            visible="indicate" in char.properties
+        )
+        self.window[("-CHAR_NOTIFY-", i_tab)].update(
+            visible="notify" in char.properties
+        )
+        self.update_subscription_buttons(i_tab, dev_address, char)
+        value_visible = not (
+            len(char.properties) == 1 and "write" in char.properties[0]
+        )
+        self.window[("-CHAR_VALUE_LABEL-", i_tab)].update(
+            value="Value"
+            + self.create_indication_stats_text(dev_address, char.handle),
+            visible=value_visible,
+        )
+        self.window[("-CHAR_VALUE-", i_tab)].update(visible=value_visible)
+        self.window[("-CHAR_CONTAINER-", i_tab)].update(visible=True)
+
+    def update_subscription_buttons(self, i_tab, dev_address, char):
+        for key, enabled in [
+            (
+                "-CHAR_INDICATE-",
+                self.ble.are_indications_enabled(dev_address, char.handle),
+            ),
+            (
+                "-CHAR_NOTIFY-",
+                self.ble.are_notifications_enabled(dev_address, char.handle),
+            ),
+        ]:
+            self.window[(key, i_tab)].update(
+                button_color=("white", "red")
+                if enabled
+                else sg.theme_button_color()
+            )
 
     def clear_scan_data(self):
-        self.i_selected_dev = None
+        self.selected_dev_addr = None
         self.window["-BLE_TABLE_DEVICES-"].update(values=[])
         self.window["-ADV_NAME-"].update(value="")
         self.window["-ADV_RSSI-"].update(value="")
+        self.window["-ADV_RSSI_STATS-"].update(value="")
         self.window["-ADV_UUIDS-"].update(values=[""], value="")
         self.window["-ADV_MFR_ID-"].update(value="")
 
-    def create_ble_table_data(self, ble_devices):
-        data = [
-            [dev["name"], dev["address"], dev["rssi"]] for dev in ble_devices
-        ]
-        return data
+    def create_ble_table_row(self, dev):
+        return [dev["name"], dev["address"], dev["rssi"]]
 
     def _create_layout(self):
         font = "Helvetica"
@@ -437,6 +803,9 @@ class BLExplorerGUI:
         ble_cntl_buttons = [
             sg.Button("Scan", key="-BLE_SCAN-"),
             sg.Button("Connect", disabled=True, key="-BLE_CONNECT-"),
+            sg.Checkbox("Auto reconnect", key="-BLE_AUTO_RECONNECT-"),
+            sg.Button("Record", key="-BLE_RECORD-"),
+            sg.Button("Replay", key="-BLE_REPLAY-"),
         ]
         layout_buttons = [
             sg.Frame(
@@ -484,9 +853,17 @@ class BLExplorerGUI:
                     sg.Input(
                         "",
                         readonly=True,
-                        size=(15,),
+                        size=(6, 1),
                         key="-ADV_RSSI-",
-                    )
+                    ),
+                    sg.Input(
+                        "",
+                        readonly=True,
+                        size=(27, 1),
+                        tooltip="Mean ± standard deviation of the RSSI, "
+                        "and mean advertising interval",
+                        key="-ADV_RSSI_STATS-",
+                    ),
                 ],
                 [
                     sg.Input(
@@ -541,33 +918,8 @@ class BLExplorerGUI:
             )
         ]
         tabs = [
-            sg.Tab(
-                f"Dev{i}",
-                [
-                    [
-                        sg.Column(
-                            [
-                                [
-                                    self._create_service_layout(
-                                        f"-SERVICE${i},{j}$-"
-                                    )
-                                ]
-                                for j in range(1, MAX_NUM_SERVICES + 1)
-                            ],
-                            scrollable=True,
-                            vertical_scroll_only=True,
-                            expand_x=True,
-                            expand_y=True,
-                            key=f"-DEV${i}$_CONTAINER-",
-                        )
-                    ]
-                ],
-                expand_x=True,
-                expand_y=True,
-                visible=False,
-                key=f"-CONNECTED_DEVICE${i}$-",
-            )
-            for i in range(1, MAX_NUM_DEVICES + 1)
+            self._create_device_tab(i)
+            for i in range(1, INITIAL_NUM_DEVICE_TABS + 1)
         ]
         tab_group = sg.TabGroup(
             [tabs],
@@ -620,103 +972,50 @@ class BLExplorerGUI:
         ]
         return layout
 
-    def _create_service_layout(
-        self, key, section_arrows=(sg.SYMBOL_DOWN, sg.SYMBOL_UP)
-    ):
-        service_labels = sg.Column(
-            [
-                [sg.Text("UUID", key=key + "-UUID_LABEL-")],
-            ]
-        )
-        service_vals = sg.Column(
-            [
-                [
-                    sg.Input(
-                        "",
-                        readonly=True,
-                        size=(33,),
-                        key=key + "-UUID-",
-                    )
-                ]
-            ]
+    def _create_device_tab(self, i):
+        # services are shown in a single treeview, so the widgets created do
+        # not depend on the number of services and characteristics
+        gatt_tree = sg.Tree(
+            sg.TreeData(),
+            headings=["UUID", "Value"],
+            col0_heading="Name",
+            col0_width=22,
+            col_widths=[33, 20],
+            auto_size_columns=False,
+            justification="left",
+            num_rows=GATT_TREE_ROWS,
+            enable_events=True,
+            expand_x=True,
+            expand_y=True,
+            key=("-GATT_TREE-", i),
         )
-        service_layout = [[service_labels, service_vals]] + [
+        return sg.Tab(
+            f"Dev{i}",
             [
-                sg.pin(
-                    sg.Frame(
-                        "",
-                        [
-                            [
-                                self._create_characteristics_layout(
-                                    key + f"CHARACTERISTIC${i}$-",
-                                    section_arrows,
-                                )
-                            ]
-                        ],
-                        border_width=1,
-                        expand_x=True,
-                        expand_y=True,
-                        key=key + f"CHARACTERISTIC${i}$-" + "-CONTAINER-",
-                    )
-                )
-            ]
-            for i in range(1, MAX_NUM_CHARACTERISTICS + 1)
-        ]
-        service_section = sg.pin(
-            sg.Frame(
-                "",
-                [
-                    [
-                        sg.Column(
-                            [
-                                [
-                                    sg.Text(
-                                        (section_arrows[1]),
-                                        enable_events=True,
-                                        k=key + "-EXPAND_BUTTON-",
-                                    ),
-                                    sg.Text(
-                                        "Service",
-                                        enable_events=True,
-                                        key=key + "-EXPAND_TITLE-",
-                                    ),
-                                ]
-                            ],
-                            expand_x=True,
-                        )
-                    ],
-                    [
-                        sg.pin(
-                            sg.Column(
-                                service_layout,
-                                metadata=section_arrows,
-                                expand_x=True,
-                                expand_y=True,
-                                visible=False,
-                                key=key,
-                            )
-                        )
-                    ],
-                ],
-                border_width=2,
-                expand_x=True,
-                expand_y=True,
-                key=key + "-CONTAINER-",
-            )
+                [gatt_tree],
+                [self._create_characteristic_layout(i)],
+            ],
+            expand_x=True,
+            expand_y=True,
+            visible=False,
+            key=("-CONNECTED_DEVICE-", i),
         )
-        return service_section
 
-    def _create_characteristics_layout(
-        self, key, section_arrows=(sg.SYMBOL_DOWN, sg.SYMBOL_UP)
-    ):
+    def _bind_device_tab(self, i):
+        # services are populated when expanded
+        self.window[("-GATT_TREE-", i)].bind("<<TreeviewOpen>>", "+OPEN")
+
+    def _create_characteristic_layout(self, i):
         characteristic_labels = sg.Column(
             [
-                [sg.Text("UUID", key=key + "-UUID_LABEL-")],
-                [sg.Text("Properties", key=key + "-PROPERTIES_LABEL-")],
-                [sg.pin(sg.Text("Value", key=key + "-VALUE_LABEL-"))],
+                [sg.Text("UUID", key=("-CHAR_UUID_LABEL-", i))],
+                [sg.Text("Properties", key=("-CHAR_PROPERTIES_LABEL-", i))],
+                [sg.pin(sg.Text("Value", key=("-CHAR_VALUE_LABEL-", i)))],
                 [
                     sg.pin(
-                        sg.Text("Descriptors", key=key + "-DESCRIPTORS_LABEL-")
+                        sg.Text(
+                            "Descriptors", key=("-CHAR_DESCRIPTORS_LABEL-", i)
+                        )
                     )
                 ],
             ]
@@ -728,7 +1027,7 @@ class BLExplorerGUI:
                         "",
                         readonly=True,
                         size=(33,),
-                        key=key + "-UUID-",
+                        key=("-CHAR_UUID-", i),
                     )
                 ],
                 [
@@ -736,7 +1035,7 @@ class BLExplorerGUI:
                         "",
                         readonly=True,
                         size=(15,),
-                        key=key + "-PROPERTIES-",
+                        key=("-CHAR_PROPERTIES-", i),
                     )
                 ],
                 [
@@ -745,7 +1044,7 @@ class BLExplorerGUI:
                             "",
                             readonly=True,
                             size=(33,),
-                            key=key + "-VALUE-",
+                            key=("-CHAR_VALUE-", i),
                         )
                     )
                 ],
@@ -757,7 +1056,7 @@ class BLExplorerGUI:
                             readonly=True,
                             size=(33,),
                             enable_events=True,
-                            key=key + "-DESCRIPTORS_NAMES-",
+                            key=("-CHAR_DESCRIPTORS_NAMES-", i),
                         )
                     ),
                     sg.pin(
@@ -767,13 +1066,12 @@ class BLExplorerGUI:
                             readonly=True,
                             size=(33,),
                             enable_events=True,
-                            key=key + "-DESCRIPTORS_UUIDS-",
+                            key=("-CHAR_DESCRIPTORS_UUIDS-", i),
                         )
                     ),
                 ],
             ]
         )
-        characteristic_layout = [[characteristic_labels, characteristic_vals]]
         characteristic_buttons = sg.Column(
             [
                 [
@@ -782,7 +1080,7 @@ class BLExplorerGUI:
                             "↓",
                             enable_events=True,
                             font=14,
-                            key=key + "-READ-",
+                            key=("-CHAR_READ-", i),
                         )
                     ),
                     sg.pin(
@@ -790,7 +1088,7 @@ class BLExplorerGUI:
                             "↑",
                             enable_events=True,
                             font=14,
-                            key=key + "-WRITE-",
+                            key=("-CHAR_WRITE-", i),
                         )
                     ),
                     sg.pin(
@@ -798,8 +1096,7 @@ class BLExplorerGUI:
                             "↑↓",
                             enable_events=True,
                             font=14,
-                            disabled=True,  # indications are not supported yet
-                            key=key + "-INDICATE-",
+                            key=("-CHAR_INDICATE-", i),
                         )
                     ),
                     sg.pin(
@@ -807,55 +1104,52 @@ class BLExplorerGUI:
                             "↓↓",
                             enable_events=True,
                             font=14,
-                            key=key + "-NOTIFY-",
+                            key=("-CHAR_NOTIFY-", i),
                         )
                     ),
                 ]
             ],
             element_justification="right",
         )
-        characteristic_section = sg.Column(
-            [
-                [
-                    sg.Column(
-                        [
-                            [
-                                sg.Text(
-                                    (section_arrows[1]),
-                                    enable_events=True,
-                                    k=key + "-EXPAND_BUTTON-",
-                                ),
-                                sg.Text(
-                                    "Characteristic",
-                                    enable_events=True,
-                                    key=key + "-EXPAND_TITLE-",
-                                ),
-                                sg.Push(),
-                                characteristic_buttons,
-                            ]
-                        ],
-                        expand_x=True,
-                    )
-                ],
+        characteristic_section = sg.pin(
+            sg.Frame(
+                "",
                 [
-                    sg.pin(
-                        sg.Column(
-                            characteristic_layout,
-                            metadata=section_arrows,
-                            expand_x=True,
-                            expand_y=True,
-                            visible=False,
-                            key=key,
-                        )
-                    )
+                    [
+                        sg.Text(
+                            "Characteristic",
+                            key=("-CHAR_NAME-", i),
+                        ),
+                        sg.Push(),
+                        characteristic_buttons,
+                    ],
+                    [characteristic_labels, characteristic_vals],
                 ],
-            ],
+                border_width=1,
+                expand_x=True,
+                visible=False,
+                key=("-CHAR_CONTAINER-", i),
+            ),
             expand_x=True,
-            expand_y=True,
         )
         return characteristic_section
 
 
-if __name__ == "__main__":
-    blexplorer = BLExplorerGUI()
+def main():
+    parser = argparse.ArgumentParser(
+        description="Bluetooth Low Energy explorer"
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="print the time taken by each startup step",
+    )
+    args = parser.parse_args()
+    blexplorer = BLExplorerGUI(
+        StartupProfile() if args.profile_startup else None
+    )
     blexplorer.run()
+
+
+if __name__ == "__main__":
+    main()
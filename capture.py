@@ -0,0 +1,431 @@
+import bisect
+import collections
+import mmap
+import os
+import struct
+import threading
+import time
+
+
+CAPTURE_MAGIC = b"BLXCAP"
+CAPTURE_VERSION = 2
+# channels of version 1 captures have no handle
+CAPTURE_VERSIONS = (1, 2)
+
+# file header: magic, version, wall clock and monotonic time at start (ns)
+FILE_HEADER = struct.Struct("<6sHqq")
+# every record starts with its type and the length of its body
+RECORD_HEADER = struct.Struct("<BI")
+# data record body: channel, monotonic timestamp (ns), followed by payload
+DATA_HEADER = struct.Struct("<HQ")
+DATA_RECORD_HEADER = struct.Struct("<BIHQ")
+# channel record body: channel, followed by length-prefixed strings and the
+# characteristic handle
+CHANNEL_HEADER = struct.Struct("<H")
+STRING_HEADER = struct.Struct("<H")
+CHANNEL_HANDLE = struct.Struct("<H")
+# index record body: previous index offset, first and last timestamp, offset
+# of the first data record and number of data records in the segment
+INDEX_BODY = struct.Struct("<qQQQI")
+# end record body: last index offset, channel table offset
+END_BODY = struct.Struct("<qq")
+
+RECORD_CHANNEL = 1
+RECORD_DATA = 2
+RECORD_INDEX = 3
+RECORD_END = 4
+
+INDEX_INTERVAL = 1024  # number of data records per index segment
+FLUSH_INTERVAL = 0.05  # period (s) of the background writer
+
+
+class CaptureChannel:
+    def __init__(
+        self, channel_id, address, uuid, service_uuid, properties, handle
+    ):
+        self.channel_id = channel_id
+        self.address = address
+        self.uuid = uuid
+        self.service_uuid = service_uuid
+        self.properties = properties
+        self.handle = handle
+
+
+def _pack_string(value):
+    data = value.encode("utf-8")
+    return STRING_HEADER.pack(len(data)) + data
+
+
+def _unpack_strings(body, offset, count):
+    strings = []
+    for _ in range(count):
+        (str_len,) = STRING_HEADER.unpack_from(body, offset)
+        offset += STRING_HEADER.size
+        strings.append(bytes(body[offset : offset + str_len]).decode("utf-8"))
+        offset += str_len
+    return strings, offset
+
+
+def _pack_channel(channel):
+    body = (
+        CHANNEL_HEADER.pack(channel.channel_id)
+        + _pack_string(channel.address)
+        + _pack_string(channel.uuid)
+        + _pack_string(channel.service_uuid)
+        + _pack_string(",".join(channel.properties))
+        + CHANNEL_HANDLE.pack(channel.handle)
+    )
+    return RECORD_HEADER.pack(RECORD_CHANNEL, len(body)) + body
+
+
+def _unpack_channel(body):
+    (channel_id,) = CHANNEL_HEADER.unpack_from(body, 0)
+    (address, uuid, service_uuid, properties), offset = _unpack_strings(
+        body, CHANNEL_HEADER.size, 4
+    )
+    handle = None
+    if offset + CHANNEL_HANDLE.size <= len(body):
+        (handle,) = CHANNEL_HANDLE.unpack_from(body, offset)
+    return CaptureChannel(
+        channel_id,
+        address,
+        uuid,
+        service_uuid,
+        properties.split(",") if len(properties) > 0 else [],
+        handle,
+    )
+
+
+class CaptureWriter:
+    def __init__(
+        self,
+        path,
+        index_interval=INDEX_INTERVAL,
+        flush_interval=FLUSH_INTERVAL,
+    ):
+        self.path = path
+        self.index_interval = index_interval
+        self.flush_interval = flush_interval
+        self.channels = {}
+        self.channels_lock = threading.Lock()
+        # deque appends and pops are atomic, so producers never wait on the
+        # writer thread
+        self.pending = collections.deque()
+        self.records_written = 0
+        self.bytes_written = 0
+        self.batches_written = 0
+        self.max_pending = 0
+        # path may also be a binary file, e.g. stdout for streaming
+        self._file = path if hasattr(path, "write") else open(path, "wb")
+        self._offset = 0
+        self._last_index_offset = -1
+        self._segment_first_offset = None
+        self._segment_first_timestamp = 0
+        self._segment_last_timestamp = 0
+        self._segment_records = 0
+        self._stop_event = threading.Event()
+        self._write(
+            FILE_HEADER.pack(
+                CAPTURE_MAGIC,
+                CAPTURE_VERSION,
+                time.time_ns(),
+                time.monotonic_ns(),
+            )
+        )
+        self._writer_thread = threading.Thread(
+            target=self._writer_loop, daemon=True
+        )
+        self._writer_thread.start()
+
+    def record(self, address, char, data, timestamp_ns=None):
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        # by handle, as characteristics may have the same uuid
+        channel = self.channels.get((address, char.handle))
+        if channel is None:
+            channel = self._add_channel(address, char)
+        self.pending.append((channel.channel_id, timestamp_ns, data))
+
+    def close(self):
+        if self._file is None:
+            return
+        self._stop_event.set()
+        self._writer_thread.join()
+        buffer = bytearray()
+        self._flush_pending(buffer)
+        if self._segment_records > 0:
+            self._append_index(buffer)
+        channel_table_offset = self._offset + len(buffer)
+        for channel in list(self.channels.values()):
+            buffer += _pack_channel(channel)
+        buffer += RECORD_HEADER.pack(RECORD_END, END_BODY.size)
+        buffer += END_BODY.pack(self._last_index_offset, channel_table_offset)
+        self._write(buffer)
+        self._file.close()
+        self._file = None
+
+    def get_stats(self):
+        return {
+            "records": self.records_written,
+            "bytes": self.bytes_written,
+            "batches": self.batches_written,
+            "pending": len(self.pending),
+            "max_pending": self.max_pending,
+        }
+
+    def _add_channel(self, address, char):
+        with self.channels_lock:
+            channel = self.channels.get((address, char.handle))
+            if channel is None:
+                channel = CaptureChannel(
+                    len(self.channels),
+                    address,
+                    char.uuid,
+                    getattr(char, "service_uuid", ""),
+                    list(getattr(char, "properties", [])),
+                    char.handle,
+                )
+                # channel definition precedes the data records using it
+                self.pending.append((None, 0, channel))
+                self.channels[(address, char.handle)] = channel
+        return channel
+
+    def _writer_loop(self):
+        buffer = bytearray()
+        while not self._stop_event.wait(self.flush_interval):
+            self.max_pending = max(self.max_pending, len(self.pending))
+            self._flush_pending(buffer)
+            if len(buffer) > 0:
+                self._write(buffer)
+                buffer.clear()
+
+    def _flush_pending(self, buffer):
+        # serialize all pending records into the buffer, so they are written
+        # to the file with a single write call
+        pending = self.pending
+        while True:
+            try:
+                channel_id, timestamp_ns, data = pending.popleft()
+            except IndexError:
+                break
+            if channel_id is None:
+                buffer += _pack_channel(data)
+                continue
+            if self._segment_records == 0:
+                self._segment_first_offset = self._offset + len(buffer)
+                self._segment_first_timestamp = timestamp_ns
+            buffer += DATA_RECORD_HEADER.pack(
+                RECORD_DATA,
+                DATA_HEADER.size + len(data),
+                channel_id,
+                timestamp_ns,
+            )
+            buffer += data
+            self._segment_last_timestamp = timestamp_ns
+            self._segment_records += 1
+            self.records_written += 1
+            if self._segment_records >= self.index_interval:
+                self._append_index(buffer)
+
+    def _append_index(self, buffer):
+        index_offset = self._offset + len(buffer)
+        buffer += RECORD_HEADER.pack(RECORD_INDEX, INDEX_BODY.size)
+        buffer += INDEX_BODY.pack(
+            self._last_index_offset,
+            self._segment_first_timestamp,
+            self._segment_last_timestamp,
+            self._segment_first_offset,
+            self._segment_records,
+        )
+        self._last_index_offset = index_offset
+        self._segment_records = 0
+
+    def _write(self, data):
+        self._file.write(data)
+        self._file.flush()
+        self._offset += len(data)
+        self.bytes_written += len(data)
+        self.batches_written += 1
+
+
+class CaptureReader:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = None
+        self.channels = {}
+        # index segments: (first timestamp, last timestamp, offset, records)
+        self.segments = []
+        try:
+            self._open()
+        except (ValueError, struct.error) as e:
+            # files too short or truncated within a record
+            self.close()
+            raise ValueError(f"{path} is not a BLExplorer capture") from e
+        self._segments_last_timestamps = [
+            segment[1] for segment in self.segments
+        ]
+
+    def _open(self):
+        # empty files can't be mapped
+        if os.fstat(self._file.fileno()).st_size < FILE_HEADER.size:
+            raise ValueError("file shorter than the header")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        (
+            magic,
+            version,
+            self.start_wall_time_ns,
+            self.start_monotonic_ns,
+        ) = FILE_HEADER.unpack_from(self._view, 0)
+        if magic != CAPTURE_MAGIC or version not in CAPTURE_VERSIONS:
+            raise ValueError("wrong magic or version")
+        if not self._load_index():
+            self._scan()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._mmap is not None:
+            self._view.release()
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    @property
+    def start_time_ns(self):
+        return self.segments[0][0] if len(self.segments) > 0 else None
+
+    @property
+    def end_time_ns(self):
+        return self.segments[-1][1] if len(self.segments) > 0 else None
+
+    @property
+    def num_records(self):
+        return sum(segment[3] for segment in self.segments)
+
+    def seek(self, timestamp_ns):
+        # offset of the first data record at or after the timestamp
+        i_segment = bisect.bisect_left(
+            self._segments_last_timestamps, timestamp_ns
+        )
+        if i_segment >= len(self.segments):
+            return None
+        offset = self.segments[i_segment][2]
+        for record_offset, record_timestamp, _, _ in self._iter_data(offset):
+            if record_timestamp >= timestamp_ns:
+                return record_offset
+        return None
+
+    def records(self, start_time_ns=None, end_time_ns=None):
+        # yields (timestamp, channel, payload), payload is a view of the file
+        if start_time_ns is None:
+            if len(self.segments) == 0:
+                return
+            offset = self.segments[0][2]
+        else:
+            offset = self.seek(start_time_ns)
+            if offset is None:
+                return
+        for _, timestamp_ns, channel_id, payload in self._iter_data(offset):
+            if end_time_ns is not None and timestamp_ns > end_time_ns:
+                break
+            yield timestamp_ns, self.channels[channel_id], payload
+
+    def _iter_records(self, offset):
+        view = self._view
+        size = len(view)
+        while offset + RECORD_HEADER.size <= size:
+            record_type, body_len = RECORD_HEADER.unpack_from(view, offset)
+            body_offset = offset + RECORD_HEADER.size
+            if body_offset + body_len > size:
+                # truncated record at the end of an unfinished capture
+                break
+            yield offset, record_type, body_offset, body_len
+            offset = body_offset + body_len
+
+    def _iter_data(self, offset):
+        view = self._view
+        for (
+            record_offset,
+            record_type,
+            body_offset,
+            body_len,
+        ) in self._iter_records(offset):
+            if record_type == RECORD_DATA:
+                channel_id, timestamp_ns = DATA_HEADER.unpack_from(
+                    view, body_offset
+                )
+                payload_offset = body_offset + DATA_HEADER.size
+                yield (
+                    record_offset,
+                    timestamp_ns,
+                    channel_id,
+                    view[payload_offset : body_offset + body_len],
+                )
+            elif record_type == RECORD_CHANNEL:
+                channel = _unpack_channel(
+                    view[body_offset : body_offset + body_len]
+                )
+                self.channels[channel.channel_id] = channel
+            elif record_type == RECORD_END:
+                break
+
+    def _load_index(self):
+        # finished captures end with a record pointing to the last index
+        end_size = RECORD_HEADER.size + END_BODY.size
+        end_offset = len(self._view) - end_size
+        if end_offset < FILE_HEADER.size:
+            return False
+        record_type, body_len = RECORD_HEADER.unpack_from(
+            self._view, end_offset
+        )
+        if record_type != RECORD_END or body_len != END_BODY.size:
+            return False
+        index_offset, channel_table_offset = END_BODY.unpack_from(
+            self._view, end_offset + RECORD_HEADER.size
+        )
+        for _, record_type, body_offset, body_len in self._iter_records(
+            channel_table_offset
+        ):
+            if record_type != RECORD_CHANNEL:
+                break
+            channel = _unpack_channel(
+                self._view[body_offset : body_offset + body_len]
+            )
+            self.channels[channel.channel_id] = channel
+        while index_offset >= 0:
+            (
+                index_offset,
+                first_timestamp,
+                last_timestamp,
+                first_offset,
+                num_records,
+            ) = INDEX_BODY.unpack_from(
+                self._view, index_offset + RECORD_HEADER.size
+            )
+            self.segments.append(
+                (first_timestamp, last_timestamp, first_offset, num_records)
+            )
+        self.segments.reverse()
+        return True
+
+    def _scan(self):
+        # unfinished capture, rebuild the index by walking all records
+        segment = None
+        for record_offset, timestamp_ns, _, _ in self._iter_data(
+            FILE_HEADER.size
+        ):
+            if segment is None:
+                segment = [timestamp_ns, timestamp_ns, record_offset, 0]
+            segment[1] = timestamp_ns
+            segment[3] += 1
+            if segment[3] >= INDEX_INTERVAL:
+                self.segments.append(tuple(segment))
+                segment = None
+        if segment is not None:
+            self.segments.append(tuple(segment))
@@ -0,0 +1,114 @@
+import collections
+import enum
+import queue
+import threading
+
+
+class OverflowPolicy(enum.Enum):
+    DropOldest = enum.auto()  # ring buffer, the oldest item is discarded
+    DropNewest = enum.auto()  # the item being put is discarded
+    Block = enum.auto()  # wait up to block_timeout for free space
+    CoalesceLatest = enum.auto()  # replace pending item with the same key
+
+
+class EventQueue:
+    def __init__(
+        self,
+        maxsize=0,
+        policy=OverflowPolicy.DropOldest,
+        block_timeout=None,
+    ):
+        self.maxsize = maxsize
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self.coalesced = 0
+        # items are stored as [key, item] slots, so a coalesced item can be
+        # replaced in place without searching the queue
+        self._slots = collections.deque()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+
+    def put(self, item, key=None):
+        with self._lock:
+            # the pending item with the same key is replaced whether or not
+            # the queue is full, so only the latest value is ever pending
+            if (
+                self.policy == OverflowPolicy.CoalesceLatest
+                and key is not None
+                and key in self._pending
+            ):
+                self._pending[key][1] = item
+                self.coalesced += 1
+                return True
+            if self.maxsize > 0 and len(self._slots) >= self.maxsize:
+                if self.policy == OverflowPolicy.DropNewest:
+                    self.dropped += 1
+                    return False
+                elif self.policy == OverflowPolicy.Block:
+                    # blocks the calling thread, which is the asyncio loop
+                    # thread for data coming from the device
+                    if not self._not_full.wait_for(
+                        lambda: len(self._slots) < self.maxsize,
+                        self.block_timeout,
+                    ):
+                        self.dropped += 1
+                        return False
+                else:
+                    self._pop_slot()
+                    self.dropped += 1
+            slot = [key, item]
+            self._slots.append(slot)
+            if key is not None:
+                self._pending[key] = slot
+            return True
+
+    def put_nowait(self, item, key=None):
+        if not self.put(item, key):
+            raise queue.Full
+
+    def get_nowait(self):
+        with self._lock:
+            if len(self._slots) == 0:
+                raise queue.Empty
+            item = self._pop_slot()
+            self._not_full.notify()
+            return item
+
+    def get_many(self, max_items=None):
+        with self._lock:
+            num_items = len(self._slots)
+            if max_items is not None:
+                num_items = min(num_items, max_items)
+            items = [self._pop_slot() for _ in range(num_items)]
+            if num_items > 0:
+                self._not_full.notify_all()
+            return items
+
+    def qsize(self):
+        return len(self._slots)
+
+    def empty(self):
+        return len(self._slots) == 0
+
+    def clear(self):
+        with self._lock:
+            self._slots.clear()
+            self._pending.clear()
+            self._not_full.notify_all()
+
+    def get_stats(self):
+        return {
+            "size": len(self._slots),
+            "capacity": self.maxsize,
+            "policy": self.policy,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
+
+    def _pop_slot(self):
+        key, item = slot = self._slots.popleft()
+        if key is not None and self._pending.get(key) is slot:
+            del self._pending[key]
+        return item
@@ -0,0 +1,286 @@
+import asyncio
+import collections
+import json
+import os
+import time
+
+from ble_status import DataGap
+from gatt import CharProperty
+
+
+SUBSCRIBER_BUFFER_SIZE = 4096  # pending messages per subscriber
+TOPIC_QUEUE_SIZE = 10000  # pending notifications per topic
+MAX_WRITE_BATCH = 1024  # messages per socket write
+
+
+# topics are "address/uuid" or "address/handle" (decimal) of notifying or
+# indicating characteristics, characteristics sharing a uuid are listed by
+# handle; requests and messages are json objects, one per line:
+#   {"subscribe": [topic, ...]}, {"unsubscribe": [topic, ...]}, {"list": true}
+#   {"topic": topic, "time": t, "data": hex}
+#   {"topic": topic, "time": t, "gap": seconds} after a reconnection
+#   {"topic": topic, "end": true} when notifications stop
+#   {"topics": [topic, ...]} in reply to list, {"error": message}
+def get_topic(address, char_specifier):
+    return f"{address}/{char_specifier}"
+
+
+def parse_topic(topic):
+    address, _, char_specifier = topic.partition("/")
+    if char_specifier.isdecimal():
+        return address, int(char_specifier)
+    return address, char_specifier
+
+
+def is_valid_request(request):
+    if not isinstance(request, dict):
+        return False
+    for name in ["subscribe", "unsubscribe"]:
+        topics = request.get(name, [])
+        if not isinstance(topics, list) or not all(
+            isinstance(topic, str) for topic in topics
+        ):
+            return False
+    return True
+
+
+class FanoutSubscriber:
+    # messages are buffered, and the oldest dropped once the buffer is full,
+    # so a slow subscriber never delays the publisher or other subscribers
+    def __init__(self, writer, buffer_size):
+        self.writer = writer
+        peername = writer.get_extra_info("peername")
+        self.name = str(peername) if peername else f"client-{id(self):x}"
+        self.topics = set()
+        self.buffer = collections.deque()
+        self.buffer_size = buffer_size
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        # publication time of the oldest message being written
+        self.writing_since = None
+
+    def put(self, timestamp, message):
+        # timestamp is the time.monotonic time the message was published
+        if len(self.buffer) >= self.buffer_size:
+            self.buffer.popleft()
+            self.dropped += 1
+        self.buffer.append((timestamp, message))
+        self.ready.set()
+
+    async def run_writer(self):
+        # ends when the socket is closed by the subscriber
+        try:
+            await self._write_messages()
+        except OSError:
+            pass
+
+    async def _write_messages(self):
+        buffer = self.buffer
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            while len(buffer) > 0:
+                messages = [
+                    buffer.popleft()
+                    for _ in range(min(len(buffer), MAX_WRITE_BATCH))
+                ]
+                self.writing_since = messages[0][0]
+                self.writer.write(
+                    b"".join([message for _, message in messages])
+                )
+                await self.writer.drain()
+                self.writing_since = None
+                # lag from publication until the socket accepted the message
+                now = time.monotonic()
+                lag_max = now - messages[0][0]
+                self.lag_total += sum(
+                    [now - timestamp for timestamp, _ in messages]
+                )
+                self.lag_max = max(self.lag_max, lag_max)
+                self.sent += len(messages)
+
+    def get_stats(self):
+        # age of the oldest message not accepted by the socket yet
+        oldest = self.writing_since
+        if oldest is None and len(self.buffer) > 0:
+            oldest = self.buffer[0][0]
+        lag = time.monotonic() - oldest if oldest is not None else 0.0
+        return {
+            "topics": len(self.topics),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "pending": len(self.buffer),
+            "lag": lag,
+            "lag_mean": self.lag_total / self.sent if self.sent else None,
+            "lag_max": max(self.lag_max, lag),
+        }
+
+
+class FanoutServer:
+    # publishes notifications of an AsyncBle to local subscribers, on a unix
+    # domain socket or a localhost tcp port; runs on the event loop of the
+    # AsyncBle, and notifications of a topic are only enabled while it has
+    # subscribers
+    def __init__(self, ble, buffer_size=SUBSCRIBER_BUFFER_SIZE):
+        self.ble = ble
+        self.buffer_size = buffer_size
+        self.subscribers = []
+        self.topics = {}
+        self.topic_tasks = {}
+        self.clock_offset = time.time() - time.monotonic()
+        self.server = None
+        self.path = None
+
+    async def start_unix(self, path):
+        self.server = await asyncio.start_unix_server(self._handle_client, path)
+        self.path = path
+
+    async def start_tcp(self, port, host="127.0.0.1"):
+        self.server = await asyncio.start_server(
+            self._handle_client, host, port
+        )
+
+    async def stop(self):
+        self.server.close()
+        for task in list(self.topic_tasks.values()):
+            task.cancel()
+        for subscriber in list(self.subscribers):
+            subscriber.writer.close()
+        await self.server.wait_closed()
+        if self.path is not None:
+            os.remove(self.path)
+
+    def get_topics(self):
+        topics = []
+        for address in self.ble.get_connected_devices():
+            chars = self.ble.get_gatt_model(address).chars_by_handle.values()
+            uuid_counts = collections.Counter(char.uuid for char in chars)
+            topics += [
+                get_topic(
+                    address,
+                    char.uuid if uuid_counts[char.uuid] == 1 else char.handle,
+                )
+                for char in chars
+                if char.flags & (CharProperty.Notify | CharProperty.Indicate)
+            ]
+        return topics
+
+    def get_stats(self):
+        return {
+            subscriber.name: subscriber.get_stats()
+            for subscriber in list(self.subscribers)
+        }
+
+    async def _handle_client(self, reader, writer):
+        subscriber = FanoutSubscriber(writer, self.buffer_size)
+        self.subscribers.append(subscriber)
+        writer_task = asyncio.ensure_future(subscriber.run_writer())
+        try:
+            async for line in reader:
+                self._handle_request(subscriber, json.loads(line))
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            for topic in list(subscriber.topics):
+                self._unsubscribe(subscriber, topic)
+            self.subscribers.remove(subscriber)
+            writer_task.cancel()
+            writer.close()
+
+    def _handle_request(self, subscriber, request):
+        if not is_valid_request(request):
+            self._reply(subscriber, {"error": f"invalid request {request}"})
+            return
+        for topic in request.get("subscribe", []):
+            self._subscribe(subscriber, topic)
+        for topic in request.get("unsubscribe", []):
+            self._unsubscribe(subscriber, topic)
+        if request.get("list"):
+            self._reply(subscriber, {"topics": self.get_topics()})
+
+    def _reply(self, subscriber, message):
+        subscriber.put(time.monotonic(), (json.dumps(message) + "\n").encode())
+
+    def _subscribe(self, subscriber, topic):
+        if topic in subscriber.topics:
+            return
+        subscribers = self.topics.get(topic)
+        if subscribers is None:
+            address, char_specifier = parse_topic(topic)
+            char = self.ble.get_characteristic(
+                address,
+                char_specifier,
+                CharProperty.Notify | CharProperty.Indicate,
+            )
+            if char is None:
+                self._reply(subscriber, {"error": f"unknown topic {topic}"})
+                return
+            subscribers = []
+            self.topics[topic] = subscribers
+            self.topic_tasks[topic] = asyncio.ensure_future(
+                self._publish(topic, address, char_specifier, subscribers)
+            )
+        subscribers.append(subscriber)
+        subscriber.topics.add(topic)
+
+    def _unsubscribe(self, subscriber, topic):
+        if topic not in subscriber.topics:
+            return
+        subscriber.topics.remove(topic)
+        subscribers = self.topics[topic]
+        subscribers.remove(subscriber)
+        if len(subscribers) == 0:
+            del self.topics[topic]
+            self.topic_tasks.pop(topic).cancel()
+
+    async def _publish(self, topic, address, char_specifier, subscribers):
+        # every message is formatted once for all subscribers of the topic
+        clock_offset = self.clock_offset
+        try:
+            async for data in self.ble.notifications(
+                address, char_specifier, TOPIC_QUEUE_SIZE
+            ):
+                now = time.monotonic()
+                if isinstance(data, DataGap):
+                    message = (
+                        f'{{"topic":"{topic}","time":{now + clock_offset:.6f},'
+                        f'"gap":{data.end_time - data.start_time:.6f}}}\n'
+                    )
+                else:
+                    message = (
+                        f'{{"topic":"{topic}","time":{now + clock_offset:.6f},'
+                        f'"data":"{data.hex()}"}}\n'
+                    )
+                message = message.encode()
+                for subscriber in subscribers:
+                    subscriber.put(now, message)
+        except ValueError:
+            # the characteristic is gone, e.g. its device disconnected before
+            # notifications were enabled
+            pass
+        # subscribing again restarts the topic, once the device is connected
+        del self.topics[topic]
+        del self.topic_tasks[topic]
+        message = f'{{"topic":"{topic}","end":true}}\n'.encode()
+        for subscriber in subscribers:
+            subscriber.topics.discard(topic)
+            subscriber.put(time.monotonic(), message)
+
+
+async def subscribe(topics, path=None, port=None, host="127.0.0.1"):
+    # client side, yields the messages of the topics as dicts, from the server
+    # listening on the unix domain socket path, or on the tcp port
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write((json.dumps({"subscribe": list(topics)}) + "\n").encode())
+        await writer.drain()
+        async for line in reader:
+            yield json.loads(line)
+    finally:
+        writer.close()
@@ -0,0 +1,148 @@
+import enum
+import functools
+
+
+class CharProperty(enum.IntFlag):
+    Read = 1
+    Write = 2
+    WriteWithoutResponse = 4
+    Notify = 8
+    Indicate = 16
+
+
+PROPERTY_FLAGS = {
+    "read": CharProperty.Read,
+    "write": CharProperty.Write,
+    "write-without-response": CharProperty.WriteWithoutResponse,
+    "notify": CharProperty.Notify,
+    "indicate": CharProperty.Indicate,
+}
+
+
+# characteristics share a few combinations of properties
+@functools.lru_cache(maxsize=None)
+def get_property_flags(properties):
+    flags = CharProperty(0)
+    for prop in properties:
+        flags |= PROPERTY_FLAGS.get(prop, 0)
+    return flags
+
+
+class GattDescriptor:
+    __slots__ = ("uuid", "handle", "name", "descriptor")
+
+    def __init__(self, descriptor):
+        self.uuid = descriptor.uuid
+        self.handle = descriptor.handle
+        self.name = descriptor.description
+        self.descriptor = descriptor
+
+
+class GattCharacteristic:
+    __slots__ = (
+        "uuid",
+        "handle",
+        "name",
+        "properties",
+        "flags",
+        "descriptors",
+        "service_uuid",
+        "characteristic",
+    )
+
+    def __init__(self, characteristic, service_uuid):
+        self.uuid = characteristic.uuid
+        self.handle = characteristic.handle
+        self.name = characteristic.description
+        self.properties = tuple(characteristic.properties)
+        self.flags = get_property_flags(self.properties)
+        self.descriptors = tuple(
+            GattDescriptor(descriptor)
+            for descriptor in characteristic.descriptors
+        )
+        self.service_uuid = service_uuid
+        self.characteristic = characteristic
+
+
+class GattService:
+    __slots__ = ("uuid", "handle", "name", "characteristics", "service")
+
+    def __init__(self, service):
+        self.uuid = service.uuid
+        self.handle = service.handle
+        self.name = service.description
+        self.characteristics = tuple(
+            GattCharacteristic(characteristic, service.uuid)
+            for characteristic in service.characteristics
+        )
+        self.service = service
+
+
+class GattModel:
+    # snapshot of the services of a connected device, built once per
+    # connection; a uuid gives the first attribute with that uuid, handles
+    # reach the others
+    def __init__(self, services):
+        self.services = tuple(
+            GattService(service) for service in services.services.values()
+        )
+        self.services_by_uuid = {}
+        self.chars_by_uuid = {}
+        self.chars_by_handle = {}
+        self.descriptors_by_handle = {}
+        for service in self.services:
+            self.services_by_uuid.setdefault(service.uuid, service)
+            for char in service.characteristics:
+                self.chars_by_uuid.setdefault(char.uuid, char)
+                self.chars_by_handle[char.handle] = char
+                for descriptor in char.descriptors:
+                    self.descriptors_by_handle[descriptor.handle] = descriptor
+        self.services_dict = None
+
+    def get_services_dict(self):
+        # nested dicts by uuid, as returned by the former
+        # Ble.get_services_and_characteristics; built on the first call and
+        # shared by the callers
+        if self.services_dict is None:
+            self.services_dict = {
+                service.uuid: {
+                    "name": service.name,
+                    "service": service.service,
+                    "characteristics": {
+                        char.uuid: {
+                            "name": char.name,
+                            "properties": char.characteristic.properties,
+                            "characteristic": char.characteristic,
+                            "descriptors": {
+                                descriptor.uuid: {
+                                    "name": descriptor.name,
+                                    "descriptor": descriptor.descriptor,
+                                }
+                                for descriptor in char.descriptors
+                            },
+                        }
+                        for char in service.characteristics
+                    },
+                }
+                for service in self.services
+            }
+        return self.services_dict
+
+    def get_service(self, uuid):
+        return self.services_by_uuid.get(uuid)
+
+    def get_characteristic(self, specifier):
+        if isinstance(specifier, int):
+            return self.chars_by_handle.get(specifier)
+        return self.chars_by_uuid.get(specifier)
+
+    def get_descriptor(self, handle):
+        return self.descriptors_by_handle.get(handle)
+
+    def get_characteristics(self, uuid):
+        return [
+            char for char in self.chars_by_handle.values() if char.uuid == uuid
+        ]
+
+    def __len__(self):
+        return len(self.chars_by_handle)
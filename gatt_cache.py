@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+
+from gatt import GattModel
+from virtual_gatt import VirtualServiceCollection
+
+
+DATABASE_HASH_UUID = "00002b2a-0000-1000-8000-00805f9b34fb"
+CACHE_VERSION = 1
+
+
+def serialize_gatt_model(gatt_model):
+    return [
+        {
+            "uuid": service.uuid,
+            "handle": service.handle,
+            "characteristics": [
+                {
+                    "uuid": char.uuid,
+                    "handle": char.handle,
+                    "properties": list(char.properties),
+                    "descriptors": [
+                        {"uuid": descriptor.uuid, "handle": descriptor.handle}
+                        for descriptor in char.descriptors
+                    ],
+                }
+                for char in service.characteristics
+            ],
+        }
+        for service in gatt_model.services
+    ]
+
+
+def deserialize_gatt_model(services_data):
+    # cached services are rebuilt as virtual attributes, they can be shown
+    # but not used for read/write/notify
+    services = VirtualServiceCollection()
+    for service_data in services_data:
+        service = services.add_service(
+            service_data["uuid"], service_data["handle"]
+        )
+        for char_data in service_data["characteristics"]:
+            char = services.add_characteristic(
+                service,
+                char_data["uuid"],
+                char_data["properties"],
+                handle=char_data["handle"],
+            )
+            for descriptor_data in char_data["descriptors"]:
+                services.add_descriptor(
+                    char, descriptor_data["uuid"], descriptor_data["handle"]
+                )
+    return GattModel(services)
+
+
+class GattCache:
+    # services of previously connected devices, keyed by address, with the
+    # database hash of the device when it has one
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.models = {}
+        self.lock = threading.Lock()
+        # saves run in executor threads, a snapshot is written and replaces
+        # the file before the next one is taken
+        self.save_lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                cache_data = json.load(f)
+        except (OSError, ValueError):
+            return
+        # files of other versions, or not written by save, are ignored
+        if (
+            isinstance(cache_data, dict)
+            and cache_data.get("version") == CACHE_VERSION
+            and isinstance(cache_data.get("devices"), dict)
+        ):
+            self.entries = cache_data["devices"]
+
+    def save(self):
+        with self.save_lock:
+            with self.lock:
+                cache_json = json.dumps(
+                    {"version": CACHE_VERSION, "devices": self.entries}
+                )
+            # written to a temporary file first, a crash does not corrupt the
+            # cache
+            cache_dir = os.path.dirname(self.path)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(cache_json)
+            os.replace(tmp_path, self.path)
+
+    def __contains__(self, address):
+        return address in self.entries
+
+    def get(self, address):
+        with self.lock:
+            gatt_model = self.models.get(address)
+            if gatt_model is None and address in self.entries:
+                gatt_model = deserialize_gatt_model(
+                    self.entries[address]["services"]
+                )
+                self.models[address] = gatt_model
+            return gatt_model
+
+    def get_database_hash(self, address):
+        entry = self.entries.get(address)
+        return entry["db_hash"] if entry is not None else None
+
+    def put(self, address, gatt_model, db_hash=None):
+        # returns True if the entry was added or changed
+        entry = {
+            "db_hash": db_hash.hex() if db_hash is not None else None,
+            "services": serialize_gatt_model(gatt_model),
+        }
+        with self.lock:
+            if self.entries.get(address) == entry:
+                return False
+            self.entries[address] = entry
+            self.models.pop(address, None)
+            return True
+
+    def remove(self, address):
+        with self.lock:
+            self.entries.pop(address, None)
+            self.models.pop(address, None)
@@ -0,0 +1,404 @@
+import argparse
+import asyncio
+import heapq
+import sys
+import time
+
+from ble import Ble, BleStatus, DataGap
+from capture import CaptureWriter
+from fanout import FanoutServer
+from gatt import CharProperty
+from scan_filter import ScanFilter
+
+
+POLL_PERIOD = 0.05  # period (s) of draining notification buffers
+BUFFER_ARENA_SIZE = 1 << 20  # bytes of notification data per characteristic
+BUFFER_RECORDS = 16384  # pending notifications per characteristic
+CONNECT_TIMEOUT = 30  # maximum time (s) to connect all devices
+REPORT_PERIOD = 5  # period (s) of subscribers reports when serving
+BASE_UUID = "0000{}-0000-1000-8000-00805f9b34fb"
+
+
+class NdjsonSink:
+    # one json object per notification, with the wall clock time it was
+    # received at
+    def __init__(self, output):
+        self.output = output
+        self.clock_offset = time.time() - time.monotonic()
+
+    def write(self, records):
+        clock_offset = self.clock_offset
+        self.output.write(
+            "".join(
+                [
+                    f'{{"time":{timestamp + clock_offset:.6f},'
+                    f'"address":"{address}","uuid":"{char.uuid}",'
+                    f'"data":"{data.hex()}"}}\n'
+                    for timestamp, address, char, data in records
+                ]
+            ).encode()
+        )
+        self.output.flush()
+
+    def close(self):
+        self.output.close()
+
+
+class CaptureSink:
+    # capture file records, readable by capture.CaptureReader once saved
+    def __init__(self, output):
+        self.writer = CaptureWriter(output)
+
+    def write(self, records):
+        for timestamp, address, char, data in records:
+            self.writer.record(
+                address, char.characteristic, bytes(data), int(timestamp * 1e9)
+            )
+
+    def close(self):
+        self.writer.close()
+
+
+class HeadlessStreamer:
+    # notifications are stored with their reception time in ring buffers, and
+    # written to the sink in time order on every drain
+    def __init__(self, ble, sink):
+        self.ble = ble
+        self.sink = sink
+        self.subscriptions = []
+        self.records_written = 0
+
+    def subscribe(self, address, char):
+        # by handle, as characteristics may have the same uuid; indications
+        # for characteristics which can't notify
+        data_buffer = self.ble.enable_data_buffer(
+            address, char.handle, BUFFER_ARENA_SIZE, BUFFER_RECORDS
+        )
+        if char.flags & CharProperty.Notify:
+            start = self.ble.start_notifications_characteristic
+        else:
+            start = self.ble.start_indications_characteristic
+        try:
+            enabled = start(address, char.handle).result()
+        except Exception as e:
+            log(f"{address} {char.uuid} not subscribed: {e!r}")
+            enabled = False
+        if not enabled:
+            self.ble.disable_data_buffer(address, char.handle)
+            return False
+        self.subscriptions.append((address, char, data_buffer))
+        return True
+
+    def unsubscribe_all(self):
+        for address, char, data_buffer in self.subscriptions:
+            if self.ble.is_connected(address):
+                # also stops indications
+                self.ble.stop_notifications_characteristic(address, char.handle)
+
+    def drain(self):
+        batches = []
+        for address, char, data_buffer in self.subscriptions:
+            records = data_buffer.read()
+            if len(records) > 0:
+                batches.append(
+                    (
+                        data_buffer,
+                        [
+                            (timestamp, address, char, data)
+                            for timestamp, data in records
+                        ],
+                    )
+                )
+        if len(batches) == 0:
+            return 0
+        records = list(
+            heapq.merge(*[batch for _, batch in batches], key=lambda r: r[0])
+        )
+        self.sink.write(records)
+        for data_buffer, batch in batches:
+            data_buffer.release(len(batch))
+        self.records_written += len(records)
+        return len(records)
+
+    def get_stats(self):
+        return {
+            (address, char): data_buffer.get_stats()
+            for address, char, data_buffer in self.subscriptions
+        }
+
+
+def find_characteristics(gatt_model, specifiers):
+    # characteristics able to notify or indicate, by uuid, 16 bit uuid or
+    # name; all notifying ones if no specifier is given
+    if not specifiers:
+        return [
+            char
+            for char in gatt_model.chars_by_handle.values()
+            if char.flags & CharProperty.Notify
+        ]
+    chars = [
+        char
+        for char in gatt_model.chars_by_handle.values()
+        if char.flags & (CharProperty.Notify | CharProperty.Indicate)
+    ]
+    wanted = set()
+    for specifier in specifiers:
+        specifier = specifier.lower()
+        wanted.add(specifier)
+        if len(specifier) == 4:
+            wanted.add(BASE_UUID.format(specifier))
+    return [
+        char
+        for char in chars
+        if char.uuid in wanted
+        or (char.name is not None and char.name.lower() in wanted)
+    ]
+
+
+def find_devices(ble, scan_filter, addresses, scan_time):
+    # scans until all addresses are found, or for scan_time seconds
+    ble.start_scan(scan_filter)
+    deadline = time.monotonic() + scan_time
+    while time.monotonic() < deadline:
+        if addresses and all(
+            ble.get_found_device(address) is not None for address in addresses
+        ):
+            break
+        time.sleep(0.1)
+    ble.stop_scan()
+    if addresses:
+        devices = [ble.get_found_device(address) for address in addresses]
+        for address, device in zip(addresses, devices):
+            if device is None:
+                log(f"{address} not found")
+        return [device for device in devices if device is not None]
+    return ble.get_found_devices()
+
+
+def connect_devices(ble, devices, auto_reconnect):
+    connections = [
+        (device["address"], ble.connect(device["dev"], auto_reconnect))
+        for device in devices
+    ]
+    deadline = time.monotonic() + CONNECT_TIMEOUT
+    connected = []
+    for address, connection in connections:
+        try:
+            connection.result(max(0, deadline - time.monotonic()))
+        except Exception as e:
+            log(f"{address} not connected: {e!r}")
+            continue
+        connected.append(address)
+    return connected
+
+
+def report_events(ble):
+    for status in ble.get_status_events():
+        if status[1] in (
+            BleStatus.Connected,
+            BleStatus.Disconnected,
+            BleStatus.Reconnecting,
+        ):
+            log(f"{status[0]} {status[1].name.lower()}")
+    for address, handle, data in ble.get_data_events():
+        if isinstance(data, DataGap):
+            log(
+                f"{address} handle {handle} no data for "
+                f"{data.end_time - data.start_time:.3f} s"
+            )
+
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def create_backend(args):
+    if args.simulated is None:
+        return None
+    from simulated import SimulatedBackend
+
+    return SimulatedBackend.with_advertisers(
+        args.simulated,
+        connection_latency=0,
+        notification_rate=args.simulated_rate,
+    )
+
+
+def run(args):
+    addresses = [address.upper() for address in args.address or []]
+    scan_filter = ScanFilter(
+        service_uuids=args.service_uuid,
+        name_prefix=args.name_prefix,
+        name_regex=args.name_regex,
+        manufacturer_ids=args.manufacturer_id,
+        min_rssi=args.min_rssi,
+        addresses=addresses or None,
+        # devices given by address may not advertise a name
+        named_only=not addresses,
+    )
+    # the data queue only receives reads and data gap markers
+    ble = Ble(
+        backend=create_backend(args), connect_timeout=args.connect_timeout
+    )
+    devices = find_devices(ble, scan_filter, addresses, args.scan_time)
+    connected = connect_devices(ble, devices, args.auto_reconnect)
+    if args.serve is not None:
+        status = serve(ble, args)
+    else:
+        status = stream(ble, connected, args)
+    for address in ble.get_connected_devices():
+        ble.disconnect(address)
+    return status
+
+
+def stream(ble, connected, args):
+    output = (
+        sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    )
+    sink = (
+        NdjsonSink(output) if args.format == "ndjson" else CaptureSink(output)
+    )
+    streamer = HeadlessStreamer(ble, sink)
+    for address in connected:
+        chars = find_characteristics(ble.get_gatt_model(address), args.char)
+        for char in chars:
+            if streamer.subscribe(address, char):
+                log(f"{address} {char.uuid} ({char.name}) subscribed")
+    if len(streamer.subscriptions) == 0:
+        log("no characteristics subscribed")
+        sink.close()
+        return 1
+    start = time.monotonic()
+    deadline = start + args.duration if args.duration is not None else None
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            time.sleep(POLL_PERIOD)
+            streamer.drain()
+            report_events(ble)
+        streamer.unsubscribe_all()
+        streamer.drain()
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    elapsed = time.monotonic() - start
+    for (address, char), stats in streamer.get_stats().items():
+        log(
+            f"{address} {char.uuid}: {stats['written']} received, "
+            f"{stats['dropped']} dropped"
+        )
+        indication_stats = ble.get_indication_stats(address, char.uuid)
+        if indication_stats is not None and indication_stats["rate"]:
+            log(
+                f"{address} {char.uuid}: {indication_stats['rate']:.1f} "
+                f"indications/s, interval median "
+                f"{indication_stats['interval_median'] * 1e3:.1f} ms, p95 "
+                f"{indication_stats['interval_p95'] * 1e3:.1f} ms"
+            )
+    log(
+        f"{streamer.records_written} notifications written in "
+        f"{elapsed:.1f} s ({streamer.records_written / elapsed:.0f}/s)"
+    )
+    try:
+        sink.close()
+    except BrokenPipeError:
+        pass
+    return 0
+
+
+def serve(ble, args):
+    # subscribers choose their topics, notifications of a characteristic are
+    # enabled while it has subscribers
+    server = FanoutServer(ble.async_ble)
+    if args.serve.isdigit():
+        start = server.start_tcp(int(args.serve))
+    else:
+        start = server.start_unix(args.serve)
+    asyncio.run_coroutine_threadsafe(start, ble.event_loop).result()
+    log(f"serving {len(server.get_topics())} topics on {args.serve}")
+    deadline = (
+        time.monotonic() + args.duration if args.duration is not None else None
+    )
+    last_report = time.monotonic()
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            time.sleep(POLL_PERIOD)
+            report_events(ble)
+            if time.monotonic() - last_report >= REPORT_PERIOD:
+                last_report = time.monotonic()
+                report_subscribers(server)
+    except KeyboardInterrupt:
+        pass
+    report_subscribers(server)
+    asyncio.run_coroutine_threadsafe(server.stop(), ble.event_loop).result()
+    return 0
+
+
+def report_subscribers(server):
+    for name, stats in server.get_stats().items():
+        lag_mean = stats["lag_mean"]
+        log(
+            f"{name}: {stats['topics']} topics, {stats['sent']} sent, "
+            f"{stats['dropped']} dropped, {stats['pending']} pending, "
+            f"lag {stats['lag'] * 1e3:.1f} ms, mean "
+            + (f"{lag_mean * 1e3:.1f}" if lag_mean is not None else "-")
+            + f" ms, max {stats['lag_max'] * 1e3:.1f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Stream notifications of BLE devices without the GUI"
+    )
+    parser.add_argument(
+        "--address",
+        action="append",
+        help="device to connect, all devices found if not given",
+    )
+    parser.add_argument(
+        "--char",
+        action="append",
+        help="characteristic uuid, 16 bit uuid or name to subscribe, "
+        "indications if it can't notify; all notifying characteristics if "
+        "not given",
+    )
+    parser.add_argument("--format", choices=["ndjson", "binary"])
+    parser.add_argument(
+        "--output", default="-", help="output file, stdout if not given"
+    )
+    parser.add_argument("--duration", type=float, help="seconds to stream")
+    parser.add_argument(
+        "--serve",
+        help="unix domain socket path, or localhost tcp port, publishing "
+        "notifications to subscribers instead of writing them",
+    )
+    parser.add_argument(
+        "--scan-time",
+        type=float,
+        default=5,
+        help="maximum time (s) to scan for the devices",
+    )
+    parser.add_argument("--name-prefix")
+    parser.add_argument("--name-regex")
+    parser.add_argument("--service-uuid", action="append")
+    parser.add_argument("--manufacturer-id", type=int, action="append")
+    parser.add_argument("--min-rssi", type=int)
+    parser.add_argument("--auto-reconnect", action="store_true")
+    parser.add_argument("--connect-timeout", type=float)
+    parser.add_argument(
+        "--simulated",
+        type=int,
+        help="number of simulated devices, instead of the BLE adapter",
+    )
+    parser.add_argument(
+        "--simulated-rate",
+        type=int,
+        default=10,
+        help="notifications/s per characteristic of simulated devices",
+    )
+    args = parser.parse_args()
+    if args.format is None:
+        args.format = "binary" if args.output.endswith(".blxcap") else "ndjson"
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+import array
+import threading
+
+
+class IndicationStats:
+    # arrival times of the latest indications of a characteristic; only one
+    # indication is in flight until the stack confirms it, so while the
+    # peripheral sends as fast as it can, the interval between indications is
+    # the round trip of the confirmation, and bounds the achievable rate
+    def __init__(self, size=256):
+        self.size = size
+        self.timestamps = array.array("d", [0.0]) * size
+        self.count = 0  # number of indications since they were enabled
+        self.start_time = None
+        self.lock = threading.Lock()
+
+    def add(self, timestamp):
+        with self.lock:
+            if self.count == 0:
+                self.start_time = timestamp
+            self.timestamps[self.count % self.size] = timestamp
+            self.count += 1
+
+    def get_stats(self):
+        with self.lock:
+            n = min(self.count, self.size)
+            if n == 0:
+                return None
+            start = (self.count - n) % self.size
+            timestamps = [
+                self.timestamps[(start + i) % self.size] for i in range(n)
+            ]
+            count = self.count
+            start_time = self.start_time
+        intervals = sorted(
+            [b - a for a, b in zip(timestamps[:-1], timestamps[1:])]
+        )
+        stats = {
+            "count": count,
+            "window": n,
+            "rate": (count - 1) / (timestamps[-1] - start_time)
+            if count > 1 and timestamps[-1] > start_time
+            else None,
+            "interval_min": None,
+            "interval_median": None,
+            "interval_p95": None,
+            "interval_max": None,
+            "last_seen": timestamps[-1],
+        }
+        if len(intervals) > 0:
+            stats["interval_min"] = intervals[0]
+            stats["interval_median"] = intervals[len(intervals) // 2]
+            stats["interval_p95"] = intervals[int(len(intervals) * 0.95)]
+            stats["interval_max"] = intervals[-1]
+        return stats
@@ -0,0 +1,156 @@
+import asyncio
+import time
+
+from capture import CaptureReader
+from virtual_gatt import VirtualServiceCollection
+
+
+MIN_REPLAY_SLEEP = 0.001  # records due sooner are delivered without sleeping
+YIELD_INTERVAL = 256  # records delivered between yields to the event loop
+
+
+class ReplayClient:
+    def __init__(self, address, channels, disconnected_callback=None):
+        self.address = address
+        self.services = VirtualServiceCollection()
+        self.is_connected = False
+        self.mtu_size = 23
+        self._disconnected_callback = disconnected_callback
+        # by characteristic handle, as characteristics may have the same uuid
+        self._notify_callbacks = {}
+        self._values = {}
+        self._channel_handles = {}
+        services = {}
+        # recorded handles are kept, in order so services are allocated
+        # handles past the characteristics already added
+        for channel in sorted(channels, key=lambda c: c.handle or 0):
+            if channel.service_uuid not in services:
+                services[channel.service_uuid] = self.services.add_service(
+                    channel.service_uuid
+                )
+            char = self.services.add_characteristic(
+                services[channel.service_uuid],
+                channel.uuid,
+                channel.properties,
+                handle=channel.handle,
+            )
+            self._channel_handles[channel.channel_id] = char.handle
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.disconnect()
+
+    async def connect(self):
+        self.is_connected = True
+        return True
+
+    async def disconnect(self):
+        if self.is_connected:
+            self.is_connected = False
+            self._notify_callbacks = {}
+            if self._disconnected_callback is not None:
+                self._disconnected_callback(self)
+        return True
+
+    async def start_notify(self, char_specifier, callback, **kwargs):
+        char = self.services.get_characteristic(char_specifier)
+        self._notify_callbacks[char.handle] = (char, callback)
+
+    async def stop_notify(self, char_specifier):
+        char = self.services.get_characteristic(char_specifier)
+        self._notify_callbacks.pop(char.handle, None)
+
+    async def read_gatt_char(self, char_specifier):
+        char = self.services.get_characteristic(char_specifier)
+        return bytearray(self._values.get(char.handle, b""))
+
+    async def write_gatt_char(self, char_specifier, data, response=False):
+        pass
+
+    def deliver(self, channel, payload):
+        # payload is a view of the capture file, consumers get their own copy
+        data = bytearray(payload)
+        handle = self._channel_handles[channel.channel_id]
+        self._values[handle] = data
+        subscription = self._notify_callbacks.get(handle)
+        if subscription is not None:
+            char, callback = subscription
+            callback(char, data)
+
+
+class CaptureReplay:
+    def __init__(self, path, speed=1.0):
+        # speed is a multiple of the recorded rate, None replays as fast as
+        # possible
+        self.reader = CaptureReader(path)
+        self.speed = speed
+        self.records_replayed = 0
+        self.max_lag = 0
+        self.total_lag = 0
+        self.start_timestamp = None
+        self.start_time = None
+        self.finished = False
+        self.stopped = False
+        channels = {}
+        for channel in self.reader.channels.values():
+            channels.setdefault(channel.address, []).append(channel)
+        self.channels = channels
+
+    def create_clients(self, disconnected_callback):
+        self.clients = {
+            address: ReplayClient(address, channels, disconnected_callback)
+            for address, channels in self.channels.items()
+        }
+        return list(self.clients.values())
+
+    def stop(self):
+        self.stopped = True
+
+    async def run(self):
+        records = self.reader.records()
+        try:
+            for timestamp_ns, channel, payload in records:
+                if self.stopped:
+                    break
+                if self.start_timestamp is None:
+                    self.start_timestamp = timestamp_ns
+                    self.start_time = time.monotonic_ns()
+                if self.speed is not None:
+                    due = self.get_due_time(timestamp_ns)
+                    delay = (due - time.monotonic_ns()) / 1e9
+                    if delay > MIN_REPLAY_SLEEP:
+                        await asyncio.sleep(delay)
+                else:
+                    due = time.monotonic_ns()
+                    if self.records_replayed % YIELD_INTERVAL == 0:
+                        await asyncio.sleep(0)
+                client = self.clients[channel.address]
+                if client.is_connected:
+                    client.deliver(channel, payload)
+                lag = time.monotonic_ns() - due
+                self.total_lag += lag
+                self.max_lag = max(self.max_lag, lag)
+                self.records_replayed += 1
+        finally:
+            # views of the capture file must be released before closing it
+            payload = None
+            records.close()
+            self.reader.close()
+            self.finished = True
+
+    def get_due_time(self, timestamp_ns):
+        # monotonic time at which the record is scheduled to be delivered
+        return (
+            self.start_time + (timestamp_ns - self.start_timestamp) / self.speed
+        )
+
+    def get_stats(self):
+        return {
+            "records": self.records_replayed,
+            "mean_lag": self.total_lag / max(self.records_replayed, 1) / 1e9,
+            "max_lag": self.max_lag / 1e9,
+            "finished": self.finished,
+        }
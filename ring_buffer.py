@@ -0,0 +1,94 @@
+import array
+import threading
+
+
+class NotificationRingBuffer:
+    def __init__(self, arena_size=65536, max_records=4096):
+        self.arena_size = arena_size
+        self.max_records = max_records
+        self.arena = bytearray(arena_size)
+        self.arena_view = memoryview(self.arena)
+        self.offsets = array.array("L", [0]) * max_records
+        self.lengths = array.array("L", [0]) * max_records
+        self.timestamps = array.array("d", [0.0]) * max_records
+        self.head = 0  # number of records written
+        self.tail = 0  # number of records released
+        self.write_pos = 0
+        # first record written at the start of the arena after wrapping, the
+        # live records are wrapped while it is pending and the tail is older
+        self.wrap_index = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def write(self, data, timestamp):
+        data_len = len(data)
+        with self.lock:
+            if self.head - self.tail >= self.max_records:
+                self.dropped += 1
+                return False
+            pos = self._find_space(data_len)
+            if pos is None:
+                self.dropped += 1
+                return False
+            self.arena[pos : pos + data_len] = data
+            i_record = self.head % self.max_records
+            self.offsets[i_record] = pos
+            self.lengths[i_record] = data_len
+            self.timestamps[i_record] = timestamp
+            self.write_pos = pos + data_len
+            self.head += 1
+            return True
+
+    def read(self, max_items=None):
+        # returned views stay valid until the records are released, since
+        # unreleased records are never overwritten by write
+        with self.lock:
+            first, last = self.tail, self.head
+        if max_items is not None:
+            last = min(last, first + max_items)
+        records = []
+        for i in range(first, last):
+            i_record = i % self.max_records
+            offset = self.offsets[i_record]
+            records.append(
+                (
+                    self.timestamps[i_record],
+                    self.arena_view[offset : offset + self.lengths[i_record]],
+                )
+            )
+        return records
+
+    def release(self, num_records):
+        with self.lock:
+            self.tail = min(self.tail + num_records, self.head)
+            if self.tail == self.head:
+                self.write_pos = 0
+
+    def __len__(self):
+        return self.head - self.tail
+
+    def get_stats(self):
+        return {
+            "pending": self.head - self.tail,
+            "written": self.head,
+            "dropped": self.dropped,
+        }
+
+    def _find_space(self, data_len):
+        # records are stored contiguously, wrapping to the start of the arena
+        # when there is no room left at its end; positions alone are ambiguous
+        # with empty records, so wrapping is tracked by record index
+        if self.head == self.tail:
+            return 0 if data_len <= self.arena_size else None
+        read_pos = self.offsets[self.tail % self.max_records]
+        if self.tail < self.wrap_index:
+            # free space is between the newest and the oldest record
+            if self.write_pos + data_len <= read_pos:
+                return self.write_pos
+            return None
+        if self.write_pos + data_len <= self.arena_size:
+            return self.write_pos
+        if data_len <= read_pos:
+            self.wrap_index = self.head
+            return 0
+        return None
@@ -0,0 +1,75 @@
+import re
+
+
+class ScanFilter:
+    # service uuids are passed to the scanner, the other filters are compiled
+    # into a list of checks run on every advertisement
+    def __init__(
+        self,
+        service_uuids=None,
+        name_prefix=None,
+        name_regex=None,
+        manufacturer_ids=None,
+        min_rssi=None,
+        addresses=None,
+        named_only=True,
+    ):
+        self.service_uuids = (
+            [uuid.lower() for uuid in service_uuids]
+            if service_uuids is not None
+            else None
+        )
+        self.name_prefix = name_prefix
+        self.name_regex = name_regex
+        self.manufacturer_ids = manufacturer_ids
+        self.min_rssi = min_rssi
+        self.addresses = addresses
+        self.named_only = named_only
+        self.checks = self._compile()
+
+    def get_scanner_kwargs(self):
+        if self.service_uuids is None:
+            return {}
+        return {"service_uuids": self.service_uuids}
+
+    def matches(self, device, advertisement_data):
+        for check in self.checks:
+            if not check(device, advertisement_data):
+                return False
+        return True
+
+    def _compile(self):
+        # cheapest checks first
+        checks = []
+        if self.addresses is not None:
+            addresses = frozenset(address.upper() for address in self.addresses)
+            checks.append(lambda dev, adv: dev.address.upper() in addresses)
+        if self.min_rssi is not None:
+            min_rssi = self.min_rssi
+            checks.append(
+                lambda dev, adv: adv.rssi is not None and adv.rssi >= min_rssi
+            )
+        if (
+            self.named_only
+            or self.name_prefix is not None
+            or self.name_regex is not None
+        ):
+            checks.append(lambda dev, adv: adv.local_name is not None)
+        if self.manufacturer_ids is not None:
+            manufacturer_ids = frozenset(self.manufacturer_ids)
+            checks.append(
+                lambda dev, adv: not manufacturer_ids.isdisjoint(
+                    adv.manufacturer_data
+                )
+            )
+        if self.name_prefix is not None:
+            name_prefix = self.name_prefix
+            checks.append(
+                lambda dev, adv: adv.local_name.startswith(name_prefix)
+            )
+        if self.name_regex is not None:
+            name_match = re.compile(self.name_regex).search
+            checks.append(
+                lambda dev, adv: name_match(adv.local_name) is not None
+            )
+        return checks
@@ -0,0 +1,412 @@
+import asyncio
+import collections
+import heapq
+import random
+import struct
+import time
+
+from virtual_gatt import VirtualServiceCollection
+
+
+SIMULATED_UUID = "0000{:04x}-0000-1000-8000-00805f9b34fb"
+CCCD_UUID = "00002902-0000-1000-8000-00805f9b34fb"
+GENERIC_ATTRIBUTE_UUID = "00001801-0000-1000-8000-00805f9b34fb"
+DATABASE_HASH_UUID = "00002b2a-0000-1000-8000-00805f9b34fb"
+MIN_SIMULATION_SLEEP = 0.001  # events due sooner are emitted without sleeping
+# properties of the simulated characteristics, assigned round robin
+CHARACTERISTIC_PROPERTIES = [
+    ["read", "notify"],
+    ["read", "write"],
+    ["write-without-response", "write"],
+    ["read", "indicate"],
+    ["read"],
+]
+
+# same fields as bleak AdvertisementData
+SimulatedAdvertisementData = collections.namedtuple(
+    "SimulatedAdvertisementData",
+    [
+        "local_name",
+        "manufacturer_data",
+        "service_data",
+        "service_uuids",
+        "tx_power",
+        "rssi",
+        "platform_data",
+    ],
+)
+
+
+class SimulatedDevice:
+    def __init__(self, address, name, rssi):
+        self.address = address
+        self.name = name
+        self.rssi = rssi
+        self.details = None
+        self.metadata = {}
+
+
+class SimulatedPeripheral:
+    def __init__(
+        self,
+        address,
+        name="Simulated",
+        advertisement_interval=0.1,
+        rssi=-60,
+        service_uuids=None,
+        manufacturer_data=None,
+        num_services=3,
+        num_characteristics=5,
+        connection_latency=0.05,
+        notification_rate=10,
+        indication_ack_latency=0.015,
+        payload_size=20,
+        read_latency=0.0,
+        write_latency=0.0,
+        write_without_response_latency=0.0,
+        mtu_size=247,
+        database_hash=None,
+        timestamp_payloads=False,
+    ):
+        self.address = address
+        self.name = name
+        self.advertisement_interval = advertisement_interval
+        self.rssi = rssi
+        self.service_uuids = service_uuids or []
+        self.manufacturer_data = manufacturer_data or {}
+        self.num_services = num_services
+        self.num_characteristics = num_characteristics
+        self.connection_latency = connection_latency
+        self.notification_rate = notification_rate
+        # round trip of an indication and its confirmation, two connection
+        # intervals by default
+        self.indication_ack_latency = indication_ack_latency
+        self.payload_size = payload_size
+        self.read_latency = read_latency
+        self.write_latency = write_latency
+        self.write_without_response_latency = write_without_response_latency
+        self.mtu_size = mtu_size
+        self.database_hash = database_hash
+        # notification payloads carry the perf_counter time they were sent
+        # after the sequence number, for latency measurements
+        self.timestamp_payloads = timestamp_payloads
+        # out of range peripherals neither advertise nor accept connections
+        self.in_range = True
+        self.device = SimulatedDevice(address, name, rssi)
+
+    def create_services(self):
+        services = VirtualServiceCollection()
+        if self.database_hash is not None:
+            service = services.add_service(GENERIC_ATTRIBUTE_UUID)
+            services.add_characteristic(service, DATABASE_HASH_UUID, ["read"])
+        for i_service in range(self.num_services):
+            service = services.add_service(
+                SIMULATED_UUID.format(0xA000 + i_service)
+            )
+            for i_char in range(self.num_characteristics):
+                properties = CHARACTERISTIC_PROPERTIES[
+                    i_char % len(CHARACTERISTIC_PROPERTIES)
+                ]
+                char = services.add_characteristic(
+                    service,
+                    SIMULATED_UUID.format(
+                        0xB000 + i_service * self.num_characteristics + i_char
+                    ),
+                    properties,
+                    self.mtu_size - 3,
+                )
+                if "notify" in properties or "indicate" in properties:
+                    services.add_descriptor(char, CCCD_UUID)
+        return services
+
+
+class SimulatedScanner:
+    def __init__(self, backend, detection_callback, service_uuids=None):
+        self.backend = backend
+        self.detection_callback = detection_callback
+        self.service_uuids = service_uuids
+        self.advertisements = 0
+        self._task = None
+
+    async def __aenter__(self):
+        self._task = asyncio.ensure_future(self._advertise())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def _advertise(self):
+        rng = random.Random(self.backend.seed)
+        peripherals = self.backend.peripherals
+        if self.service_uuids is not None:
+            service_uuids = set(self.service_uuids)
+            peripherals = [
+                peripheral
+                for peripheral in peripherals
+                if service_uuids.intersection(peripheral.service_uuids)
+            ]
+        # advertisements of all peripherals are scheduled on a single heap
+        start = time.monotonic()
+        schedule = [
+            (start + rng.random() * peripheral.advertisement_interval, i)
+            for i, peripheral in enumerate(peripherals)
+        ]
+        heapq.heapify(schedule)
+        while len(schedule) > 0:
+            delay = schedule[0][0] - time.monotonic()
+            # always yield, so other tasks run even when advertisements are
+            # due back to back
+            await asyncio.sleep(delay if delay > MIN_SIMULATION_SLEEP else 0)
+            now = time.monotonic()
+            while schedule[0][0] <= now:
+                due, i = schedule[0]
+                peripheral = peripherals[i]
+                rssi = peripheral.rssi + rng.randint(-3, 3)
+                peripheral.device.rssi = rssi
+                if peripheral.in_range:
+                    self.detection_callback(
+                        peripheral.device,
+                        SimulatedAdvertisementData(
+                            peripheral.name,
+                            peripheral.manufacturer_data,
+                            {},
+                            peripheral.service_uuids,
+                            None,
+                            rssi,
+                            (),
+                        ),
+                    )
+                    self.advertisements += 1
+                # advertising includes a random delay of up to 10 ms
+                heapq.heapreplace(
+                    schedule,
+                    (
+                        due
+                        + peripheral.advertisement_interval
+                        + rng.random() * 0.01,
+                        i,
+                    ),
+                )
+
+
+class SimulatedClient:
+    def __init__(self, backend, peripheral, disconnected_callback):
+        self.backend = backend
+        self.peripheral = peripheral
+        self.address = peripheral.address
+        self.services = peripheral.create_services()
+        self.mtu_size = peripheral.mtu_size
+        self.is_connected = False
+        self.writes = 0
+        self.bytes_written = 0
+        self._disconnected_callback = disconnected_callback
+        self._notify_tasks = {}
+        self._values = {}
+        # a single request, e.g. a write with response, is pending at a time
+        self._request_lock = asyncio.Lock()
+        if peripheral.database_hash is not None:
+            hash_char = self.services.get_characteristic(DATABASE_HASH_UUID)
+            self._values[hash_char.handle] = peripheral.database_hash
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.disconnect()
+
+    async def connect(self):
+        # adapters fail connections when too many are pending
+        backend = self.backend
+        backend.pending_connects += 1
+        try:
+            await asyncio.sleep(self.peripheral.connection_latency)
+            if not self.peripheral.in_range:
+                raise ConnectionError("simulated device out of range")
+            if (
+                backend.max_pending_connects is not None
+                and backend.pending_connects > backend.max_pending_connects
+            ):
+                backend.failed_connects += 1
+                raise ConnectionError("simulated adapter busy")
+        finally:
+            backend.pending_connects -= 1
+        self.is_connected = True
+        return True
+
+    async def disconnect(self):
+        if self.is_connected:
+            self.is_connected = False
+            for task in self._notify_tasks.values():
+                task.cancel()
+            self._notify_tasks = {}
+            if self._disconnected_callback is not None:
+                self._disconnected_callback(self)
+        return True
+
+    def simulate_link_loss(self):
+        # peripheral side disconnection, e.g. out of range
+        asyncio.ensure_future(self.disconnect())
+
+    async def start_notify(self, char_specifier, callback, **kwargs):
+        # indications if the characteristic can't notify, or if forced as
+        # with the windows backend
+        char = self.services.get_characteristic(char_specifier)
+        if "indicate" in char.properties and (
+            kwargs.get("force_indicate", False)
+            or "notify" not in char.properties
+        ):
+            send = self._indicate(char, callback)
+        else:
+            send = self._notify(char, callback)
+        self._notify_tasks[char.handle] = asyncio.ensure_future(send)
+
+    async def stop_notify(self, char_specifier):
+        char = self.services.get_characteristic(char_specifier)
+        task = self._notify_tasks.pop(char.handle, None)
+        if task is not None:
+            task.cancel()
+
+    async def read_gatt_char(self, char_specifier):
+        char = self.services.get_characteristic(char_specifier)
+        if self.peripheral.read_latency > 0:
+            # one request at a time, as for writes with response
+            async with self._request_lock:
+                await asyncio.sleep(self.peripheral.read_latency)
+        return bytearray(
+            self._values.get(char.handle, bytes(self.peripheral.payload_size))
+        )
+
+    async def write_gatt_char(self, char_specifier, data, response=False):
+        char = self.services.get_characteristic(char_specifier)
+        if response:
+            async with self._request_lock:
+                if self.peripheral.write_latency > 0:
+                    await asyncio.sleep(self.peripheral.write_latency)
+        elif self.peripheral.write_without_response_latency > 0:
+            await asyncio.sleep(self.peripheral.write_without_response_latency)
+        self._values[char.handle] = bytes(data)
+        self.writes += 1
+        self.bytes_written += len(data)
+
+    async def _notify(self, char, callback):
+        # notifications are emitted in bursts, so the achieved rate does not
+        # depend on the resolution of asyncio.sleep
+        rate = self.peripheral.notification_rate
+        start = time.monotonic()
+        sent = 0
+        while True:
+            due = int((time.monotonic() - start) * rate)
+            while sent < due:
+                callback(char, self._create_payload(sent))
+                sent += 1
+            next_due = (sent + 1) / rate - (time.monotonic() - start)
+            await asyncio.sleep(max(next_due, MIN_SIMULATION_SLEEP))
+
+    async def _indicate(self, char, callback):
+        # one indication in flight, the next one is sent once the previous one
+        # is confirmed, so the rate is at most 1 / indication_ack_latency
+        rate = self.peripheral.notification_rate
+        start = time.monotonic()
+        sent = 0
+        while True:
+            next_due = sent / rate - (time.monotonic() - start)
+            if next_due > 0:
+                await asyncio.sleep(next_due)
+            callback(char, self._create_payload(sent))
+            sent += 1
+            await asyncio.sleep(self.peripheral.indication_ack_latency)
+
+    def _create_payload(self, sequence):
+        payload = bytearray(self.peripheral.payload_size)
+        payload[:4] = sequence.to_bytes(4, "little")
+        if self.peripheral.timestamp_payloads:
+            struct.pack_into("<d", payload, 4, time.perf_counter())
+        return payload
+
+
+class UnknownDeviceClient:
+    # as with bleak, a client can be created for any address, and fails to
+    # connect if no device has it
+    def __init__(self, address):
+        self.address = address
+        self.is_connected = False
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.disconnect()
+
+    async def connect(self):
+        from bleak.exc import BleakDeviceNotFoundError
+
+        raise BleakDeviceNotFoundError(
+            self.address, f"Device with address {self.address} was not found."
+        )
+
+    async def disconnect(self):
+        return True
+
+
+class SimulatedBackend:
+    def __init__(self, peripherals=None, seed=0, max_pending_connects=None):
+        self.peripherals = []
+        self.peripherals_by_address = {}
+        self.seed = seed
+        self.clients = {}
+        self.max_pending_connects = max_pending_connects
+        self.pending_connects = 0
+        self.failed_connects = 0
+        for peripheral in peripherals or []:
+            self.add_peripheral(peripheral)
+
+    @classmethod
+    def with_advertisers(
+        cls,
+        num_advertisers,
+        seed=0,
+        max_pending_connects=None,
+        **peripheral_kwargs,
+    ):
+        rng = random.Random(seed)
+        peripherals = []
+        for i in range(num_advertisers):
+            kwargs = {
+                "name": f"Simulated {i}",
+                "rssi": rng.randint(-95, -40),
+                "manufacturer_data": {0xFFFF: bytes([i % 256]) * 4},
+            }
+            kwargs.update(peripheral_kwargs)
+            peripherals.append(
+                SimulatedPeripheral(
+                    f"5E:00:00:{i >> 16 & 0xFF:02X}:{i >> 8 & 0xFF:02X}:"
+                    f"{i & 0xFF:02X}",
+                    **kwargs,
+                )
+            )
+        return cls(peripherals, seed, max_pending_connects)
+
+    def add_peripheral(self, peripheral):
+        self.peripherals.append(peripheral)
+        self.peripherals_by_address[peripheral.address] = peripheral
+
+    def get_peripheral(self, address):
+        return self.peripherals_by_address.get(address)
+
+    def create_scanner(self, detection_callback, service_uuids=None):
+        return SimulatedScanner(self, detection_callback, service_uuids)
+
+    def create_client(self, device, disconnected_callback, **kwargs):
+        address = getattr(device, "address", device)
+        peripheral = self.get_peripheral(address)
+        if peripheral is None:
+            return UnknownDeviceClient(address)
+        client = SimulatedClient(self, peripheral, disconnected_callback)
+        self.clients[address] = client
+        return client
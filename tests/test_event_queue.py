@@ -0,0 +1,41 @@
+from event_queue import EventQueue, OverflowPolicy
+
+
+def test_coalesce_latest_below_capacity():
+    events = EventQueue(100, OverflowPolicy.CoalesceLatest)
+    events.put("a1", key="a")
+    events.put("b1", key="b")
+    events.put("a2", key="a")
+    events.put("gap")
+    events.put("a3", key="a")
+    # the latest value takes the place of the oldest pending one
+    assert events.get_many() == ["a3", "b1", "gap"]
+    assert events.get_stats()["coalesced"] == 2
+    assert events.get_stats()["dropped"] == 0
+
+
+def test_coalesce_latest_after_get():
+    events = EventQueue(100, OverflowPolicy.CoalesceLatest)
+    events.put("a1", key="a")
+    assert events.get_nowait() == "a1"
+    events.put("a2", key="a")
+    events.put("a3", key="a")
+    assert events.get_many() == ["a3"]
+
+
+def test_coalesce_latest_when_full():
+    events = EventQueue(2, OverflowPolicy.CoalesceLatest)
+    events.put("a1", key="a")
+    events.put("b1", key="b")
+    events.put("a2", key="a")
+    # no pending item with the key, the oldest one is dropped
+    events.put("c1", key="c")
+    assert events.get_many() == ["b1", "c1"]
+    assert events.get_stats()["dropped"] == 1
+
+
+def test_drop_oldest_keeps_values_with_same_key():
+    events = EventQueue(100, OverflowPolicy.DropOldest)
+    events.put("a1", key="a")
+    events.put("a2", key="a")
+    assert events.get_many() == ["a1", "a2"]
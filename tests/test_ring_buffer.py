@@ -0,0 +1,40 @@
+from ring_buffer import NotificationRingBuffer
+
+
+def read_data(ring_buffer):
+    return [bytes(data) for _, data in ring_buffer.read()]
+
+
+def test_write_after_empty_record():
+    ring_buffer = NotificationRingBuffer(arena_size=64, max_records=16)
+    assert ring_buffer.write(b"", 1.0)
+    for i in range(4):
+        assert ring_buffer.write(bytes([i]) * 8, 2.0 + i)
+    assert read_data(ring_buffer) == [b""] + [bytes([i]) * 8 for i in range(4)]
+    assert ring_buffer.get_stats()["dropped"] == 0
+
+
+def test_write_after_empty_record_at_end_of_data():
+    ring_buffer = NotificationRingBuffer(arena_size=64, max_records=16)
+    assert ring_buffer.write(b"a" * 8, 1.0)
+    assert ring_buffer.write(b"", 2.0)
+    ring_buffer.release(1)
+    # the empty record is the tail, at the write position
+    assert ring_buffer.write(b"b" * 8, 3.0)
+    assert read_data(ring_buffer) == [b"", b"b" * 8]
+
+
+def test_wrap_keeps_unreleased_records():
+    ring_buffer = NotificationRingBuffer(arena_size=64, max_records=16)
+    for i in range(3):
+        assert ring_buffer.write(bytes([i]) * 20, float(i))
+    ring_buffer.release(1)
+    # no room at the end, wraps to the start freed by the first record
+    assert ring_buffer.write(b"\x03" * 20, 3.0)
+    # the wrapped record reaches the oldest pending one
+    assert not ring_buffer.write(b"\x04", 4.0)
+    assert read_data(ring_buffer) == [bytes([i]) * 20 for i in (1, 2, 3)]
+    ring_buffer.release(2)
+    assert ring_buffer.write(b"\x05" * 20, 5.0)
+    assert read_data(ring_buffer) == [b"\x03" * 20, b"\x05" * 20]
+    assert ring_buffer.get_stats()["dropped"] == 1
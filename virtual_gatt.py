@@ -0,0 +1,96 @@
+def describe_uuid(uuid):
+    # bleak is imported lazily, virtual devices don't need a BLE stack
+    try:
+        from bleak.uuids import uuidstr_to_str
+    except ImportError:
+        return "Unknown"
+    return uuidstr_to_str(uuid)
+
+
+class VirtualDescriptor:
+    def __init__(self, uuid, handle, characteristic):
+        self.uuid = uuid
+        self.handle = handle
+        self.description = describe_uuid(uuid)
+        self.characteristic_uuid = characteristic.uuid
+        self.characteristic_handle = characteristic.handle
+
+
+class VirtualCharacteristic:
+    def __init__(self, uuid, handle, properties, service, max_write_size=20):
+        self.uuid = uuid
+        self.handle = handle
+        self.description = describe_uuid(uuid)
+        self.properties = list(properties)
+        self.descriptors = []
+        self.service_uuid = service.uuid
+        self.service_handle = service.handle
+        self.max_write_without_response_size = max_write_size
+
+
+class VirtualService:
+    def __init__(self, uuid, handle):
+        self.uuid = uuid
+        self.handle = handle
+        self.description = describe_uuid(uuid)
+        self.characteristics = []
+
+
+class VirtualServiceCollection:
+    def __init__(self):
+        self.services = {}
+        self.characteristics = {}
+        self.descriptors = {}
+        self._next_handle = 1
+
+    # handles are allocated in order, unless given
+    def add_service(self, uuid, handle=None):
+        service = VirtualService(uuid, self._allocate_handle(handle))
+        self.services[service.handle] = service
+        return service
+
+    def add_characteristic(
+        self, service, uuid, properties, max_write_size=20, handle=None
+    ):
+        characteristic = VirtualCharacteristic(
+            uuid,
+            self._allocate_handle(handle),
+            properties,
+            service,
+            max_write_size,
+        )
+        service.characteristics.append(characteristic)
+        self.characteristics[characteristic.handle] = characteristic
+        return characteristic
+
+    def add_descriptor(self, characteristic, uuid, handle=None):
+        descriptor = VirtualDescriptor(
+            uuid, self._allocate_handle(handle), characteristic
+        )
+        characteristic.descriptors.append(descriptor)
+        self.descriptors[descriptor.handle] = descriptor
+        return descriptor
+
+    def get_service(self, specifier):
+        if isinstance(specifier, int):
+            return self.services.get(specifier)
+        for service in self.services.values():
+            if service.uuid == str(specifier).lower():
+                return service
+        return None
+
+    def get_characteristic(self, specifier):
+        if isinstance(specifier, VirtualCharacteristic):
+            return specifier
+        if isinstance(specifier, int):
+            return self.characteristics.get(specifier)
+        for characteristic in self.characteristics.values():
+            if characteristic.uuid == str(specifier).lower():
+                return characteristic
+        return None
+
+    def _allocate_handle(self, handle=None):
+        if handle is None:
+            handle = self._next_handle
+        self._next_handle = max(self._next_handle, handle + 1)
+        return handle
@@ -0,0 +1,139 @@
+import asyncio
+import time
+
+
+ATT_HEADER_SIZE = 3  # opcode and handle of a write
+PROGRESS_INTERVAL = 0.1  # minimum time (s) between progress reports
+
+
+def iter_chunks(data, chunk_size):
+    # buffers are sliced without copies, iterators of buffers are regrouped
+    # into full chunks
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        view = memoryview(data).cast("B")
+        for i in range(0, len(view), chunk_size):
+            yield view[i : i + chunk_size]
+        return
+    pending = bytearray()
+    for buffer in data:
+        pending += buffer
+        while len(pending) >= chunk_size:
+            yield bytes(pending[:chunk_size])
+            del pending[:chunk_size]
+    if len(pending) > 0:
+        yield bytes(pending)
+
+
+def get_chunk_size(client, char, response):
+    if not response:
+        # set by bleak from the negotiated mtu
+        chunk_size = getattr(char, "max_write_without_response_size", None)
+        if chunk_size:
+            return chunk_size
+    return client.mtu_size - ATT_HEADER_SIZE
+
+
+class WriteStream:
+    # writes data to a characteristic in chunks, keeping up to max_in_flight
+    # writes pending; writes are issued in order
+    def __init__(
+        self,
+        data,
+        response,
+        chunk_size=None,
+        max_in_flight=4,
+        progress_callback=None,
+    ):
+        self.data = data
+        self.response = response
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight
+        self.progress_callback = progress_callback
+        self.total_bytes = (
+            len(memoryview(data).cast("B"))
+            if isinstance(data, (bytes, bytearray, memoryview))
+            else None
+        )
+        self.bytes_written = 0
+        self.writes = 0
+        self.start_time = None
+        self.end_time = None
+        self.error = None
+        self.finished = False
+        self.cancelled = False
+        # concurrent.futures.Future of the write, when started by Ble
+        self.future = None
+        self._last_progress = 0
+
+    def cancel(self):
+        self.cancelled = True
+
+    async def run(self, client, char):
+        if self.chunk_size is None:
+            self.chunk_size = get_chunk_size(client, char, self.response)
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        pending = set()
+
+        def write_done(task, chunk_len):
+            pending.discard(task)
+            in_flight.release()
+            if task.cancelled():
+                return
+            if task.exception() is not None:
+                if self.error is None:
+                    self.error = task.exception()
+                return
+            self.bytes_written += chunk_len
+            self.writes += 1
+            now = time.monotonic()
+            if now - self._last_progress >= PROGRESS_INTERVAL:
+                self._last_progress = now
+                self._report_progress()
+
+        self.start_time = time.monotonic()
+        try:
+            for chunk in iter_chunks(self.data, self.chunk_size):
+                await in_flight.acquire()
+                if self.error is not None or self.cancelled:
+                    in_flight.release()
+                    break
+                task = asyncio.ensure_future(
+                    client.write_gatt_char(char, chunk, self.response)
+                )
+                task.add_done_callback(
+                    lambda task, chunk_len=len(chunk): write_done(
+                        task, chunk_len
+                    )
+                )
+                pending.add(task)
+            if len(pending) > 0:
+                await asyncio.wait(list(pending))
+        finally:
+            for task in list(pending):
+                task.cancel()
+            self.end_time = time.monotonic()
+            self.finished = True
+            self._report_progress()
+
+    def get_rate(self):
+        if self.start_time is None:
+            return 0
+        end_time = (
+            self.end_time if self.end_time is not None else time.monotonic()
+        )
+        elapsed = end_time - self.start_time
+        return self.bytes_written / elapsed if elapsed > 0 else 0
+
+    def get_stats(self):
+        return {
+            "bytes_written": self.bytes_written,
+            "total_bytes": self.total_bytes,
+            "writes": self.writes,
+            "bytes_per_s": self.get_rate(),
+            "finished": self.finished,
+            "error": self.error,
+        }
+
+    def _report_progress(self):
+        if self.progress_callback is not None:
+            self.progress_callback(self)